@@ -0,0 +1,99 @@
+"""
+Measures how data-parallel learning scales with the number of
+processes on a single machine.
+
+Each process runs `QTrainer.learn` on its own random batches with the
+gradients all-reduced over gloo, exactly as in `raijin train
+--nprocs N`. The environment is left out so that only the learning
+step is measured. Throughput is reported as the total number of
+samples learned from per second across all processes.
+
+Usage:
+    python benchmarks/bench_distributed.py --procs 1 2 4 8 --steps 50
+"""
+import argparse
+import time
+
+from omegaconf import OmegaConf as config
+import torch
+import torch.multiprocessing as mp
+
+from raijin.networks.qnetwork import QNetwork
+from raijin.trainers.qtrainer import QTrainer
+from raijin.utilities.distributed import init_process
+from raijin.utilities.distributed import wrap_trainer
+
+
+# ============================================
+#                   worker
+# ============================================
+def worker(rank: int, worldSize: int, args: argparse.Namespace, queue) -> None:
+    init_process(rank, worldSize, args.port)
+    net = QNetwork(4, args.n_actions)
+    optimizer = torch.optim.Adam(net.parameters(), lr=1e-4)
+    params = config.create(
+        {
+            "nEpisodes": 1,
+            "episodeLength": 1,
+            "prePopulateSteps": 0,
+            "batchSize": args.batch_size,
+            "discountRate": 0.99,
+        }
+    )
+    trainer = QTrainer(
+        None, [torch.nn.MSELoss()], None, [net], [optimizer], params
+    )
+    wrap_trainer(trainer)
+    b = args.batch_size
+    batch = (
+        torch.rand((b, 4, 110, 84)),
+        torch.randint(0, args.n_actions, (b, 1)).to(torch.float),
+        torch.rand((b, 1)),
+        torch.rand((b, 4, 110, 84)),
+        torch.zeros((b, 1)),
+    )
+    for _ in range(args.warmup):
+        trainer.learn(batch)
+    torch.distributed.barrier()
+    start = time.perf_counter()
+    for _ in range(args.steps):
+        trainer.learn(batch)
+    torch.distributed.barrier()
+    elapsed = time.perf_counter() - start
+    if rank == 0:
+        queue.put((elapsed, torch.get_num_threads()))
+    torch.distributed.destroy_process_group()
+
+
+# ============================================
+#                   bench
+# ============================================
+def bench(args: argparse.Namespace) -> None:
+    print(f"{'procs':>6}{'threads':>9}{'steps/s':>10}{'samples/s':>12}")
+    baseline = None
+    for nProcs in args.procs:
+        queue = mp.get_context("spawn").SimpleQueue()
+        mp.spawn(worker, args=(nProcs, args, queue), nprocs=nProcs)
+        elapsed, nThreads = queue.get()
+        stepsPerSec = args.steps / elapsed
+        samplesPerSec = stepsPerSec * args.batch_size * nProcs
+        if baseline is None:
+            baseline = samplesPerSec
+        row = f"{nProcs:>6}{nThreads:>9}{stepsPerSec:>10.2f}"
+        row += f"{samplesPerSec:>12.1f}"
+        row += f"  ({samplesPerSec / baseline:.2f}x)"
+        print(row)
+
+
+# ============================================
+#                   main
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--procs", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--n-actions", type=int, default=6)
+    parser.add_argument("--port", type=int, default=29501)
+    bench(parser.parse_args())
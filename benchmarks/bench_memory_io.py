@@ -0,0 +1,166 @@
+"""
+Compares how long it takes to checkpoint and reload the replay memory
+with the single-file, experience-axis-first layout used by
+`save_memory`/`load_memory` against the old layout (one hdf5 file per
+component with the experience axis last, written one experience at a
+time). Loading is timed both reading the whole file and memory-mapping
+it, as is done when resuming training.
+
+Full-size Atari states (4x110x84 float32) take ~300 GB for a million
+transitions (states and nextStates), so the state shape defaults to
+something small enough that both sizes fit in memory. Pass
+`--state-shape 4 110 84` with smaller `--sizes` for realistic states.
+The old layout is only timed up to `--legacy-max` transitions since
+it gets very slow.
+
+Usage:
+    python benchmarks/bench_memory_io.py --sizes 100000 1000000 \
+        --state-shape 4 8 8 --compression lzf
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import h5py
+import numpy as np
+from omegaconf import OmegaConf as config
+import torch
+
+from raijin.io.read import load_memory
+from raijin.io.read import map_memory
+from raijin.io.write import save_memory
+from raijin.memory.experience import Experience
+from raijin.memory.qmemory import QMemory
+
+
+# ============================================
+#                fill_memory
+# ============================================
+def fill_memory(size: int, stateShape: tuple) -> QMemory:
+    memory = QMemory(config.create({"capacity": size}))
+    # Generating in blocks keeps this from dominating the run time
+    blockSize = 10000
+    for start in range(0, size, blockSize):
+        n = min(blockSize, size - start)
+        states = torch.rand((n,) + stateShape)
+        nextStates = torch.rand((n,) + stateShape)
+        actions = np.random.randint(0, 6, n).tolist()
+        rewards = np.random.rand(n).tolist()
+        dones = (np.random.rand(n) < 0.01).tolist()
+        for i in range(n):
+            memory.add(
+                Experience(
+                    states[i], actions[i], rewards[i], nextStates[i], dones[i]
+                )
+            )
+    return memory
+
+
+# ============================================
+#             save_memory_legacy
+# ============================================
+def save_memory_legacy(memory: QMemory, outputDir: str) -> None:
+    """
+    The original save path: five files, experience axis last, one
+    experience per write.
+    """
+    names = ("states", "actions", "rewards", "nextStates", "dones")
+    files = {
+        n: h5py.File(os.path.join(outputDir, f"buffer_{n}.h5py"), "w")
+        for n in names
+    }
+    m = len(memory.buffer)
+    statesShape = list(memory.buffer[0].state.numpy().shape) + [m]
+    ds = {
+        "states": files["states"].create_dataset(
+            "states", statesShape, dtype=np.float32
+        ),
+        "actions": files["actions"].create_dataset(
+            "actions", m, dtype=np.int32
+        ),
+        "rewards": files["rewards"].create_dataset(
+            "rewards", m, dtype=np.float32
+        ),
+        "nextStates": files["nextStates"].create_dataset(
+            "nextStates", statesShape, dtype=np.float32
+        ),
+        "dones": files["dones"].create_dataset("dones", m, dtype=np.int32),
+    }
+    for i, experience in enumerate(memory.buffer):
+        ds["states"][..., i] = experience.state.numpy()
+        ds["actions"][i] = experience.action
+        ds["rewards"][i] = experience.reward
+        ds["nextStates"][..., i] = experience.nextState.numpy()
+        ds["dones"][i] = experience.done
+    for fd in files.values():
+        fd.close()
+
+
+# ============================================
+#                 dir_size
+# ============================================
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+# ============================================
+#                   bench
+# ============================================
+def bench(args: argparse.Namespace) -> None:
+    stateShape = tuple(args.state_shape)
+    header = f"{'transitions':>12}{'layout':>10}{'save s':>10}"
+    header += f"{'load s':>10}{'map s':>10}{'MB':>10}"
+    print(header)
+    for size in args.sizes:
+        memory = fill_memory(size, stateShape)
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmpDir:
+            if size <= args.legacy_max:
+                legacyDir = os.path.join(tmpDir, "legacy")
+                os.makedirs(legacyDir)
+                start = time.perf_counter()
+                save_memory_legacy(memory, legacyDir)
+                saveTime = time.perf_counter() - start
+                mb = dir_size(legacyDir) / 2**20
+                row = f"{size:>12}{'legacy':>10}{saveTime:>10.2f}"
+                row += f"{'-':>10}{'-':>10}{mb:>10.1f}"
+                print(row)
+            newDir = os.path.join(tmpDir, "new")
+            os.makedirs(newDir)
+            start = time.perf_counter()
+            save_memory(memory, newDir, compression=args.compression)
+            saveTime = time.perf_counter() - start
+            start = time.perf_counter()
+            loaded = load_memory(
+                QMemory(config.create({"capacity": size})), newDir
+            )
+            loadTime = time.perf_counter() - start
+            assert len(loaded) == len(memory)
+            del loaded
+            start = time.perf_counter()
+            mapped = map_memory(
+                QMemory(config.create({"capacity": size})), newDir
+            )
+            mapTime = time.perf_counter() - start
+            assert len(mapped) == len(memory)
+            del mapped
+            mb = dir_size(newDir) / 2**20
+            row = f"{size:>12}{'new':>10}{saveTime:>10.2f}"
+            row += f"{loadTime:>10.2f}{mapTime:>10.2f}{mb:>10.1f}"
+            print(row)
+        del memory
+
+
+# ============================================
+#                   main
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[100000, 1000000]
+    )
+    parser.add_argument("--state-shape", type=int, nargs="+", default=[4, 8, 8])
+    parser.add_argument("--compression", default=None)
+    parser.add_argument("--legacy-max", type=int, default=20000)
+    parser.add_argument("--dir", default=None)
+    bench(parser.parse_args())
@@ -0,0 +1,101 @@
+"""
+Checks whether the offline data loader keeps up with the learner.
+
+Times three things on a directory of recorded trajectories (see the
+`trajectories` io option):
+
+    * loader: batches/s drawn from a `TrajectoryLoader` on its own
+    * learn: updates/s of `QTrainer.learn` on one batch used over and
+        over, i.e., the learner with an infinitely fast loader
+    * offline: updates/s of the two together, as `OfflineQTrainer`
+        does it
+
+If offline is close to learn, the learner is saturated. Otherwise add
+workers.
+
+Usage:
+    python benchmarks/bench_offline.py params.yaml --workers 1 2 4
+"""
+import argparse
+import time
+
+from omegaconf import OmegaConf as config
+
+from raijin.io.trajectory_dataset import TrajectoryDataset
+from raijin.io.trajectory_dataset import TrajectoryLoader
+from raijin.utilities.managers import get_loss_functions
+from raijin.utilities.managers import get_nets
+from raijin.utilities.managers import get_optimizers
+from raijin.utilities.register import registry
+
+
+# ============================================
+#                get_learner
+# ============================================
+def get_learner(params, nActions: int):
+    nets = get_nets(params.nets, params.pipeline.traceLen, nActions)
+    trainer = registry["QTrainer"](
+        None,
+        get_loss_functions(params.losses),
+        None,
+        nets,
+        get_optimizers(params.optimizers, nets),
+        params.trainer,
+    )
+    return trainer
+
+
+# ============================================
+#                   rate
+# ============================================
+def rate(f, nSteps: int) -> float:
+    # The first call warms things up (e.g., the loader's queue)
+    f()
+    start = time.perf_counter()
+    for _ in range(nSteps):
+        f()
+    return nSteps / (time.perf_counter() - start)
+
+
+# ============================================
+#                   bench
+# ============================================
+def bench(args: argparse.Namespace) -> None:
+    params = config.load(args.paramFile)
+    batchSize = params.trainer.batchSize
+    dataset = TrajectoryDataset(
+        params.dataset.dataDir, params.dataset.get("shardSize", 512)
+    )
+    trainer = get_learner(params, dataset.nActions)
+    print(f"{len(dataset)} transitions, batch size {batchSize}")
+    print(f"{'workers':>8}{'loader/s':>12}{'learn/s':>12}{'offline/s':>12}")
+    for nWorkers in args.workers:
+        loader = TrajectoryLoader(
+            dataset,
+            params.pipeline,
+            batchSize,
+            nWorkers=nWorkers,
+            bufferSize=params.dataset.get("bufferSize", 4096),
+        )
+        loader.start()
+        loaderRate = rate(lambda: loader.sample(batchSize), args.steps)
+        batch = loader.sample(batchSize)
+        learnRate = rate(lambda: trainer.learn(batch), args.steps)
+        offlineRate = rate(
+            lambda: trainer.learn(loader.sample(batchSize)), args.steps
+        )
+        loader.close()
+        row = f"{nWorkers:>8}{loaderRate:>12.1f}{learnRate:>12.1f}"
+        row += f"{offlineRate:>12.1f}"
+        print(row)
+
+
+# ============================================
+#                   main
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("paramFile")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--steps", type=int, default=100)
+    bench(parser.parse_args())
@@ -0,0 +1,131 @@
+"""
+Compares float32 training against bfloat16 autocasting and the
+channels_last memory format for the QNetwork on the cpu.
+
+Two things are measured for each configuration:
+
+    * The throughput of a full learning step (forward, backward, and
+        optimizer step) at the given batch size
+    * A convergence sanity check: the loss before and after fitting a
+        fixed batch of terminal transitions for a number of steps.
+        Since the transitions are terminal the targets are just the
+        rewards, so every configuration should drive the loss down
+
+Usage:
+    python benchmarks/bench_precision.py --batch-size 32 --steps 50
+"""
+import argparse
+import time
+
+from omegaconf import OmegaConf as config
+import torch
+
+from raijin.networks.qnetwork import QNetwork
+from raijin.trainers.qtrainer import QTrainer
+from raijin.utilities.precision import bf16_autocast_available
+
+
+CONFIGS = {
+    "float32": {"channelsLast": False, "mixedPrecision": False},
+    "float32+channels_last": {"channelsLast": True, "mixedPrecision": False},
+    "bfloat16": {"channelsLast": False, "mixedPrecision": True},
+    "bfloat16+channels_last": {"channelsLast": True, "mixedPrecision": True},
+}
+
+
+# ============================================
+#                get_trainer
+# ============================================
+def get_trainer(
+    channelsLast: bool, mixedPrecision: bool, nActions: int, seed: int
+) -> QTrainer:
+    torch.manual_seed(seed)
+    netParams = config.create(
+        {"name": "QNetwork", "channelsLast": channelsLast}
+    )
+    net = QNetwork(4, nActions, params=netParams)
+    optimizer = torch.optim.Adam(net.parameters(), lr=1e-4)
+    params = config.create(
+        {
+            "nEpisodes": 1,
+            "episodeLength": 1,
+            "prePopulateSteps": 0,
+            "batchSize": 1,
+            "discountRate": 0.99,
+            "mixedPrecision": mixedPrecision,
+        }
+    )
+    return QTrainer(
+        None, [torch.nn.MSELoss()], None, [net], [optimizer], params
+    )
+
+
+# ============================================
+#                 get_batch
+# ============================================
+def get_batch(batchSize: int, nActions: int, seed: int) -> tuple:
+    gen = torch.Generator().manual_seed(seed)
+    states = torch.rand((batchSize, 4, 110, 84), generator=gen)
+    nextStates = torch.rand((batchSize, 4, 110, 84), generator=gen)
+    actions = torch.randint(0, nActions, (batchSize, 1), generator=gen)
+    rewards = torch.rand((batchSize, 1), generator=gen)
+    dones = torch.ones((batchSize, 1))
+    return (states, actions.to(torch.float), rewards, nextStates, dones)
+
+
+# ============================================
+#                  get_loss
+# ============================================
+def get_loss(trainer: QTrainer, batch: tuple) -> float:
+    states, actions, rewards, nextStates, dones = batch
+    with torch.no_grad():
+        beliefs = trainer._get_beliefs(states, actions)
+        targets = trainer._get_targets(nextStates, dones, rewards)
+        return trainer.loss_function(beliefs, targets).item()
+
+
+# ============================================
+#                   bench
+# ============================================
+def bench(args: argparse.Namespace) -> None:
+    print(f"bfloat16 autocast available: {bf16_autocast_available()}")
+    print(f"torch threads: {torch.get_num_threads()}")
+    header = f"{'config':<24}{'steps/s':>10}{'samples/s':>12}"
+    header += f"{'loss0':>12}{'lossN':>12}"
+    print(header)
+    batch = get_batch(args.batch_size, args.n_actions, args.seed)
+    for name, options in CONFIGS.items():
+        trainer = get_trainer(
+            nActions=args.n_actions, seed=args.seed, **options
+        )
+        for _ in range(args.warmup):
+            trainer.learn(batch)
+        # Reset so every config starts the convergence check from the
+        # same weights
+        trainer = get_trainer(
+            nActions=args.n_actions, seed=args.seed, **options
+        )
+        loss0 = get_loss(trainer, batch)
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            trainer.learn(batch)
+        elapsed = time.perf_counter() - start
+        lossN = get_loss(trainer, batch)
+        stepsPerSec = args.steps / elapsed
+        row = f"{name:<24}{stepsPerSec:>10.2f}"
+        row += f"{stepsPerSec * args.batch_size:>12.1f}"
+        row += f"{loss0:>12.5f}{lossN:>12.5f}"
+        print(row)
+
+
+# ============================================
+#                   main
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--n-actions", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    bench(parser.parse_args())
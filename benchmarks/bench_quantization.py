@@ -0,0 +1,68 @@
+"""
+Compares the int8 (dynamic and static) versions of the QNetwork
+against float32 on single-state forward passes, as done when choosing
+actions.
+
+For each method this reports the average latency and the fraction of
+states for which the int8 network picks the same action as the
+float32 one. By default the network has random weights and the states
+are random, which is enough for latency. For a meaningful agreement
+number, pass a trained model and states recorded from the game (a
+.npy array of shape (N, C, H, W)).
+
+Usage:
+    python benchmarks/bench_quantization.py --model path/to/model.pt \
+        --states states.npy
+"""
+import argparse
+
+import numpy as np
+import torch
+
+from raijin.networks.qnetwork import QNetwork
+from raijin.networks.quantization import compare_networks
+from raijin.networks.quantization import quantize_network
+
+
+# ============================================
+#                   bench
+# ============================================
+def bench(args: argparse.Namespace) -> None:
+    torch.manual_seed(args.seed)
+    if args.states is not None:
+        states = torch.from_numpy(np.load(args.states)).to(torch.float)
+    else:
+        states = torch.rand((args.n_states, 4, 110, 84))
+    if args.model is not None:
+        stateDict = torch.load(args.model)
+        nActions = stateDict["net.7.weight"].shape[0]
+        net = QNetwork(states.shape[1], nActions)
+        net.load_state_dict(stateDict)
+    else:
+        net = QNetwork(states.shape[1], args.n_actions)
+    net.eval()
+    print(f"torch threads: {torch.get_num_threads()}")
+    header = f"{'method':<10}{'fp32 ms':>10}{'int8 ms':>10}"
+    header += f"{'speedup':>10}{'agreement':>12}"
+    print(header)
+    for method in ("dynamic", "static"):
+        qnet = quantize_network(net, method, states)
+        results = compare_networks(net, qnet, states)
+        row = f"{method:<10}{results['referenceLatencyMs']:>10.3f}"
+        row += f"{results['candidateLatencyMs']:>10.3f}"
+        row += f"{results['speedup']:>10.2f}"
+        row += f"{results['agreement']:>12.1%}"
+        print(row)
+
+
+# ============================================
+#                   main
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--states", default=None)
+    parser.add_argument("--n-states", type=int, default=256)
+    parser.add_argument("--n-actions", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    bench(parser.parse_args())
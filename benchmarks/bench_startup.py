@@ -0,0 +1,113 @@
+"""
+Checks how long the command line takes to start up.
+
+Times, each in a fresh interpreter:
+
+    * import: `import raijin`
+    * app: building the application, i.e., what `raijin --help` does
+        before printing
+
+and lists the heavy modules (torch, h5py, gym, ...) each one loaded.
+Neither should load any: they're only imported when a command that
+needs them is run (see `raijin.utilities.lazy` and
+`raijin.console.app`). Exits with 1 if one did or if a time is over
+`--max-seconds`. The modules are also checked by
+tests/test_startup.py.
+
+Usage:
+    python benchmarks/bench_startup.py --repeats 5 --max-seconds 0.5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+# Modules that must not be imported just to start the command line
+heavyModules = (
+    "torch",
+    "h5py",
+    "gym",
+    "numpy",
+    "omegaconf",
+    "psutil",
+    "pretty_errors",
+)
+
+
+snippets = {
+    "import": "import raijin",
+    "app": (
+        "from raijin.console.app import RaijinApplication\n"
+        "RaijinApplication()"
+    ),
+}
+
+
+# ============================================
+#                  measure
+# ============================================
+def measure(snippet: str):
+    """
+    Runs the snippet in a fresh interpreter and returns how long it
+    took, less the interpreter's own startup, and the heavy modules it
+    loaded.
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"{snippet}\n"
+        "print(time.perf_counter() - start)\n"
+        f"print(' '.join(m for m in {heavyModules!r} if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.splitlines()
+    loaded = out[1].split() if len(out) > 1 else []
+    return float(out[0]), loaded
+
+
+# ============================================
+#                   bench
+# ============================================
+def bench(args) -> int:
+    status = 0
+    print(f"{'case':>8}{'median s':>12}{'max s':>12}  heavy modules")
+    for name, snippet in snippets.items():
+        times = []
+        for _ in range(args.repeats):
+            seconds, loaded = measure(snippet)
+            times.append(seconds)
+        median = statistics.median(times)
+        row = f"{name:>8}{median:>12.3f}{max(times):>12.3f}  "
+        print(row + (" ".join(loaded) or "-"))
+        if loaded or median > args.max_seconds:
+            status = 1
+    # The whole thing, interpreter included, for reference
+    start = time.perf_counter()
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from raijin.console.run import run; run()",
+            "--help",
+        ],
+        check=True,
+        capture_output=True,
+    )
+    print(f"raijin --help: {time.perf_counter() - start:.3f}s end to end")
+    return status
+
+
+# ============================================
+#                   main
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=0.5)
+    sys.exit(bench(parser.parse_args()))
@@ -0,0 +1,108 @@
+"""
+Checks that sampling from a `TieredMemory` doesn't wait on the disk.
+
+Fills a `QMemory` and a `TieredMemory` of the same capacity with
+Atari-sized states, then keeps adding to each while sampling from it,
+as training does, and reports the sample latency percentiles. In
+steady state the tiered memory's latencies should be close to the
+in-RAM one's. `stall` is how long adding waited on the spill thread.
+
+The tiered memory spills to `--spill-dir`, which needs room for
+roughly `--capacity` experiences (about 225 KB each).
+
+Usage:
+    python benchmarks/bench_tiered_memory.py --capacity 8000 --hot 2000
+"""
+import argparse
+import time
+
+import numpy as np
+from omegaconf import OmegaConf as config
+import torch
+
+from raijin.memory.experience import Experience
+from raijin.utilities.register import registry
+
+
+# ============================================
+#              make_experiences
+# ============================================
+def make_experiences(n: int, shape: tuple) -> list:
+    experiences = []
+    for i in range(n):
+        state = torch.rand(shape)
+        experiences.append(
+            Experience(state, i % 6, float(i % 3), torch.rand(shape), False)
+        )
+    return experiences
+
+
+# ============================================
+#                 run_memory
+# ============================================
+def run_memory(memory, experiences: list, args) -> dict:
+    for i in range(memory.capacity):
+        memory.add(experiences[i % len(experiences)])
+    latencies = []
+    start = time.perf_counter()
+    for i in range(args.steps):
+        memory.add(experiences[i % len(experiences)])
+        t = time.perf_counter()
+        memory.sample(args.batch_size)
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    p50, p99, pMax = 1000.0 * np.percentile(latencies, [50, 99, 100])
+    stats = {
+        "steps/s": args.steps / elapsed,
+        "p50 ms": p50,
+        "p99 ms": p99,
+        "max ms": pMax,
+        "stall s": getattr(memory, "stallTime", 0.0),
+    }
+    memory.close()
+    return stats
+
+
+# ============================================
+#                   bench
+# ============================================
+def bench(args: argparse.Namespace) -> None:
+    experiences = make_experiences(64, (4, 84, 84))
+    memories = {
+        "QMemory": {"name": "QMemory", "capacity": args.capacity},
+        "TieredMemory": {
+            "name": "TieredMemory",
+            "capacity": args.capacity,
+            "hotCapacity": args.hot,
+            "segmentSize": args.segment_size,
+            "hotFraction": args.hot_fraction,
+            "spillDir": args.spill_dir,
+        },
+    }
+    print(
+        f"{'memory':>14}{'steps/s':>10}{'p50 ms':>9}{'p99 ms':>9}"
+        f"{'max ms':>9}{'stall s':>9}"
+    )
+    for name, memoryParams in memories.items():
+        memory = registry[name](config.create(memoryParams))
+        stats = run_memory(memory, experiences, args)
+        row = f"{name:>14}" + "".join(
+            f"{value:>{9 if i else 10}.2f}"
+            for i, value in enumerate(stats.values())
+        )
+        print(row)
+
+
+# ============================================
+#                   main
+# ============================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--capacity", type=int, default=8000)
+    parser.add_argument("--hot", type=int, default=2000)
+    parser.add_argument("--segment-size", type=int, default=250)
+    parser.add_argument("--hot-fraction", type=float, default=0.5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--spill-dir", default=None)
+    bench(parser.parse_args())
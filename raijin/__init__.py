@@ -1,14 +1,22 @@
 __version__ = "0.1.0"
 
-from . import (
-    agents,
-    commands,
-    console,
-    io,
-    memory,
-    networks,
-    pipelines,
-    proctors,
-    trainers,
-    utilities,
+from raijin.utilities.lazy import lazy_submodules  # noqa: E402
+
+
+# The subpackages are imported the first time they're used, so that,
+# e.g., `raijin --help` doesn't import torch
+__getattr__, __dir__ = lazy_submodules(
+    __name__,
+    (
+        "agents",
+        "commands",
+        "console",
+        "io",
+        "memory",
+        "networks",
+        "pipelines",
+        "proctors",
+        "trainers",
+        "utilities",
+    ),
 )
@@ -1,12 +1,20 @@
+from typing import TYPE_CHECKING
+
 import numpy as np
-from gym import Env
 from omegaconf.dictconfig import DictConfig
 import torch
 
 from raijin.memory.experience import Experience
 from raijin.pipelines import base_pipeline as bp
+from raijin.utilities.timing import timers
 
 from .base_agent import BaseAgent
+from .qvalue_cache import QValueCache
+
+# Only needed for the annotations, and importing it here would make
+# gym a requirement for offline training
+if TYPE_CHECKING:
+    from gym import Env
 
 
 # ============================================
@@ -28,7 +36,7 @@ class QAgent(BaseAgent):
     # constructor
     # -----
     def __init__(
-        self, env: Env, pipeline: "bp.BasePipeline", params: DictConfig
+        self, env: "Env", pipeline: "bp.BasePipeline", params: DictConfig
     ) -> None:
         self.env = env
         self.pipeline = pipeline
@@ -36,7 +44,20 @@ class QAgent(BaseAgent):
         self.epsilonStop = params.epsilonStop
         self.epsilonDecayRate = params.epsilonDecayRate
         self.state = None
+        # The raw frame behind the current state, and a count of the
+        # episodes started (for recording trajectories)
+        self.frame = None
+        self.episodeId = -1
         self.decayStep = 0
+        # The epsilon used for the most recent training step
+        self.epsilon = self.epsilonStart
+        # Optional cache of the network's output for states that have
+        # already been seen. It's only used when purely exploiting
+        # (testing), since during training the network keeps changing
+        qCacheMB = params.get("qCacheMB", 0)
+        self.qCache = None
+        if qCacheMB:
+            self.qCache = QValueCache(int(qCacheMB * 2 ** 20))
 
     # -----
     # reset
@@ -45,8 +66,12 @@ class QAgent(BaseAgent):
         """
         Reverts the environment back to its initial state.
         """
-        frame = self.env.reset()
-        self.state = self.pipeline.process(frame, True)
+        with timers.time("env.reset"):
+            frame = self.env.reset()
+        self.frame = frame
+        self.episodeId += 1
+        with timers.time("pipeline.process"):
+            self.state = self.pipeline.process(frame, True)
 
     # -----
     # choose_action
@@ -68,24 +93,32 @@ class QAgent(BaseAgent):
         smaller so that there is a higher probability of selecting a
         "known good" action and, therefore, progressing further into
         the game.
+
+        If the agent has a Q-value cache, it's consulted when only
+        exploiting.
         """
+        useCache = self.qCache is not None and actionChoiceType == "exploit"
         if actionChoiceType == "train":
             n = np.random.random()
-            epsilon = self.epsilonStop + (
+            self.epsilon = self.epsilonStop + (
                 self.epsilonStart - self.epsilonStop
             ) * np.exp(-self.epsilonDecayRate * self.decayStep)
             self.decayStep += 1
-            if n <= epsilon:
+            if n <= self.epsilon:
                 actionChoiceType = "explore"
             else:
                 actionChoiceType = "exploit"
         if actionChoiceType == "explore":
             action = self.env.action_space.sample()
+        elif useCache:
+            action = torch.argmax(self.qCache.q_values(net, self.state)).item()
         elif actionChoiceType == "exploit":
             # state has shape (C, H, W), but needs shape (N, C, H, W) even
             # with only one sample
             state = torch.unsqueeze(self.state, 0)
-            action = torch.argmax(net(state)).item()
+            # Choosing an action never needs gradients
+            with torch.no_grad():
+                action = torch.argmax(net(state)).item()
         return action
 
     # -----
@@ -95,13 +128,17 @@ class QAgent(BaseAgent):
         """
         Transition from one game frame to the next.
         """
-        action = self.choose_action(actionChoiceType, net)
-        nextFrame, reward, done, _ = self.env.step(action)
-        nextState = self.pipeline.process(nextFrame, False)
+        with timers.time("choose_action"):
+            action = self.choose_action(actionChoiceType, net)
+        with timers.time("env.step"):
+            nextFrame, reward, done, _ = self.env.step(action)
+        with timers.time("pipeline.process"):
+            nextState = self.pipeline.process(nextFrame, False)
         experience = Experience(self.state, action, reward, nextState, done)
         if done:
             self.reset()
         else:
+            self.frame = nextFrame
             self.state = nextState
         return experience
 
@@ -113,6 +150,27 @@ class QAgent(BaseAgent):
             "envState": self.env.clone_full_state(),
             "pipeline": self.pipeline.state_dict(),
             "state": self.state,
+            "frame": self.frame,
+            "episodeId": self.episodeId,
             "decayStep": self.decayStep,
         }
         return stateDict
+
+    # -----
+    # load_state_dict
+    # -----
+    def load_state_dict(self, stateDict: dict) -> None:
+        """
+        Puts the agent (and the environment) back where it was when
+        the state dict was taken, so that play picks up mid-episode.
+        """
+        # The environment has to have been reset at least once before
+        # its state can be restored
+        self.env.reset()
+        self.env.restore_full_state(stateDict["envState"])
+        self.pipeline.load_state_dict(stateDict["pipeline"])
+        self.state = stateDict["state"]
+        # Older checkpoints don't have these
+        self.frame = stateDict.get("frame")
+        self.episodeId = stateDict.get("episodeId", -1)
+        self.decayStep = stateDict["decayStep"]
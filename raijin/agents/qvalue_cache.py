@@ -0,0 +1,135 @@
+from collections import OrderedDict
+import hashlib
+from typing import Dict
+
+import numpy as np
+import torch
+
+
+# ============================================
+#                QValueCache
+# ============================================
+class QValueCache:
+    """
+    A bounded least-recently-used cache of the network's Q-values,
+    keyed on a hash of the (stacked) state.
+
+    When playing greedily in a deterministic environment the agent
+    keeps running into the exact same states, both within an episode
+    and from one episode to the next. Remembering what the network
+    said about those states saves a forward pass each time.
+
+    The cached values are only valid for the weights that produced
+    them, so the cache empties itself when it's handed a different
+    network. If the weights of the same network are changed in place
+    (e.g., with `load_state_dict`), `clear` has to be called.
+
+    The cache holds at most `maxBytes` worth of entries (keys, values,
+    and an estimate of the bookkeeping overhead), evicting the least
+    recently used entries to make room.
+    """
+
+    # Rough per-entry cost of the dict slot and the tensor object
+    # itself, on top of the key and the tensor's data
+    _entryOverhead = 256
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, maxBytes: int) -> None:
+        self.maxBytes = maxBytes
+        self.nBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.net = None
+        self._entries = OrderedDict()
+
+    # -----
+    # q_values
+    # -----
+    def q_values(
+        self, net: torch.nn.Module, state: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        Returns the network's Q-values for the given state, which has
+        shape (C, H, W). The result has shape (1, nActions).
+        """
+        if net is not self.net:
+            self.clear()
+            self.net = net
+        key = self._hash(state)
+        qVals = self._entries.get(key)
+        if qVals is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return qVals
+        self.misses += 1
+        with torch.no_grad():
+            qVals = net(torch.unsqueeze(state, 0))
+        self._add(key, qVals)
+        return qVals
+
+    # -----
+    # clear
+    # -----
+    def clear(self) -> None:
+        """
+        Empties the cache. The counters are kept.
+        """
+        self._entries.clear()
+        self.nBytes = 0
+
+    # -----
+    # stats
+    # -----
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self.nBytes,
+        }
+
+    # -----
+    # __len__
+    # -----
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # -----
+    # _hash
+    # -----
+    def _hash(self, state: torch.Tensor) -> bytes:
+        """
+        blake2b is fast enough that hashing a state costs a small
+        fraction of a forward pass. The array is hashed through the
+        buffer protocol, so no copy of the state is made.
+        """
+        array = np.ascontiguousarray(state.detach().cpu().numpy())
+        return hashlib.blake2b(array, digest_size=16).digest()
+
+    # -----
+    # _add
+    # -----
+    def _add(self, key: bytes, qVals: torch.Tensor) -> None:
+        size = self._size(key, qVals)
+        # An entry that can never fit isn't cached
+        if size > self.maxBytes:
+            return
+        while self.nBytes + size > self.maxBytes:
+            oldKey, oldVals = self._entries.popitem(last=False)
+            self.nBytes -= self._size(oldKey, oldVals)
+            self.evictions += 1
+        self._entries[key] = qVals
+        self.nBytes += size
+
+    # -----
+    # _size
+    # -----
+    def _size(self, key: bytes, qVals: torch.Tensor) -> int:
+        valueBytes = qVals.element_size() * qVals.nelement()
+        return len(key) + valueBytes + self._entryOverhead
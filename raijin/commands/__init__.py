@@ -1,4 +1,16 @@
-from . import (
-    test,
-    train,
+from raijin.utilities.lazy import lazy_submodules
+
+
+# The submodules are imported the first time they're used
+__getattr__, __dir__ = lazy_submodules(
+    __name__,
+    (
+        "autotune",
+        "bench",
+        "reporting",
+        "serve",
+        "sweep",
+        "test",
+        "train",
+    ),
 )
@@ -0,0 +1,99 @@
+from typing import List
+
+from cleo import Command
+from omegaconf import OmegaConf as config
+
+from raijin.io.read import read_parameter_file
+from raijin.utilities.autotune import Autotuner
+from raijin.utilities.autotune import default_candidates
+from raijin.utilities.autotune import use_synthetic_env
+from raijin.utilities.io_utilities import sanitize_path
+
+
+# ============================================
+#               AutotuneCommand
+# ============================================
+class AutotuneCommand(Command):
+    """
+    Searches for the fastest training settings on this machine.
+
+    autotune
+        {paramFile : Yaml file containing the run parameters to tune.}
+        {--output=autotune.yaml : Overlay file to write the best settings to.}
+        {--synthetic : Use the synthetic env rather than the file's env.}
+        {--objective=samples : Maximize envSteps, updates, or samples/s.}
+        {--trial-seconds=10 : How long each trial trains for.}
+        {--probe-seconds=3 : When to check whether to stop a trial early.}
+        {--cutoff=0.5 : Stop trials scoring below this fraction of the best.}
+        {--trainers= : Comma-separated trainers to try.}
+        {--threads= : Comma-separated learner thread counts to try.}
+        {--batch-sizes= : Comma-separated batch sizes to try.}
+        {--learn-freqs= : Comma-separated learning frequencies to try.}
+    """
+
+    # -----
+    # handle
+    # -----
+    def handle(self) -> None:
+        params = read_parameter_file(self.argument("paramFile"))
+        if self.option("synthetic"):
+            params = use_synthetic_env(params)
+        candidates = default_candidates()
+        for knob, option, cast in (
+            ("trainer", "trainers", str),
+            ("threads", "threads", int),
+            ("batchSize", "batch-sizes", int),
+            ("learnFreq", "learn-freqs", int),
+        ):
+            if self.option(option):
+                candidates[knob] = self._parse_list(self.option(option), cast)
+        tuner = Autotuner(
+            params,
+            candidates,
+            trialSeconds=float(self.option("trial-seconds")),
+            probeSeconds=float(self.option("probe-seconds")),
+            cutoff=float(self.option("cutoff")),
+            objective=self.option("objective"),
+            progress=self._print_trial,
+        )
+        self.line(f"<warning>Tuning on {params.env.name}...</warning>")
+        self.line(
+            f"\t{'trainer':<15}{'threads':>8}{'batch':>7}{'freq':>6}"
+            f"{'env/s':>10}{'updates/s':>11}{'score':>11}"
+        )
+        best = tuner.run()
+        outputFile = sanitize_path(self.option("output"))
+        config.save(tuner.overlay(), outputFile)
+        self.line("<warning>Best</warning>:")
+        self._print_trial(best)
+        self.line(
+            f"<warning>Overlay written to {outputFile}</warning> (use it "
+            f"with `raijin train {self.argument('paramFile')} "
+            f"--overlay {outputFile}`)"
+        )
+
+    # -----
+    # _parse_list
+    # -----
+    def _parse_list(self, value: str, cast) -> List:
+        return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+    # -----
+    # _print_trial
+    # -----
+    def _print_trial(self, trial: dict) -> None:
+        s = trial["settings"]
+        msg = (
+            f"\t<info>{s['trainer']:<15}</info>{s['threads']:>8}"
+            f"{s['batchSize']:>7}{s['learnFreq']:>6}"
+        )
+        if "error" in trial:
+            self.line(f"{msg}  <error>{trial['error']}</error>")
+            return
+        msg += (
+            f"{trial['envStepsPerSec']:>10.1f}{trial['updatesPerSec']:>11.1f}"
+            f"{trial['score']:>11.1f}"
+        )
+        if trial["stoppedEarly"]:
+            msg += " (stopped early)"
+        self.line(msg)
@@ -0,0 +1,54 @@
+import json
+
+from cleo import Command
+
+from raijin.io.read import read_parameter_file
+from raijin.utilities.benchmark import get_bench_params
+from raijin.utilities.benchmark import run_benchmarks
+from raijin.utilities.io_utilities import sanitize_path
+
+
+# ============================================
+#                BenchCommand
+# ============================================
+class BenchCommand(Command):
+    """
+    Benchmarks raijin's hot paths on a synthetic Atari-shaped env.
+
+    bench
+        {paramFile? : Yaml file whose pipeline, nets, memory, etc. to use.}
+        {--output=bench.json : File to write the results to as json.}
+        {--quick : Run fewer and smaller benchmarks.}
+    """
+
+    # -----
+    # handle
+    # -----
+    def handle(self) -> None:
+        params = None
+        if self.argument("paramFile"):
+            params = read_parameter_file(self.argument("paramFile"))
+        params = get_bench_params(params)
+        self.line("<warning>Benchmarking...</warning>")
+        self.line(
+            f"\t{'benchmark':<18}{'settings':<32}{'mean ms':>10}"
+            f"{'p50 ms':>10}{'p99 ms':>10}{'per s':>12}"
+        )
+        results = run_benchmarks(
+            params, quick=self.option("quick"), progress=self._print_result
+        )
+        outputFile = sanitize_path(self.option("output"))
+        with open(outputFile, "w") as fd:
+            json.dump(results, fd, indent=1)
+        self.line(f"<warning>Results written to {outputFile}</warning>")
+
+    # -----
+    # _print_result
+    # -----
+    def _print_result(self, result: dict) -> None:
+        settings = ", ".join(f"{k}={v}" for k, v in result["settings"].items())
+        self.line(
+            f"\t<info>{result['name']:<18}</info>{settings:<32}"
+            f"{result['meanMs']:>10.3f}{result['p50Ms']:>10.3f}"
+            f"{result['p99Ms']:>10.3f}{result['perSec']:>12.1f}"
+        )
@@ -0,0 +1,44 @@
+from cleo import Command
+
+
+# ============================================
+#              ReportingCommand
+# ============================================
+class ReportingCommand(Command):
+    """
+    Base class for the commands that print the same end-of-run
+    reports.
+    """
+
+    # -----
+    # _print_phases
+    # -----
+    def _print_phases(self, report: dict, rates: str) -> None:
+        """
+        Prints a timing report (see `raijin.utilities.timing`). `rates`
+        is the line of throughput numbers, which differs by command.
+        """
+        self.line("<warning>Timings</warning>:")
+        self.line(f"\t{rates} over {report['elapsedSec']:.1f} s")
+        for name, phase in report["phases"].items():
+            msg = f"\t<info>{name}</info>: {phase['share']:.1%} of the time, "
+            msg += f"{phase['count']} calls, mean {phase['meanMs']:.3f} ms, "
+            msg += f"p50/p90/p99 {phase['p50Ms']:.3f}/{phase['p90Ms']:.3f}/"
+            msg += f"{phase['p99Ms']:.3f} ms"
+            self.line(msg)
+
+    # -----
+    # _print_resources
+    # -----
+    def _print_resources(self, report: dict) -> None:
+        self.line("<warning>Resources</warning>:")
+        msg = f"\t<info>Cores</info>: {report['cores']}"
+        if report["oversubscribed"]:
+            msg += " <error>(oversubscribed)</error>"
+        self.line(msg)
+        self.line(f"\t<info>Utilization</info>: {report['utilization']:.1%}")
+        for role, roleReport in report["roles"].items():
+            msg = f"\t<info>{role}</info>: cores {roleReport['cores']}, "
+            msg += f"{roleReport['threads']} thread(s), "
+            msg += f"{roleReport['utilization']:.1%} utilization"
+            self.line(msg)
@@ -0,0 +1,91 @@
+from raijin.utilities.serving import BatchingPolicy
+from raijin.utilities.serving import make_server
+
+from .test import TestCommand
+
+
+# ============================================
+#                 ServeCommand
+# ============================================
+class ServeCommand(TestCommand):
+    """
+    Serves the specified agent's policy to other local processes.
+
+    serve
+        {path : Path to the directory holding the model and params.}
+        {--scripted : Use the torchscript model instead of model.pt.}
+        {--quantize= : Serve an int8 copy of the model (dynamic or static).}
+        {--calibration-steps=256 : Random steps recorded for quantization.}
+        {--host=127.0.0.1 : Address to listen on.}
+        {--port=8000 : Port to listen on.}
+        {--socket= : Listen on this unix socket instead of host:port.}
+        {--max-batch=32 : Most states run through the network at once.}
+        {--max-wait-ms=5 : Longest a request waits for a batch to fill.}
+    """
+
+    # -----
+    # handle
+    # -----
+    def handle(self) -> None:
+        self.line("<warning>Initializing...</warning>")
+        params, proctor = self._load_proctor()
+        # The state shape comes from running a frame through the
+        # pipeline
+        proctor.agent.reset()
+        stateShape = tuple(proctor.agent.state.shape)
+        nActions = proctor.agent.env.action_space.n
+        policy = BatchingPolicy(
+            proctor.net,
+            stateShape,
+            maxBatch=int(self.option("max-batch")),
+            maxWait=float(self.option("max-wait-ms")) / 1000.0,
+            scheduler=proctor.scheduler,
+        )
+        server = make_server(
+            policy,
+            nActions,
+            host=self.option("host"),
+            port=int(self.option("port")),
+            socketPath=self.option("socket") or None,
+        )
+        address = self.option("socket") or (
+            f"http://{self.option('host')}:{server.server_port}"
+        )
+        self.line(f"<warning>Serving on {address}</warning>")
+        self.line(f"\t<info>State shape</info>: {stateShape}")
+        self.line(f"\t<info>Actions</info>: {nActions}")
+        endpoints = "GET /info, GET /stats, POST /act, POST /q"
+        self.line(f"\t<info>Endpoints</info>: {endpoints}")
+        policy.start()
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            policy.stop()
+        self.line("\n")
+        self._print_stats(policy.stats())
+        if proctor.scheduler is not None:
+            self._print_resources(proctor.scheduler.report())
+        self.line("<warning>Done.</warning>")
+
+    # -----
+    # _print_stats
+    # -----
+    def _print_stats(self, stats: dict) -> None:
+        self.line("<warning>Serving stats</warning>:")
+        self.line(
+            f"\t<info>Requests</info>: {stats['requests']} "
+            f"({stats['requestsPerSec']:.1f}/s)"
+        )
+        self.line(
+            f"\t<info>States</info>: {stats['states']} in "
+            f"{stats['batches']} batches"
+        )
+        if "p50LatencyMs" in stats:
+            self.line(
+                f"\t<info>Latency</info>: p50 {stats['p50LatencyMs']:.2f} ms, "
+                f"p90 {stats['p90LatencyMs']:.2f} ms, "
+                f"p99 {stats['p99LatencyMs']:.2f} ms"
+            )
@@ -0,0 +1,86 @@
+from cleo import Command
+
+from raijin.io.read import read_parameter_file
+from raijin.utilities.sweep import Sweep
+
+
+# ============================================
+#                SweepCommand
+# ============================================
+class SweepCommand(Command):
+    """
+    Trains variants of a parameter file in parallel and ranks them.
+
+    sweep
+        {paramFile : Yaml file containing the base run parameters.}
+        {sweepFile : Yaml file describing the values to try.}
+        {--overlay=* : Parameter files merged over paramFile, in order.}
+    """
+
+    # -----
+    # handle
+    # -----
+    def handle(self) -> None:
+        params = read_parameter_file(
+            self.argument("paramFile"), self.option("overlay")
+        )
+        sweepParams = read_parameter_file(self.argument("sweepFile"))
+        sweep = Sweep(params, sweepParams, progress=self._print_event)
+        self.line(
+            f"<warning>Sweeping {len(sweep.trials)} trials, "
+            f"{len(sweep.slots)} at a time...</warning>"
+        )
+        if sweep.halving is not None:
+            self.line(
+                f"\t<info>Halving at episodes</info>: {sweep.halving.rungs} "
+                f"(keeping the top 1/{sweep.halving.eta})"
+            )
+        trials = sweep.run()
+        fileName = sweep.save()
+        self._print_summary(trials)
+        self.line(f"<warning>Summary written to {fileName}</warning>")
+
+    # -----
+    # _print_event
+    # -----
+    def _print_event(self, trial: dict, event: str) -> None:
+        msg = f"\t<info>Trial {trial['id']}</info> {event}"
+        if event == "started":
+            msg += f" on cores {trial['cores']}: {trial['settings']}"
+        elif event == "stopped":
+            msg += f" after {trial['episodes']} episodes "
+            msg += f"(score {trial['score']:.4g})"
+        elif event == "completed":
+            msg += f" (score {trial['score']:.4g})"
+        elif event == "failed":
+            msg += f": <error>{trial['error']}</error>"
+        self.line(msg)
+
+    # -----
+    # _print_summary
+    # -----
+    def _print_summary(self, trials: list) -> None:
+        keys = list(trials[0]["settings"]) if trials else []
+        widths = [max(len(key), 10) for key in keys]
+        header = f"\t{'rank':>4}{'trial':>6}  {'status':<10}{'episodes':>9}"
+        header += f"{'score':>11}  "
+        header += "  ".join(f"{k:>{w}}" for k, w in zip(keys, widths))
+        self.line("<warning>Results</warning>:")
+        self.line(header)
+        for rank, trial in enumerate(trials, start=1):
+            score = "-" if trial["score"] is None else f"{trial['score']:.4g}"
+            row = f"\t{rank:>4}{trial['id']:>6}  {trial['status']:<10}"
+            row += f"{trial['episodes']:>9}{score:>11}  "
+            row += "  ".join(
+                f"{self._format(trial['settings'][k]):>{w}}"
+                for k, w in zip(keys, widths)
+            )
+            self.line(row)
+
+    # -----
+    # _format
+    # -----
+    def _format(self, value) -> str:
+        if isinstance(value, float):
+            return f"{value:.4g}"
+        return str(value)
@@ -1,26 +1,42 @@
 import os
 from typing import Tuple
 
-from cleo import Command
 from clikit.ui.components.progress_bar import ProgressBar
 import numpy as np
 from omegaconf.dictconfig import DictConfig
 import torch
 
 from raijin.io.read import read_parameter_file
+from raijin.io.write import save_metrics
+from raijin.networks.quantization import compare_networks
+from raijin.networks.quantization import quantize_network
+from raijin.networks.quantization import record_states
+from raijin.networks.scripting import optimize_for_inference
 from raijin.proctors.base_proctor import BaseProctor
+from raijin.utilities.evaluation import evaluate_in_parallel
 from raijin.utilities.managers import get_proctor
+from raijin.utilities.managers import get_scheduler
+from raijin.utilities.managers import get_trajectory_recorder
+from raijin.utilities.timing import timers
+
+from .reporting import ReportingCommand
 
 
 # ============================================
 #                 TestCommand
 # ============================================
-class TestCommand(Command):
+class TestCommand(ReportingCommand):
     """
     Tests the specified agent.
 
     test
         {path : Path to the directory holding the model and params.}
+        {--scripted : Use the torchscript model instead of model.pt.}
+        {--quantize= : Test an int8 copy of the model (dynamic or static).}
+        {--calibration-steps=256 : Random steps recorded for quantization.}
+        {--workers=1 : Number of processes to spread the episodes across.}
+        {--record= : Directory to record the played trajectories to.}
+        {--timings : Time each phase of testing and report a breakdown.}
     """
     # -----
     # handle
@@ -44,17 +60,87 @@ class TestCommand(Command):
     # _initialize
     # -----
     def _initialize(self) -> Tuple:
-        path = self.argument("path")
-        params = read_parameter_file(os.path.join(path, "params.yaml"))
-        # Load the trained network parameters from the final model file
-        modelStateDict = torch.load(os.path.join(path, "model.pt"))
-        proctor = get_proctor(params, modelStateDict)
+        params, proctor = self._load_proctor()
         progBar = self._get_progress_bar(proctor.nEpisodes)
         msg = f"<info>Episode Reward</info>: {proctor.episodeReward}"
         progBar.set_message(msg)
+        proctor.recorder = None
+        if self.option("record"):
+            proctor.recorder = get_trajectory_recorder(
+                params,
+                self.option("record"),
+                nActions=proctor.agent.env.action_space.n,
+            )
         proctor.pre_test()
+        if self.option("timings"):
+            timers.enable()
         return (params, proctor, progBar)
 
+    # -----
+    # _load_proctor
+    # -----
+    def _load_proctor(self) -> Tuple:
+        """
+        Builds a proctor around the model in the given directory,
+        honoring the --scripted and --quantize options.
+        """
+        path = self.argument("path")
+        if self.option("scripted") and self.option("quantize"):
+            raise ValueError(
+                "--quantize works on the eager model and can't be combined "
+                "with --scripted."
+            )
+        params = read_parameter_file(os.path.join(path, "params.yaml"))
+        if self.option("scripted"):
+            # The torchscript model carries its own weights and doesn't
+            # need the network's class definition
+            net = torch.jit.load(os.path.join(path, "model_scripted.pt"))
+            net = optimize_for_inference(net)
+            proctor = get_proctor(params, None, nets=[net])
+        else:
+            # Load the trained network parameters from the final model
+            # file
+            modelStateDict = torch.load(os.path.join(path, "model.pt"))
+            proctor = get_proctor(params, modelStateDict)
+        proctor.scheduler = get_scheduler(params)
+        # Nothing else is running, so testing can use every core
+        proctor.role = "testing"
+        proctor.quantization = None
+        if self.option("quantize"):
+            self._quantize(proctor)
+        return (params, proctor)
+
+    # -----
+    # _quantize
+    # -----
+    def _quantize(self, proctor: BaseProctor) -> None:
+        """
+        Swaps the proctor's network for an int8 copy. The states from
+        a short random rollout are used to calibrate the copy (for
+        static quantization) and to compare it against the original.
+        """
+        method = self.option("quantize")
+        nSteps = int(self.option("calibration-steps"))
+        states = record_states(proctor.agent, proctor.net, nSteps)
+        qnet = quantize_network(proctor.net, method, states)
+        results = compare_networks(proctor.net, qnet, states)
+        self.line(f"<warning>Quantization ({method})</warning>:")
+        self.line(
+            f"\t<info>float32 latency</info>: "
+            f"{results['referenceLatencyMs']:.3f} ms"
+        )
+        self.line(
+            f"\t<info>int8 latency</info>: "
+            f"{results['candidateLatencyMs']:.3f} ms "
+            f"({results['speedup']:.2f}x)"
+        )
+        agreement = results["agreement"]
+        self.line(f"\t<info>Action agreement</info>: {agreement:.1%}")
+        # Parallel testing needs the original network and calibration
+        # states so each worker can make its own int8 copy
+        proctor.quantization = (proctor.net, method, states)
+        proctor.net = qnet
+
     # -----
     # _test
     # -----
@@ -66,6 +152,15 @@ class TestCommand(Command):
         # the same for every episode
         if "Deterministic" in params.env.name:
             proctor.nEpisodes = 1
+        nWorkers = min(int(self.option("workers")), proctor.nEpisodes)
+        # The worker processes can't record or be timed, so recording
+        # and timing are serial
+        if proctor.recorder is not None or timers.enabled:
+            nWorkers = 1
+        self.parallel = nWorkers > 1
+        if self.parallel:
+            self._test_parallel(params, proctor, progBar, nWorkers)
+            return (params, proctor, progBar)
         for proctor.episode in range(proctor.nEpisodes):
             proctor.test_step_start()
             proctor.test()
@@ -76,6 +171,41 @@ class TestCommand(Command):
         progBar.finish()
         return (params, proctor, progBar)
 
+    # -----
+    # _test_parallel
+    # -----
+    def _test_parallel(
+        self,
+        params: DictConfig,
+        proctor: BaseProctor,
+        progBar: ProgressBar,
+        nWorkers: int,
+    ) -> None:
+        """
+        Spreads the episodes across worker processes that all share
+        the proctor's network. The rewards are merged into the
+        proctor's metrics as though it had played every episode.
+        """
+
+        def on_episode(episodeReward: float) -> None:
+            progBar.set_message(f"<info>Episode Reward</info>: {episodeReward}")
+            progBar.advance()
+
+        net, method, states = proctor.net, None, None
+        if proctor.quantization is not None:
+            net, method, states = proctor.quantization
+        rewards = evaluate_in_parallel(
+            params,
+            net,
+            proctor.nEpisodes,
+            nWorkers,
+            on_episode,
+            quantization=method,
+            calibrationStates=states,
+        )
+        proctor.metrics["episodeRewards"].extend(rewards)
+        progBar.finish()
+
     # -----
     # _cleanup
     # -----
@@ -87,6 +217,27 @@ class TestCommand(Command):
         self.line(f"\t<info>Avg. score</info>: {avgReward}")
         self.line(f"\t<info>Std. Dev</info>: {stdDev}")
         proctor.post_test()
+        if timers.enabled:
+            timers.disable()
+            proctor.metrics["timings"] = timers.report()
+            # Kept apart from the training metrics in the same directory
+            save_metrics(
+                self.argument("path"), proctor.metrics, "test_metrics.yaml"
+            )
+            self._print_timings(proctor.metrics["timings"])
+        if proctor.recorder is not None:
+            proctor.recorder.close()
+            self.line(
+                f"<warning>Recorded</warning> {proctor.recorder.nRecorded} "
+                f"transitions to {proctor.recorder.outputDir}"
+            )
+        # The workers each have their own cache, so the proctor's own
+        # one is only used when testing serially
+        qCache = getattr(proctor.agent, "qCache", None)
+        if qCache is not None and not self.parallel:
+            self._print_cache(qCache.stats())
+        if proctor.scheduler is not None:
+            self._print_resources(proctor.scheduler.report())
 
     # -----
     # _get_progress_bar
@@ -98,3 +249,27 @@ class TestCommand(Command):
         formatStr += "\n\t%message%"
         progBar.set_format(formatStr)
         return progBar
+
+    # -----
+    # _print_cache
+    # -----
+    def _print_cache(self, stats: dict) -> None:
+        self.line("<warning>Q-value cache</warning>:")
+        self.line(
+            f"\t<info>Hits</info>: {stats['hits']} "
+            f"({stats['hitRate']:.1%} of {stats['hits'] + stats['misses']})"
+        )
+        self.line(f"\t<info>Misses</info>: {stats['misses']}")
+        self.line(
+            f"\t<info>Entries</info>: {stats['entries']} "
+            f"({stats['bytes'] / 2 ** 20:.1f} MB), "
+            f"{stats['evictions']} evicted"
+        )
+
+    # -----
+    # _print_timings
+    # -----
+    def _print_timings(self, report: dict) -> None:
+        self._print_phases(
+            report, f"<info>Env steps/s</info>: {report['envStepsPerSec']:.1f}"
+        )
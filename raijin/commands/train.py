@@ -1,32 +1,61 @@
+import time
 from typing import Tuple
 
-from cleo import Command
 from clikit.ui.components.progress_bar import ProgressBar
 from omegaconf.dictconfig import DictConfig
 
+from raijin.io.async_write import AsyncCheckpointWriter
+from raijin.io.metrics_log import MetricsLog
+from raijin.io.trajectories import TrajectoryRecorder
+from raijin.io.read import load_checkpoint
 from raijin.io.read import read_parameter_file
 from raijin.io.write import save_checkpoint
 from raijin.io.write import save_final_model
+from raijin.io.write import save_metrics
 from raijin.io.write import save_params
 from raijin.trainers.base_trainer import BaseTrainer
+from raijin.utilities.distributed import launch
+from raijin.utilities.managers import get_checkpoint_store
+from raijin.utilities.managers import get_evaluator
+from raijin.utilities.managers import get_metrics_log
+from raijin.utilities.managers import get_scheduler
 from raijin.utilities.managers import get_trainer
+from raijin.utilities.managers import get_trajectory_recorder
+from raijin.utilities.metrics_server import MetricsServer
+from raijin.utilities.profiling import StepProfiler
+from raijin.utilities.timing import timers
+
+from .reporting import ReportingCommand
 
 
 # ============================================
 #                TrainCommand
 # ============================================
-class TrainCommand(Command):
+class TrainCommand(ReportingCommand):
     """
     Trains an agent according to the given parameter file.
 
     train
         {paramFile : Yaml file containing run parameters.}
+        {--nprocs=1 : Number of data-parallel training processes.}
+        {--port=29500 : Local port used to set up the process group.}
+        {--resume= : Checkpoint directory to pick training back up from.}
+        {--overlay=* : Parameter files merged over paramFile, in order.}
+        {--timings : Time each phase of training and report a breakdown.}
+        {--profile : Profile a window of training steps with torch.}
+        {--profile-warmup=100 : Training steps to run before profiling.}
+        {--profile-steps=20 : Number of training steps to profile.}
+        {--profile-top=30 : Number of operators in the profile's tables.}
+        {--metrics-port= : Serve live metrics (Prometheus) on this local port.}
     """
 
     # -----
     # handle
     # -----
     def handle(self) -> None:
+        if int(self.option("nprocs")) > 1:
+            self._handle_distributed()
+            return
         self.line("<warning>Initializing...</warning>")
         params, trainer, progBar = self._initialize()
         self.line("<warning>Training...</warning>")
@@ -37,16 +66,107 @@ class TrainCommand(Command):
         self._cleanup(params, trainer)
         self.line("<warning>Done.</warning>")
 
+    # -----
+    # _handle_distributed
+    # -----
+    def _handle_distributed(self) -> None:
+        """
+        Trains with one process per copy of the agent. Each process
+        plays its own game and fills its own memory buffer, and their
+        gradients are averaged every learning step.
+        """
+        nProcs = int(self.option("nprocs"))
+        # These only see the process they're run in
+        for option in ("timings", "profile", "metrics-port"):
+            if self.option(option):
+                raise ValueError(f"--{option} isn't supported with --nprocs.")
+        params = read_parameter_file(
+            self.argument("paramFile"), self.option("overlay")
+        )
+        progBar = self._get_progress_bar(params.trainer.nEpisodes)
+
+        def on_episode(episode: int, episodeReward: float) -> None:
+            progBar.set_message(f"<info>Episode Reward</info>: {episodeReward}")
+            # Picks up after the checkpoint's episode when resuming
+            progBar.set_progress(episode + 1)
+
+        self.line(f"<warning>Training with {nProcs} processes...</warning>")
+        if self.option("resume"):
+            chkptDir = self.option("resume")
+            self.line(f"<warning>Resuming from {chkptDir}</warning>")
+        self.line("\n")
+        progBar.start()
+        launch(
+            params,
+            nProcs,
+            int(self.option("port")),
+            on_episode,
+            resume=self.option("resume"),
+        )
+        progBar.finish()
+        self.line("\n")
+        self.line("<warning>Done.</warning>")
+
     # -----
     # _initialize
     # -----
     def _initialize(self) -> Tuple:
-        params = read_parameter_file(self.argument("paramFile"))
+        params = read_parameter_file(
+            self.argument("paramFile"), self.option("overlay")
+        )
+        # Evaluation runs in its own process alongside training. It's
+        # set up first so that a bad evaluation section fails right away
+        self.evaluator = get_evaluator(params)
         trainer = get_trainer(params)
+        trainer.scheduler = get_scheduler(params)
+        if self.option("resume"):
+            chkptDir = self.option("resume")
+            self.line(f"<warning>Resuming from {chkptDir}</warning>")
+            load_checkpoint(trainer, chkptDir, params.io.checkpointBase)
         progBar = self._get_progress_bar(trainer.nEpisodes)
-        msg = f"<info>Episode Reward</info>: {trainer.episodeReward}"
-        progBar.set_message(msg)
+        progBar.set_message(self._progress_message(trainer))
+        # Every transition is recorded, including the ones used to
+        # fill the memory
+        if trainer.agent is not None:
+            trainer.recorder = get_trajectory_recorder(
+                params, nActions=trainer.agent.env.action_space.n
+            )
+        # Started before pre_train so that filling the memory shows up
+        self.metricsServer = None
+        if self.option("metrics-port"):
+            self.metricsServer = MetricsServer(
+                trainer, port=int(self.option("metrics-port"))
+            )
+            self.metricsServer.start()
+            self.line(
+                f"<warning>Serving metrics at {self.metricsServer.address}"
+                "</warning>"
+            )
         trainer.pre_train()
+        # Started after pre_train so that filling the memory doesn't
+        # count toward the env step rate
+        trainer.metricsLog = get_metrics_log(params, trainer.startEpisode)
+        if self.option("timings"):
+            timers.enable()
+        if self.option("profile"):
+            trainer.profiler = StepProfiler(
+                params.io.outputDir,
+                warmup=int(self.option("profile-warmup")),
+                nSteps=int(self.option("profile-steps")),
+                topN=int(self.option("profile-top")),
+            )
+            trainer.profiler.start()
+        # Checkpoints are either written in the background or inline,
+        # and either to a checkpoint store or to their own directories
+        self.checkpointStore = get_checkpoint_store(params)
+        self.checkpointWriter = None
+        if params.io.get("asyncCheckpoint", False):
+            self.checkpointWriter = AsyncCheckpointWriter(
+                params, self.checkpointStore
+            )
+        if self.evaluator is not None:
+            self.evaluator.initialize_metrics(trainer.metrics)
+            self.evaluator.start()
         return (params, trainer, progBar)
 
     # -----
@@ -56,15 +176,20 @@ class TrainCommand(Command):
         self, params: DictConfig, trainer: BaseTrainer, progBar: ProgressBar
     ) -> Tuple:
         progBar.start()
-        for trainer.episode in range(trainer.nEpisodes):
+        # Picks up after the checkpoint's episode when resuming
+        progBar.advance(trainer.startEpisode)
+        for trainer.episode in range(trainer.startEpisode, trainer.nEpisodes):
             trainer.train_step_start()
             trainer.train()
-            msg = f"<info>Episode Reward</info>: {trainer.episodeReward}"
+            msg = self._progress_message(trainer)
+            msg += self._evaluate(trainer)
             progBar.set_message(msg)
             trainer.train_step_end()
+            if self.metricsServer is not None:
+                self.metricsServer.publish()
             progBar.advance()
             if trainer.episode % params.io.checkpointFreq == 0:
-                save_checkpoint(trainer, params)
+                self._save_checkpoint(trainer, params)
         progBar.finish()
         return (params, trainer, progBar)
 
@@ -73,11 +198,91 @@ class TrainCommand(Command):
     # -----
     def _cleanup(
         self, params: DictConfig, trainer: BaseTrainer) -> None:
+        if self.metricsServer is not None:
+            self.metricsServer.close()
         trainer.post_train()
+        if timers.enabled:
+            timers.disable()
+            trainer.metrics["timings"] = timers.report()
+            save_metrics(params.io.outputDir, trainer.metrics)
+            self._print_timings(trainer.metrics["timings"])
+        if trainer.profiler is not None:
+            trainer.profiler.close()
+            self._print_profiler(trainer.profiler)
+        if trainer.metricsLog is not None:
+            trainer.metricsLog.close()
+            self._print_metrics_log(trainer.metricsLog)
+        if trainer.recorder is not None:
+            trainer.recorder.close()
+            self._print_recorder(trainer.recorder)
+        if self.checkpointWriter is not None:
+            self.checkpointWriter.close()
+            self._print_checkpoints(self.checkpointWriter)
+        if self.evaluator is not None:
+            self.evaluator.close(trainer.metrics)
+            save_metrics(params.io.outputDir, trainer.metrics)
+            self._print_evaluation(trainer.metrics)
         # In case there aren't any checkpoints, we save a copy of the
         # parameter file to be used during testing
         save_params(params.io.outputDir, params)
         save_final_model(trainer, params.io.checkpointBase, params.io.outputDir)
+        if trainer.scheduler is not None:
+            self._print_resources(trainer.scheduler.report())
+
+    # -----
+    # _save_checkpoint
+    # -----
+    def _save_checkpoint(
+        self, trainer: BaseTrainer, params: DictConfig
+    ) -> None:
+        start = time.perf_counter()
+        # Keeps the metrics log in step with the checkpoints
+        if trainer.metricsLog is not None:
+            trainer.metricsLog.flush()
+        if self.checkpointWriter is not None:
+            with timers.time("save_checkpoint"):
+                self.checkpointWriter.submit(trainer)
+        elif self.checkpointStore is not None:
+            with timers.time("save_checkpoint"):
+                self.checkpointStore.add(
+                    params,
+                    trainer.metrics,
+                    trainer.state_dict(),
+                    trainer.memory,
+                )
+        else:
+            save_checkpoint(trainer, params)
+        if self.metricsServer is not None:
+            self.metricsServer.checkpoint_saved(time.perf_counter() - start)
+
+    # -----
+    # _progress_message
+    # -----
+    def _progress_message(self, trainer: BaseTrainer) -> str:
+        # Offline trainers don't play any episodes
+        if trainer.agent is None:
+            return f"<info>Mean Loss</info>: {trainer.episodeLoss:.4g}"
+        return f"<info>Episode Reward</info>: {trainer.episodeReward}"
+
+    # -----
+    # _evaluate
+    # -----
+    def _evaluate(self, trainer: BaseTrainer) -> str:
+        """
+        Hands the current weights to the evaluator when an evaluation
+        is due and collects any that have finished. Returns the latest
+        evaluation score for the progress bar.
+        """
+        if self.evaluator is None:
+            return ""
+        if self.evaluator.due(trainer.episode):
+            self.evaluator.submit(trainer.episode, trainer.snapshot_weights())
+        self.evaluator.poll(trainer.metrics)
+        if not trainer.metrics["evalEpisodes"]:
+            return ""
+        episode = trainer.metrics["evalEpisodes"][-1]
+        score = trainer.metrics["evalMeanRewards"][-1]
+        return f"\n\t<info>Eval Reward (episode {episode})</info>: {score}"
 
     # -----
     # _get_progress_bar
@@ -89,3 +294,83 @@ class TrainCommand(Command):
         formatStr += "\n\t%message%"
         progBar.set_format(formatStr)
         return progBar
+
+    # -----
+    # _print_checkpoints
+    # -----
+    def _print_checkpoints(self, writer: AsyncCheckpointWriter) -> None:
+        self.line("<warning>Checkpoints</warning>:")
+        self.line(f"\t<info>Written</info>: {writer.nWritten}")
+        self.line(f"\t<info>Write time</info>: {writer.writeTime:.2f} s")
+        self.line(
+            f"\t<info>Training stalled</info>: {writer.stallTime:.2f} s "
+            "(waiting on the previous checkpoint)"
+        )
+
+    # -----
+    # _print_metrics_log
+    # -----
+    def _print_metrics_log(self, metricsLog: MetricsLog) -> None:
+        self.line("<warning>Metrics log</warning>:")
+        self.line(f"\t<info>Directory</info>: {metricsLog.logDir}")
+        self.line(
+            f"\t<info>Records</info>: {metricsLog.steps.nWritten} step, "
+            f"{metricsLog.episodes.nWritten} episode"
+        )
+
+    # -----
+    # _print_recorder
+    # -----
+    def _print_recorder(self, recorder: TrajectoryRecorder) -> None:
+        self.line("<warning>Trajectories</warning>:")
+        self.line(f"\t<info>Directory</info>: {recorder.outputDir}")
+        self.line(
+            f"\t<info>Recorded</info>: {recorder.nRecorded} transitions "
+            f"in {recorder.nFiles} file(s)"
+        )
+        self.line(
+            f"\t<info>Write time</info>: {recorder.writeTime:.2f} s "
+            f"(stalled {recorder.stallTime:.2f} s)"
+        )
+
+    # -----
+    # _print_evaluation
+    # -----
+    def _print_evaluation(self, metrics: dict) -> None:
+        self.line("<warning>Evaluation</warning>:")
+        for episode, score in zip(
+            metrics["evalEpisodes"], metrics["evalMeanRewards"]
+        ):
+            self.line(f"\t<info>Episode {episode}</info>: {score}")
+        if self.evaluator.nSkipped:
+            self.line(
+                f"\t<info>Skipped</info>: {self.evaluator.nSkipped} "
+                "(evaluator busy)"
+            )
+
+    # -----
+    # _print_profiler
+    # -----
+    def _print_profiler(self, profiler: StepProfiler) -> None:
+        self.line("<warning>Profile</warning>:")
+        if not profiler.nProfiled:
+            self.line(
+                f"\t<error>Training ended before the {profiler.warmup} "
+                "warmup steps were done</error>"
+            )
+            return
+        self.line(f"\t<info>Directory</info>: {profiler.profileDir}")
+        self.line(
+            f"\t<info>Steps profiled</info>: {profiler.nProfiled} after "
+            f"{profiler.warmup} of warmup"
+        )
+
+    # -----
+    # _print_timings
+    # -----
+    def _print_timings(self, report: dict) -> None:
+        self._print_phases(
+            report,
+            f"<info>Env steps/s</info>: {report['envStepsPerSec']:.1f}, "
+            f"<info>updates/s</info>: {report['updatesPerSec']:.1f}",
+        )
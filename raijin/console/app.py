@@ -1,12 +1,26 @@
+import ast
+import importlib
+import importlib.util
 from typing import List
 
 from cleo import Application
+from cleo import Command
 
-from raijin.commands.test import TestCommand
-from raijin.commands.train import TrainCommand
 from raijin.utilities.config import ApplicationConfig
 
 
+# Where each command is defined. A command's module (and so torch, etc.)
+# is only imported when the command is run
+commandLocations = (
+    ("raijin.commands.autotune", "AutotuneCommand"),
+    ("raijin.commands.bench", "BenchCommand"),
+    ("raijin.commands.serve", "ServeCommand"),
+    ("raijin.commands.sweep", "SweepCommand"),
+    ("raijin.commands.test", "TestCommand"),
+    ("raijin.commands.train", "TrainCommand"),
+)
+
+
 # ============================================
 #              RaijinApplication
 # ============================================
@@ -24,7 +38,51 @@ class RaijinApplication(Application):
     # -----
     def _get_commands(self) -> List:
         commandList = [
-            TestCommand,
-            TrainCommand,
+            lazy_command(moduleName, className)
+            for moduleName, className in commandLocations
         ]
         return commandList
+
+
+# ============================================
+#                 LazyCommand
+# ============================================
+class LazyCommand(Command):
+    """
+    Stands in for a command until it's run, at which point the real
+    command is made and handed the parsed arguments.
+    """
+
+    moduleName = None
+    className = None
+
+    # -----
+    # wrap_handle
+    # -----
+    def wrap_handle(self, args, io, command):
+        module = importlib.import_module(self.moduleName)
+        realCommand = getattr(module, self.className)()
+        realCommand.set_application(self.application)
+        return realCommand.wrap_handle(args, io, command)
+
+
+# ============================================
+#                lazy_command
+# ============================================
+def lazy_command(moduleName: str, className: str) -> type:
+    """
+    Returns a `LazyCommand` subclass for the given command class. The
+    signature and description come from the command's docstring, which
+    is read from the module's source rather than by importing it.
+    """
+    spec = importlib.util.find_spec(moduleName)
+    with open(spec.origin, "r") as fd:
+        tree = ast.parse(fd.read())
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == className:
+            doc = ast.get_docstring(node, clean=False)
+            break
+    else:
+        raise ValueError(f"`{moduleName}` doesn't define `{className}`.")
+    attrs = {"__doc__": doc, "moduleName": moduleName, "className": className}
+    return type(className, (LazyCommand,), attrs)
@@ -1,7 +1,5 @@
 import warnings
 
-import pretty_errors  # noqa: F401
-
 from .app import RaijinApplication
 
 
@@ -12,4 +10,10 @@ warnings.filterwarnings("ignore")
 #                     run
 # ============================================
 def run() -> None:
+    # Only installed for development, and only wanted once a command
+    # is actually run, so it's kept out of `import raijin`
+    try:
+        import pretty_errors  # noqa: F401
+    except ImportError:
+        pass
     RaijinApplication().run()
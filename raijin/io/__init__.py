@@ -1,4 +1,16 @@
-from . import (
-    read,
-    write,
+from raijin.utilities.lazy import lazy_submodules
+
+
+# The submodules are imported the first time they're used
+__getattr__, __dir__ = lazy_submodules(
+    __name__,
+    (
+        "async_write",
+        "checkpoint_store",
+        "metrics_log",
+        "read",
+        "trajectories",
+        "trajectory_dataset",
+        "write",
+    ),
 )
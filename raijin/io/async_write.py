@@ -0,0 +1,130 @@
+import copy
+import threading
+import time
+
+from omegaconf.dictconfig import DictConfig
+
+from raijin.trainers import base_trainer as bt
+
+from .checkpoint_store import CheckpointStore
+from .write import write_checkpoint
+
+
+# ============================================
+#            AsyncCheckpointWriter
+# ============================================
+class AsyncCheckpointWriter:
+    """
+    Writes checkpoints in a background thread so that training doesn't
+    stall while the state dicts are serialized and the memory buffer
+    is written out.
+
+    `submit` only takes a snapshot of the trainer:
+
+        * The state dicts are deep copied (they're small compared to
+            the memory buffer)
+        * The memory is snapshotted with `memory.snapshot`, which
+            shares the experiences themselves since they're never
+            modified once they're in the buffer
+
+    The snapshot is then handed to the writer thread. At most one
+    checkpoint is in flight at a time: if the previous one is still
+    being written, `submit` waits for it to finish (the time spent
+    waiting is kept in `stallTime`). This bounds the memory used by
+    snapshots to one extra copy of the state dicts and buffer index.
+
+    If a checkpoint store is given the checkpoints go there instead
+    of into checkpoint directories.
+
+    Any exception raised while writing is re-raised on the next call
+    to `submit` or `close`.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self, params: DictConfig, store: CheckpointStore = None
+    ) -> None:
+        self.params = params
+        self.store = store
+        self.idle = threading.Event()
+        self.idle.set()
+        self.pending = None
+        self.wakeup = threading.Condition()
+        self.stopped = False
+        self.error = None
+        self.nWritten = 0
+        self.stallTime = 0.0
+        self.writeTime = 0.0
+        self.thread = threading.Thread(
+            target=self._write_loop, name="raijin-checkpointer", daemon=True
+        )
+        self.thread.start()
+
+    # -----
+    # submit
+    # -----
+    def submit(self, trainer: "bt.BaseTrainer") -> None:
+        start = time.perf_counter()
+        self.idle.wait()
+        self.stallTime += time.perf_counter() - start
+        self._check_error()
+        memory = trainer.memory
+        snapshot = (
+            copy.deepcopy(trainer.metrics),
+            trainer.snapshot_state_dict(),
+            memory.snapshot() if memory is not None else None,
+        )
+        with self.wakeup:
+            self.idle.clear()
+            self.pending = snapshot
+            self.wakeup.notify()
+
+    # -----
+    # close
+    # -----
+    def close(self) -> None:
+        """
+        Waits for the last checkpoint to be written and stops the
+        writer thread.
+        """
+        self.idle.wait()
+        with self.wakeup:
+            self.stopped = True
+            self.wakeup.notify()
+        self.thread.join()
+        self._check_error()
+
+    # -----
+    # _write_loop
+    # -----
+    def _write_loop(self) -> None:
+        while True:
+            with self.wakeup:
+                while self.pending is None and not self.stopped:
+                    self.wakeup.wait()
+                if self.pending is None:
+                    return
+                metrics, stateDict, memory = self.pending
+                self.pending = None
+            start = time.perf_counter()
+            try:
+                if self.store is not None:
+                    self.store.add(self.params, metrics, stateDict, memory)
+                else:
+                    write_checkpoint(self.params, metrics, stateDict, memory)
+                self.nWritten += 1
+            except Exception as e:
+                self.error = e
+            self.writeTime += time.perf_counter() - start
+            self.idle.set()
+
+    # -----
+    # _check_error
+    # -----
+    def _check_error(self) -> None:
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise RuntimeError("Writing a checkpoint failed.") from error
@@ -0,0 +1,359 @@
+import hashlib
+import io
+import json
+import os
+import time
+from typing import Dict
+from typing import List
+from typing import Set
+
+import numpy as np
+from omegaconf import OmegaConf as config
+from omegaconf.dictconfig import DictConfig
+import torch
+import yaml
+
+from raijin.memory import base_memory as bm
+from raijin.trainers import base_trainer as bt
+from raijin.utilities.io_utilities import sanitize_path
+from raijin.utilities.register import registry
+
+from .read import load_torch_file
+from .write import save_memory
+from .write import save_metrics
+from .write import save_params
+from .write import save_state_dicts
+
+
+# ============================================
+#               CheckpointStore
+# ============================================
+class CheckpointStore:
+    """
+    Keeps checkpoints as a manifest plus content-addressed blobs
+    rather than as one full directory per checkpoint.
+
+    Layout:
+
+        rootDir/
+            manifest.json
+            blobs/ab/abcdef...
+
+    Every piece of a checkpoint (params, metrics, state dicts, and the
+    memory's segments) is stored in a blob named after the sha256 of
+    its contents, so anything that's the same from one checkpoint to
+    the next (e.g., the params) is only stored once. The manifest
+    lists the checkpoints in order along with the blobs that make up
+    each one, so finding the latest checkpoint doesn't involve
+    scanning the directory.
+
+    The memory is saved as append-only deltas. Experiences are
+    numbered by the order they were added (see `QMemory.nAdded`) and
+    grouped into segments of `segmentSize` consecutive experiences.
+    Once a segment is full it never changes, so each checkpoint only
+    writes the segments that have filled up since the previous one
+    (plus the partial segment at the end) and refers back to the
+    earlier ones.
+
+    After each checkpoint the retention policy is applied: the last
+    `keepLast` checkpoints are kept along with every `keepEvery`th
+    one (by id), and blobs no longer referenced by any kept checkpoint
+    are deleted. Either can be None to turn it off. If both are None,
+    everything is kept.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        rootDir: str,
+        keepLast: int = None,
+        keepEvery: int = None,
+        segmentSize: int = 4096,
+        compression: bool = False,
+    ) -> None:
+        self.rootDir = sanitize_path(rootDir)
+        self.blobDir = os.path.join(self.rootDir, "blobs")
+        self.manifestFile = os.path.join(self.rootDir, "manifest.json")
+        self.keepLast = keepLast
+        self.keepEvery = keepEvery
+        self.segmentSize = segmentSize
+        self.compression = compression
+        os.makedirs(self.blobDir, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    # -----
+    # is_store
+    # -----
+    @staticmethod
+    def is_store(path: str) -> bool:
+        return os.path.isfile(os.path.join(path, "manifest.json"))
+
+    # -----
+    # add
+    # -----
+    def add(
+        self,
+        params: DictConfig,
+        metrics: Dict,
+        stateDict: Dict,
+        memory: "bm.BaseMemory",
+    ) -> int:
+        """
+        Stores a checkpoint and returns its id.
+        """
+        entry = {
+            "id": self.manifest["nextId"],
+            "episode": stateDict.get("QTrainer", {}).get("episodeNum"),
+            "time": time.time(),
+            "params": self._put(config.to_yaml(params).encode()),
+            "metrics": self._put(yaml.safe_dump(metrics).encode()),
+            "stateDicts": self._put(_to_bytes(stateDict)),
+            "memory": self._put_memory(memory),
+        }
+        self.manifest["checkpoints"].append(entry)
+        self.manifest["nextId"] += 1
+        self._apply_retention()
+        self._write_manifest()
+        self._collect_garbage()
+        return entry["id"]
+
+    # -----
+    # latest
+    # -----
+    def latest(self) -> Dict:
+        """
+        Returns the manifest entry of the newest checkpoint, or None if
+        there aren't any.
+        """
+        if not self.manifest["checkpoints"]:
+            return None
+        return self.manifest["checkpoints"][-1]
+
+    # -----
+    # get
+    # -----
+    def get(self, chkptId: int = None) -> Dict:
+        if chkptId is None:
+            entry = self.latest()
+            if entry is None:
+                raise ValueError(f"No checkpoints in `{self.rootDir}`.")
+            return entry
+        for entry in self.manifest["checkpoints"]:
+            if entry["id"] == chkptId:
+                return entry
+        raise ValueError(f"No checkpoint {chkptId} in `{self.rootDir}`.")
+
+    # -----
+    # ids
+    # -----
+    def ids(self) -> List[int]:
+        return [entry["id"] for entry in self.manifest["checkpoints"]]
+
+    # -----
+    # restore
+    # -----
+    def restore(self, trainer: "bt.BaseTrainer", chkptId: int = None) -> None:
+        """
+        Loads a checkpoint (the latest by default) straight into the
+        trainer.
+        """
+        entry = self.get(chkptId)
+        trainer.load_state_dict(self.state_dicts(entry))
+        trainer.metrics = yaml.safe_load(self._get(entry["metrics"]))
+        if trainer.memory is not None:
+            self.load_memory(entry, trainer.memory)
+
+    # -----
+    # checkout
+    # -----
+    def checkout(self, outputDir: str, chkptId: int = None) -> str:
+        """
+        Writes a checkpoint (the latest by default) out as a regular
+        checkpoint directory, like the ones from `save_checkpoint`.
+        """
+        entry = self.get(chkptId)
+        outputDir = sanitize_path(outputDir)
+        os.makedirs(outputDir, exist_ok=True)
+        params = config.create(self._get(entry["params"]).decode())
+        save_params(outputDir, params)
+        save_metrics(outputDir, yaml.safe_load(self._get(entry["metrics"])))
+        save_state_dicts(
+            self.state_dicts(entry), outputDir, params.io.checkpointBase
+        )
+        # Offline trainers don't have a memory
+        if entry["memory"] is not None:
+            memory = registry[params.memory.name](params.memory)
+            self.load_memory(entry, memory)
+            save_memory(memory, outputDir)
+        return outputDir
+
+    # -----
+    # state_dicts
+    # -----
+    def state_dicts(self, entry: Dict) -> Dict:
+        return load_torch_file(io.BytesIO(self._get(entry["stateDicts"])))
+
+    # -----
+    # load_memory
+    # -----
+    def load_memory(self, entry: Dict, memory: "bm.BaseMemory") -> None:
+        first = entry["memory"]["first"]
+        for segment in entry["memory"]["segments"]:
+            with np.load(io.BytesIO(self._get(segment["blob"]))) as data:
+                # The start of the segment may have since been evicted
+                # from the buffer
+                skip = max(0, first - segment["start"])
+                arrays = {name: data[name][skip:] for name in data.files}
+            memory.load_arrays(arrays)
+        memory.nAdded = entry["memory"]["nAdded"]
+
+    # -----
+    # _put_memory
+    # -----
+    def _put_memory(self, memory: "bm.BaseMemory") -> Dict:
+        if memory is None:
+            return None
+        nAdded = memory.nAdded
+        first = nAdded - len(memory)
+        # Segments stored by the previous checkpoint, by where they end.
+        # A full segment's end never changes
+        previous = {}
+        if self.manifest["checkpoints"] and self.latest()["memory"]:
+            for segment in self.latest()["memory"]["segments"]:
+                previous[segment["stop"]] = segment
+        segments = []
+        segStart = (first // self.segmentSize) * self.segmentSize
+        for start in range(segStart, nAdded, self.segmentSize):
+            stop = min(start + self.segmentSize, nAdded)
+            start = max(start, first)
+            segment = previous.get(stop)
+            if segment is None or segment["start"] > start:
+                arrays = memory.get_arrays(start - first, stop - first)
+                blob = self._put(_arrays_to_bytes(arrays, self.compression))
+                segment = {"start": start, "stop": stop, "blob": blob}
+            segments.append(segment)
+        return {"first": first, "nAdded": nAdded, "segments": segments}
+
+    # -----
+    # _put
+    # -----
+    def _put(self, data: bytes) -> str:
+        """
+        Stores the data (if it isn't already stored) and returns its
+        hash.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmpPath = path + ".tmp"
+            with open(tmpPath, "wb") as fd:
+                fd.write(data)
+            os.replace(tmpPath, path)
+        return digest
+
+    # -----
+    # _get
+    # -----
+    def _get(self, digest: str) -> bytes:
+        with open(self._blob_path(digest), "rb") as fd:
+            return fd.read()
+
+    # -----
+    # _blob_path
+    # -----
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobDir, digest[:2], digest)
+
+    # -----
+    # _apply_retention
+    # -----
+    def _apply_retention(self) -> None:
+        if self.keepLast is None and self.keepEvery is None:
+            return
+        checkpoints = self.manifest["checkpoints"]
+        keep = set()
+        if self.keepLast is not None:
+            keep.update(e["id"] for e in checkpoints[-self.keepLast :])
+        if self.keepEvery is not None:
+            keep.update(
+                e["id"] for e in checkpoints if e["id"] % self.keepEvery == 0
+            )
+        # The newest checkpoint is always kept
+        keep.add(checkpoints[-1]["id"])
+        self.manifest["checkpoints"] = [
+            e for e in checkpoints if e["id"] in keep
+        ]
+
+    # -----
+    # _collect_garbage
+    # -----
+    def _collect_garbage(self) -> None:
+        """
+        Deletes the blobs that no kept checkpoint refers to. This runs
+        after the manifest is written, so a crash partway through only
+        leaves extra blobs behind.
+        """
+        referenced = self._referenced_blobs()
+        for prefix in os.listdir(self.blobDir):
+            prefixDir = os.path.join(self.blobDir, prefix)
+            for name in os.listdir(prefixDir):
+                if name not in referenced:
+                    os.remove(os.path.join(prefixDir, name))
+
+    # -----
+    # _referenced_blobs
+    # -----
+    def _referenced_blobs(self) -> Set[str]:
+        referenced = set()
+        for entry in self.manifest["checkpoints"]:
+            referenced.update(
+                (entry["params"], entry["metrics"], entry["stateDicts"])
+            )
+            if entry["memory"] is not None:
+                segments = entry["memory"]["segments"]
+                referenced.update(s["blob"] for s in segments)
+        return referenced
+
+    # -----
+    # _read_manifest
+    # -----
+    def _read_manifest(self) -> Dict:
+        if not os.path.exists(self.manifestFile):
+            return {"nextId": 0, "checkpoints": []}
+        with open(self.manifestFile, "r") as fd:
+            return json.load(fd)
+
+    # -----
+    # _write_manifest
+    # -----
+    def _write_manifest(self) -> None:
+        # Written to a temporary file and then renamed so that the
+        # manifest is never seen half-written
+        tmpFile = self.manifestFile + ".tmp"
+        with open(tmpFile, "w") as fd:
+            json.dump(self.manifest, fd, indent=1)
+        os.replace(tmpFile, self.manifestFile)
+
+
+# ============================================
+#                  _to_bytes
+# ============================================
+def _to_bytes(obj) -> bytes:
+    buffer = io.BytesIO()
+    torch.save(obj, buffer)
+    return buffer.getvalue()
+
+
+# ============================================
+#              _arrays_to_bytes
+# ============================================
+def _arrays_to_bytes(arrays: Dict[str, np.ndarray], compression: bool) -> bytes:
+    buffer = io.BytesIO()
+    if compression:
+        np.savez_compressed(buffer, **arrays)
+    else:
+        np.savez(buffer, **arrays)
+    return buffer.getvalue()
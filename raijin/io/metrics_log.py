@@ -0,0 +1,382 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Dict
+from typing import Tuple
+
+import numpy as np
+import torch
+
+from raijin.utilities.io_utilities import sanitize_path
+
+
+# Every stream file starts with a one-line json header (padded so the
+# records that follow are aligned) describing the record layout
+_headerAlign = 64
+_version = 1
+
+
+# ============================================
+#               MetricsStream
+# ============================================
+class MetricsStream:
+    """
+    An append-only file of fixed-size binary records.
+
+    Since every record is the same size, appending never touches what's
+    already in the file, and the file can be read straight into (or
+    memory-mapped as) a numpy structured array by `read_metrics_stream`.
+
+    If `startEpisode` is given (when resuming), the records from that
+    episode on are dropped from an existing file, since training is
+    about to redo them, and the last record that's kept is left in
+    `lastRecord`. Otherwise an existing file is overwritten.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, path: str, fields: Tuple, startEpisode: int = 0) -> None:
+        self.path = path
+        self.dtype = np.dtype(list(fields))
+        self.nWritten = 0
+        # The last record kept when resuming
+        self.lastRecord = None
+        if startEpisode and os.path.exists(path):
+            self.fd = open(path, "r+b")
+            self._truncate(startEpisode)
+        else:
+            self.fd = open(path, "wb")
+            self.fd.write(_make_header(self.dtype))
+            self.fd.flush()
+
+    # -----
+    # write
+    # -----
+    def write(self, records: list) -> None:
+        self.fd.write(np.array(records, dtype=self.dtype).tobytes())
+        self.fd.flush()
+        self.nWritten += len(records)
+
+    # -----
+    # close
+    # -----
+    def close(self) -> None:
+        self.fd.close()
+
+    # -----
+    # _truncate
+    # -----
+    def _truncate(self, startEpisode: int) -> None:
+        offset, dtype = _read_header(self.fd)
+        if dtype != self.dtype:
+            raise ValueError(
+                f"`{self.path}` has a different record layout: {dtype}."
+            )
+        self.fd.seek(0, os.SEEK_END)
+        nRecords = (self.fd.tell() - offset) // dtype.itemsize
+        if nRecords:
+            records = np.memmap(
+                self.fd, dtype=dtype, mode="r", offset=offset, shape=nRecords
+            )
+            # Records are written in episode order
+            nRecords = int(np.searchsorted(records["episode"], startEpisode))
+            if nRecords:
+                self.lastRecord = records[nRecords - 1].copy()
+            del records
+        self.fd.truncate(offset + nRecords * dtype.itemsize)
+        self.fd.seek(0, os.SEEK_END)
+
+
+# ============================================
+#                 MetricsLog
+# ============================================
+class MetricsLog:
+    """
+    Streams training metrics to disk as they're produced, rather than
+    keeping them in the metrics dict that's rewritten as a whole at
+    every checkpoint.
+
+    Two streams are written to `outputDir`/metrics:
+
+        * episodes.bin: one record per episode with the episode's
+            reward, number of steps, and duration
+        * steps.bin: one record every `freq` updates with the mean
+            loss, the agent's epsilon, env steps/s, updates/s, and the
+            mean time spent sampling a batch from the memory over that
+            interval
+
+    Records are collected in memory and handed to a background writer
+    thread in batches of `flushSize`, so training never waits on the
+    disk. `flush` pushes out whatever is left (e.g., before a
+    checkpoint, so that the streams match it).
+
+    The trainer's calls here are cheap: the loss is summed as a tensor
+    and only converted to a float once per interval.
+    """
+
+    stepFields = (
+        ("episode", "<i8"),
+        ("update", "<i8"),
+        ("envStep", "<i8"),
+        ("time", "<f8"),
+        ("loss", "<f4"),
+        ("epsilon", "<f4"),
+        ("envStepsPerSec", "<f4"),
+        ("updatesPerSec", "<f4"),
+        ("sampleLatencyMs", "<f4"),
+    )
+
+    episodeFields = (
+        ("episode", "<i8"),
+        ("reward", "<f8"),
+        ("steps", "<i8"),
+        ("duration", "<f8"),
+        ("time", "<f8"),
+    )
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        outputDir: str,
+        freq: int = 100,
+        flushSize: int = 256,
+        startEpisode: int = 0,
+    ) -> None:
+        self.logDir = os.path.join(sanitize_path(outputDir), "metrics")
+        os.makedirs(self.logDir, exist_ok=True)
+        self.freq = freq
+        self.flushSize = flushSize
+        self.steps = MetricsStream(
+            os.path.join(self.logDir, "steps.bin"),
+            self.stepFields,
+            startEpisode,
+        )
+        self.episodes = MetricsStream(
+            os.path.join(self.logDir, "episodes.bin"),
+            self.episodeFields,
+            startEpisode,
+        )
+        # Episodes are recorded by the actor and steps by whichever
+        # thread is learning
+        self.lock = threading.Lock()
+        self.pending = {self.steps: [], self.episodes: []}
+        self.batches = queue.Queue()
+        self.error = None
+        self.startTime = time.time()
+        # Counters. The env step counter is only touched by the actor
+        # and the rest only by the learner
+        self.nEnvSteps = 0
+        self.nUpdates = 0
+        # A resumed run carries on from the last step record that was
+        # kept
+        last = self.steps.lastRecord
+        if last is not None:
+            self.nEnvSteps = int(last["envStep"])
+            self.nUpdates = int(last["update"])
+            self.startTime -= float(last["time"])
+        self.lossSum = 0.0
+        self.sampleTime = 0.0
+        self.intervalStart = time.perf_counter()
+        self.intervalEnvSteps = self.nEnvSteps
+        self.episodeStart = time.perf_counter()
+        self.episodeEnvSteps = self.nEnvSteps
+        self.thread = threading.Thread(
+            target=self._write_loop, name="raijin-metrics", daemon=True
+        )
+        self.thread.start()
+
+    # -----
+    # env_step
+    # -----
+    def env_step(self) -> None:
+        self.nEnvSteps += 1
+
+    # -----
+    # update
+    # -----
+    def update(
+        self,
+        episode: int,
+        loss: torch.Tensor,
+        sampleTime: float,
+        epsilon: float,
+    ) -> None:
+        """
+        Counts one learning step. Every `freq` updates a step record
+        is made from the counters, which are then reset.
+        """
+        self.nUpdates += 1
+        self.lossSum += loss
+        self.sampleTime += sampleTime
+        if self.nUpdates % self.freq != 0:
+            return
+        now = time.perf_counter()
+        elapsed = max(now - self.intervalStart, 1e-9)
+        nEnvSteps = self.nEnvSteps
+        record = (
+            episode,
+            self.nUpdates,
+            nEnvSteps,
+            time.time() - self.startTime,
+            float(self.lossSum) / self.freq,
+            epsilon,
+            (nEnvSteps - self.intervalEnvSteps) / elapsed,
+            self.freq / elapsed,
+            1000.0 * self.sampleTime / self.freq,
+        )
+        self.lossSum = 0.0
+        self.sampleTime = 0.0
+        self.intervalStart = now
+        self.intervalEnvSteps = nEnvSteps
+        self._append(self.steps, record)
+
+    # -----
+    # end_episode
+    # -----
+    def end_episode(self, episode: int, reward: float) -> None:
+        now = time.perf_counter()
+        record = (
+            episode,
+            reward,
+            self.nEnvSteps - self.episodeEnvSteps,
+            now - self.episodeStart,
+            time.time() - self.startTime,
+        )
+        self.episodeStart = now
+        self.episodeEnvSteps = self.nEnvSteps
+        self._append(self.episodes, record)
+
+    # -----
+    # flush
+    # -----
+    def flush(self) -> None:
+        """
+        Hands every pending record to the writer and waits until
+        they're all on disk.
+        """
+        with self.lock:
+            for stream, records in self.pending.items():
+                if records:
+                    self.batches.put((stream, records))
+                    self.pending[stream] = []
+        self.batches.join()
+        self._check_error()
+
+    # -----
+    # close
+    # -----
+    def close(self) -> None:
+        self.flush()
+        self.batches.put(None)
+        self.thread.join()
+        self.steps.close()
+        self.episodes.close()
+
+    # -----
+    # _append
+    # -----
+    def _append(self, stream: MetricsStream, record: Tuple) -> None:
+        self._check_error()
+        with self.lock:
+            self.pending[stream].append(record)
+            if len(self.pending[stream]) >= self.flushSize:
+                self.batches.put((stream, self.pending[stream]))
+                self.pending[stream] = []
+
+    # -----
+    # _write_loop
+    # -----
+    def _write_loop(self) -> None:
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                self.batches.task_done()
+                return
+            stream, records = batch
+            try:
+                stream.write(records)
+            except Exception as e:
+                self.error = e
+            self.batches.task_done()
+
+    # -----
+    # _check_error
+    # -----
+    def _check_error(self) -> None:
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise RuntimeError("Writing the metrics log failed.") from error
+
+
+# ============================================
+#             read_metrics_stream
+# ============================================
+def read_metrics_stream(path: str, mmap: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Reads a stream written by `MetricsLog` into one array per field.
+
+    With `mmap`, the arrays are read-only views of a memory map of the
+    file, so only the fields (and parts of them) that are used are
+    actually read. This is the way to go for very long runs. A partial
+    record at the end (e.g., from a crash mid-write) is ignored.
+    """
+    path = sanitize_path(path)
+    with open(path, "rb") as fd:
+        offset, dtype = _read_header(fd)
+        fd.seek(0, os.SEEK_END)
+        nRecords = (fd.tell() - offset) // dtype.itemsize
+        if mmap and nRecords:
+            records = np.memmap(
+                path, dtype=dtype, mode="r", offset=offset, shape=nRecords
+            )
+        else:
+            fd.seek(offset)
+            records = np.fromfile(fd, dtype=dtype, count=nRecords)
+    return {name: records[name] for name in dtype.names}
+
+
+# ============================================
+#              read_metrics_log
+# ============================================
+def read_metrics_log(
+    outputDir: str, mmap: bool = False
+) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Reads both of a run's metrics streams. See `read_metrics_stream`.
+    """
+    logDir = os.path.join(sanitize_path(outputDir), "metrics")
+    return {
+        name: read_metrics_stream(os.path.join(logDir, f"{name}.bin"), mmap)
+        for name in ("steps", "episodes")
+    }
+
+
+# ============================================
+#                _make_header
+# ============================================
+def _make_header(dtype: np.dtype) -> bytes:
+    header = json.dumps({"version": _version, "fields": dtype.descr})
+    # Padded with spaces so that the first record is aligned. The
+    # newline has to be the last byte
+    size = -(-(len(header) + 1) // _headerAlign) * _headerAlign
+    return (header.ljust(size - 1) + "\n").encode()
+
+
+# ============================================
+#                _read_header
+# ============================================
+def _read_header(fd) -> Tuple[int, np.dtype]:
+    fd.seek(0)
+    line = fd.readline()
+    try:
+        header = json.loads(line)
+    except json.JSONDecodeError:
+        raise ValueError(f"`{fd.name}` isn't a metrics stream.")
+    fields = [tuple(field) for field in header["fields"]]
+    return len(line), np.dtype(fields)
@@ -1,13 +1,182 @@
+import os
+from typing import List
+from typing import Tuple
+
+import h5py
+import numpy as np
 from omegaconf import OmegaConf as config
 from omegaconf.dictconfig import DictConfig
+import torch
+import yaml
 
+from raijin.memory import base_memory as bm
+from raijin.trainers import base_trainer as bt
 from raijin.utilities.io_utilities import sanitize_path
 
 
 # ============================================
 #             read_parameter_file
 # ============================================
-def read_parameter_file(paramFile: str) -> DictConfig:
+def read_parameter_file(paramFile: str, overlays: List[str] = ()) -> DictConfig:
+    """
+    Reads the parameter file and merges any overlays (partial parameter
+    files, e.g., from `raijin autotune`) over it, in order.
+    """
     paramFile = sanitize_path(paramFile)
     params = config.load(paramFile)
+    for overlay in overlays:
+        params = config.merge(params, config.load(sanitize_path(overlay)))
     return params
+
+
+# ============================================
+#                load_memory
+# ============================================
+def load_memory(
+    memory: "bm.BaseMemory", inputDir: str, blockBytes: int = 64 * 2**20
+) -> "bm.BaseMemory":
+    """
+    Fills the given memory with the buffer saved by `save_memory`.
+
+    The file is read in blocks of roughly `blockBytes` with one bulk
+    read per dataset, and each block is handed to the memory as a
+    whole. A missing file means the buffer was empty when it was
+    saved, so the memory is left as is.
+    """
+    path = os.path.join(sanitize_path(inputDir), "memory.h5")
+    if not os.path.exists(path):
+        return memory
+    with h5py.File(path, "r") as fd:
+        names = list(fd.keys())
+        nExperiences = len(fd["actions"])
+        experienceBytes = sum(
+            fd[name].dtype.itemsize * int(np.prod(fd[name].shape[1:]))
+            for name in names
+        )
+        blockSize = max(1, blockBytes // experienceBytes)
+        for start in range(0, nExperiences, blockSize):
+            stop = min(start + blockSize, nExperiences)
+            memory.load_arrays({name: fd[name][start:stop] for name in names})
+    return memory
+
+
+# ============================================
+#                 map_memory
+# ============================================
+def map_memory(memory: "bm.BaseMemory", inputDir: str) -> "bm.BaseMemory":
+    """
+    Like `load_memory`, but the states and nextStates (which are
+    nearly all of the file) aren't read. Instead, the file is
+    memory-mapped and the experiences' states are views into the map,
+    so the os only pages in the parts of the buffer that get sampled.
+    This makes loading a multi-GB buffer nearly instant.
+
+    The map is copy-on-write, so the file on disk is never changed.
+    Compressed files can't be mapped and are loaded normally.
+    """
+    path = os.path.join(sanitize_path(inputDir), "memory.h5")
+    if not os.path.exists(path):
+        return memory
+    with h5py.File(path, "r") as fd:
+        mappable = all(
+            fd[name].compression is None and fd[name].chunks is not None
+            for name in ("states", "nextStates")
+        )
+        if not mappable:
+            return load_memory(memory, inputDir)
+        small = {name: fd[name][()] for name in ("actions", "rewards", "dones")}
+        fileMap = np.memmap(path, dtype=np.uint8, mode="c")
+        states = map_chunks(fileMap, fd["states"])
+        nextStates = map_chunks(fileMap, fd["nextStates"])
+    # The states and nextStates have the same shape, so their chunks
+    # line up
+    for (start, stop, stateChunk), (_, _, nextStateChunk) in zip(
+        states, nextStates
+    ):
+        arrays = {name: array[start:stop] for name, array in small.items()}
+        arrays["states"] = stateChunk
+        arrays["nextStates"] = nextStateChunk
+        memory.load_arrays(arrays)
+    return memory
+
+
+# ============================================
+#                map_chunks
+# ============================================
+def map_chunks(fileMap: np.memmap, dataset: h5py.Dataset) -> List[Tuple]:
+    """
+    Returns (start, stop, array) for each chunk of the dataset, in
+    order along the experience axis, where the array is a view of the
+    chunk's bytes in the memory-mapped file.
+
+    An uncompressed chunk is stored as one contiguous block holding
+    the full chunk shape, even when the last chunk runs past the end
+    of the dataset.
+    """
+    nExperiences = dataset.shape[0]
+    chunkShape = dataset.chunks
+    chunkBytes = dataset.dtype.itemsize * int(np.prod(chunkShape))
+    chunks = []
+    for i in range(dataset.id.get_num_chunks()):
+        info = dataset.id.get_chunk_info(i)
+        start = info.chunk_offset[0]
+        stop = min(start + chunkShape[0], nExperiences)
+        array = (
+            fileMap[info.byte_offset : info.byte_offset + chunkBytes]
+            .view(dataset.dtype)
+            .reshape(chunkShape)
+        )
+        chunks.append((start, stop, array[: stop - start]))
+    return sorted(chunks, key=lambda c: c[0])
+
+
+# ============================================
+#              load_checkpoint
+# ============================================
+def load_checkpoint(
+    trainer: "bt.BaseTrainer",
+    chkptDir: str,
+    baseName: str,
+    lazyMemory: bool = True,
+) -> None:
+    """
+    Restores the trainer from a checkpoint directory written by
+    `save_checkpoint`: the state dicts (network, optimizer, agent,
+    pipeline, trainer), the metrics, and the memory buffer.
+
+    With `lazyMemory` the buffer is memory-mapped (see `map_memory`)
+    rather than read.
+
+    `chkptDir` can also be a checkpoint store, in which case its
+    latest checkpoint is restored.
+    """
+    # Imported here to avoid a circular import, since the store uses
+    # the functions in this module
+    from raijin.io.checkpoint_store import CheckpointStore
+
+    chkptDir = sanitize_path(chkptDir)
+    if CheckpointStore.is_store(chkptDir):
+        CheckpointStore(chkptDir).restore(trainer)
+        return
+    stateDicts = load_torch_file(os.path.join(chkptDir, f"{baseName}.tar"))
+    trainer.load_state_dict(stateDicts)
+    with open(os.path.join(chkptDir, "metrics.yaml"), "r") as fd:
+        trainer.metrics = yaml.safe_load(fd)
+    if trainer.memory is None:
+        return
+    if lazyMemory:
+        map_memory(trainer.memory, chkptDir)
+    else:
+        load_memory(trainer.memory, chkptDir)
+
+
+# ============================================
+#                load_torch_file
+# ============================================
+def load_torch_file(path: str) -> dict:
+    # Newer versions of torch only unpickle tensors by default, but the
+    # checkpoints also hold things like the environment's state
+    try:
+        return torch.load(path, weights_only=False)
+    except TypeError:
+        return torch.load(path)
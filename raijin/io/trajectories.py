@@ -0,0 +1,362 @@
+import os
+import queue
+import time
+from typing import Dict
+from typing import List
+
+import h5py
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from raijin.memory.experience import Experience
+from raijin.utilities.io_utilities import sanitize_path
+
+
+# ============================================
+#             TrajectoryRecorder
+# ============================================
+class TrajectoryRecorder:
+    """
+    Keeps every transition the agent generates, not just the ones that
+    are still in the memory buffer, for offline analysis and training.
+
+    Each transition is recorded as the raw uint8 frame the agent acted
+    on (before the pipeline), the action, the reward, whether the
+    episode ended, and the episode's id. The processed states aren't
+    kept since they're several times bigger and can be rebuilt by
+    running an episode's frames through the pipeline. The next state
+    of a transition is the frame of the next transition in the same
+    episode.
+
+    Transitions are copied into blocks of `blockSize` rows that live
+    in shared memory. A full block is handed to a writer process (see
+    `TrajectoryWriter`) that appends it to the current hdf5 file.
+    The writing is done in a separate process rather than a thread
+    since h5py holds the GIL while it writes, which would stall the
+    agent. All the agent pays is one copy of the frame per step.
+
+    There are `maxPending + 1` blocks, which are reused once they've
+    been written, so the memory used is bounded. If the writer falls
+    so far behind that every block is waiting to be written, `record`
+    waits for one (the time spent waiting is kept in `stallTime`)
+    rather than drop transitions.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        outputDir: str,
+        maxFileBytes: int = 2**30,
+        blockSize: int = 256,
+        maxPending: int = 4,
+        compression: str = None,
+        nActions: int = None,
+    ) -> None:
+        self.outputDir = sanitize_path(outputDir)
+        os.makedirs(self.outputDir, exist_ok=True)
+        self.maxFileBytes = maxFileBytes
+        self.blockSize = blockSize
+        self.nBlocks = maxPending + 1
+        self.compression = compression
+        self.nRecorded = 0
+        self.nFiles = 0
+        self.stallTime = 0.0
+        self.writeTime = 0.0
+        # The blocks are made once the shape of the frames is known
+        self.blocks = None
+        self.block = None
+        self.blockIndex = None
+        self.blockRows = 0
+        # The writer is started right away since starting a process
+        # takes a while
+        context = mp.get_context("spawn")
+        self.free = context.Queue()
+        self.full = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(
+            target=trajectory_writer_worker,
+            args=(
+                self.outputDir,
+                self.maxFileBytes,
+                self.compression,
+                nActions,
+                self.full,
+                self.free,
+                self.results,
+            ),
+            name="raijin-recorder",
+            daemon=True,
+        )
+        self.process.start()
+
+    # -----
+    # record
+    # -----
+    def record(
+        self, frame: np.ndarray, experience: Experience, episode: int
+    ) -> None:
+        """
+        Records a transition: `frame` is the raw frame the agent saw
+        before taking the experience's action.
+        """
+        # Only happens for the first step after resuming from a
+        # checkpoint that predates the agent keeping its frame
+        if frame is None:
+            return
+        if self.blocks is None:
+            self._make_blocks(frame.shape)
+        if self.block is None:
+            self._next_block()
+        i = self.blockRows
+        self.block["frames"][i] = frame
+        self.block["actions"][i] = experience.action
+        self.block["rewards"][i] = experience.reward
+        self.block["dones"][i] = experience.done
+        self.block["episodes"][i] = episode
+        self.blockRows += 1
+        self.nRecorded += 1
+        if self.blockRows == self.blockSize:
+            self._submit()
+
+    # -----
+    # close
+    # -----
+    def close(self) -> None:
+        """
+        Hands off the last partial block and waits for the writer to
+        finish.
+        """
+        if self.block is not None and self.blockRows:
+            self._submit()
+        self.full.put(None)
+        self.nFiles, self.writeTime = self._wait(self.results)
+        self.process.join()
+
+    # -----
+    # _make_blocks
+    # -----
+    def _make_blocks(self, frameShape: tuple) -> None:
+        n = self.blockSize
+        self.blocks = []
+        for index in range(self.nBlocks):
+            block = {
+                "frames": torch.empty((n,) + frameShape, dtype=torch.uint8),
+                "actions": torch.empty(n, dtype=torch.int32),
+                "rewards": torch.empty(n, dtype=torch.float32),
+                "dones": torch.empty(n, dtype=torch.uint8),
+                "episodes": torch.empty(n, dtype=torch.int64),
+            }
+            for tensor in block.values():
+                tensor.share_memory_()
+            self.blocks.append(block)
+            self.free.put(index)
+        # The writer gets handles to the shared memory
+        self.full.put(self.blocks)
+
+    # -----
+    # _next_block
+    # -----
+    def _next_block(self) -> None:
+        try:
+            self.blockIndex = self.free.get_nowait()
+        except queue.Empty:
+            # Every block is waiting to be written
+            start = time.perf_counter()
+            self.blockIndex = self._wait(self.free)
+            self.stallTime += time.perf_counter() - start
+        # Assigning single values is much cheaper through numpy views
+        self.block = {
+            name: tensor.numpy()
+            for name, tensor in self.blocks[self.blockIndex].items()
+        }
+
+    # -----
+    # _submit
+    # -----
+    def _submit(self) -> None:
+        self._check_process()
+        self.full.put((self.blockIndex, self.blockRows))
+        self.block = None
+        self.blockIndex = None
+        self.blockRows = 0
+
+    # -----
+    # _wait
+    # -----
+    def _wait(self, q: mp.Queue):
+        """
+        Gets from a queue the writer puts to, checking that the writer
+        is still running every so often so that a crash doesn't leave
+        us waiting forever.
+        """
+        while True:
+            try:
+                return q.get(timeout=1.0)
+            except queue.Empty:
+                self._check_process()
+
+    # -----
+    # _check_process
+    # -----
+    def _check_process(self) -> None:
+        if self.process.exitcode not in (None, 0):
+            raise RuntimeError(
+                f"The trajectory writer failed (exit code "
+                f"{self.process.exitcode})."
+            )
+
+
+# ============================================
+#             TrajectoryWriter
+# ============================================
+class TrajectoryWriter:
+    """
+    Appends blocks of transitions to a series of hdf5 files,
+    trajectories_00000.h5, trajectories_00001.h5, etc., with one
+    resizable dataset per field and the transition axis first. Each
+    block is written with one slice assignment per dataset.
+
+    Once a file would grow past `maxFileBytes` the writer moves on to
+    the next one, so the files can be copied, read, or deleted while a
+    run is still going. Numbering picks up after any files already in
+    the directory (e.g., when resuming). Each file's `continues`
+    attribute says whether its first episode is the tail of the last
+    episode in the previous file, and its `nActions` attribute (if
+    known) holds the size of the env's action space.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        outputDir: str,
+        maxFileBytes: int,
+        compression: str = None,
+        nActions: int = None,
+    ) -> None:
+        self.outputDir = outputDir
+        self.maxFileBytes = maxFileBytes
+        self.compression = compression
+        self.nActions = nActions
+        self.fileNum = len(get_trajectory_files(outputDir))
+        self.fd = None
+        self.fileRows = 0
+        self.nFiles = 0
+
+    # -----
+    # write
+    # -----
+    def write(self, block: Dict[str, np.ndarray], n: int) -> None:
+        rowBytes = sum(array[0].nbytes for array in block.values())
+        if self.fd is not None and (
+            (self.fileRows + n) * rowBytes > self.maxFileBytes
+        ):
+            self.close()
+        if self.fd is None:
+            self._open_file(block)
+        for name, array in block.items():
+            dataset = self.fd[name]
+            dataset.resize(self.fileRows + n, axis=0)
+            dataset[self.fileRows : self.fileRows + n] = array[:n]
+        self.fileRows += n
+        self.fd.flush()
+
+    # -----
+    # close
+    # -----
+    def close(self) -> None:
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+
+    # -----
+    # _open_file
+    # -----
+    def _open_file(self, block: Dict[str, np.ndarray]) -> None:
+        path = os.path.join(
+            self.outputDir, f"trajectories_{self.fileNum:05d}.h5"
+        )
+        self.fd = h5py.File(path, "w")
+        self.fd.attrs["continues"] = self.nFiles > 0
+        if self.nActions is not None:
+            self.fd.attrs["nActions"] = self.nActions
+        # About 1 MB per chunk, but no more than a file's worth of rows
+        totalRowBytes = sum(array[0].nbytes for array in block.values())
+        fileRows = max(1, self.maxFileBytes // totalRowBytes)
+        for name, array in block.items():
+            rowBytes = array[0].nbytes
+            chunkRows = max(1, min(fileRows, 2**20 // rowBytes))
+            self.fd.create_dataset(
+                name,
+                (0,) + array.shape[1:],
+                maxshape=(None,) + array.shape[1:],
+                dtype=array.dtype,
+                chunks=(chunkRows,) + array.shape[1:],
+                compression=self.compression,
+            )
+        self.fileNum += 1
+        self.nFiles += 1
+        self.fileRows = 0
+
+
+# ============================================
+#          trajectory_writer_worker
+# ============================================
+def trajectory_writer_worker(
+    outputDir: str,
+    maxFileBytes: int,
+    compression: str,
+    nActions: int,
+    full,
+    free,
+    results,
+) -> None:
+    """
+    Gets the shared blocks, then writes each block it's sent and hands
+    it back until it's sent None. Reports the number of files and the
+    time spent writing at the end.
+    """
+    blocks = full.get()
+    if blocks is None:
+        results.put((0, 0.0))
+        return
+    blocks = [
+        {name: tensor.numpy() for name, tensor in block.items()}
+        for block in blocks
+    ]
+    writer = TrajectoryWriter(outputDir, maxFileBytes, compression, nActions)
+    writeTime = 0.0
+    while True:
+        item = full.get()
+        if item is None:
+            break
+        index, n = item
+        start = time.perf_counter()
+        writer.write(blocks[index], n)
+        writeTime += time.perf_counter() - start
+        free.put(index)
+    writer.close()
+    results.put((writer.nFiles, writeTime))
+
+
+# ============================================
+#            get_trajectory_files
+# ============================================
+def get_trajectory_files(dataDir: str) -> List[str]:
+    """
+    Returns the trajectory files in the given directory in the order
+    they were written.
+    """
+    dataDir = sanitize_path(dataDir)
+    if not os.path.isdir(dataDir):
+        return []
+    files = [
+        f
+        for f in os.listdir(dataDir)
+        if f.startswith("trajectories_") and f.endswith(".h5")
+    ]
+    return [os.path.join(dataDir, f) for f in sorted(files)]
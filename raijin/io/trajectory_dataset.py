@@ -0,0 +1,449 @@
+import queue
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import h5py
+import numpy as np
+from omegaconf.dictconfig import DictConfig
+import torch
+import torch.multiprocessing as mp
+
+from raijin.utilities.io_utilities import sanitize_path
+from raijin.utilities.register import registry
+
+from .read import map_chunks
+from .trajectories import get_trajectory_files
+
+
+# ============================================
+#             TrajectoryDataset
+# ============================================
+class TrajectoryDataset:
+    """
+    An index of the trajectory files written by `TrajectoryRecorder`.
+
+    Only each file's length is read here. The files are split into
+    shards of `shardSize` consecutive rows, which are the unit of work
+    handed to the loader's workers.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, dataDir: str, shardSize: int = 512) -> None:
+        self.dataDir = sanitize_path(dataDir)
+        self.files = get_trajectory_files(self.dataDir)
+        if not self.files:
+            raise ValueError(f"No trajectory files in `{self.dataDir}`.")
+        self.shardSize = shardSize
+        self.nRows = []
+        self.nActions = None
+        maxAction = 0
+        for path in self.files:
+            with h5py.File(path, "r") as fd:
+                self.nRows.append(len(fd["actions"]))
+                if "nActions" in fd.attrs:
+                    self.nActions = int(fd.attrs["nActions"])
+                elif self.nActions is None and len(fd["actions"]):
+                    maxAction = max(maxAction, int(fd["actions"][()].max()))
+        # Files recorded without the env's action space size only tell
+        # us the largest action taken
+        if self.nActions is None:
+            self.nActions = maxAction + 1
+
+    # -----
+    # shards
+    # -----
+    def shards(self) -> List[Tuple[str, int, int]]:
+        """
+        Returns (path, start, stop) for each shard.
+        """
+        shards = []
+        for path, nRows in zip(self.files, self.nRows):
+            for start in range(0, nRows, self.shardSize):
+                shards.append((path, start, min(start + self.shardSize, nRows)))
+        return shards
+
+    # -----
+    # __len__
+    # -----
+    def __len__(self) -> int:
+        return sum(self.nRows)
+
+
+# ============================================
+#             TrajectoryLoader
+# ============================================
+class TrajectoryLoader:
+    """
+    Streams shuffled minibatches of transitions from a trajectory
+    dataset into the learner, in the same form as `QMemory.sample`.
+
+    The dataset's shards are dealt out to `nWorkers` worker processes.
+    Each worker goes through its shards in a random order (a new one
+    every pass), reading each one from a memory map of its file (see
+    `map_chunks`; compressed files are read through h5py instead) and
+    rebuilding the states by running the frames through the pipeline
+    and stacking them just as the agent would have. The transitions
+    then go into the worker's shuffle buffer (see `ShuffleBuffer`),
+    which hands out minibatches drawn at random from the last
+    `bufferSize` transitions it was given. Finished minibatches go
+    into a queue (holding at most `prefetch` of them) that `sample`
+    takes from, so the learner only waits on the workers if they can't
+    keep up.
+
+    The stream never ends: once a worker has been through all of its
+    shards it starts over.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        dataset: TrajectoryDataset,
+        pipelineParams: DictConfig,
+        batchSize: int,
+        nWorkers: int = 2,
+        bufferSize: int = 4096,
+        prefetch: int = 8,
+        seed: int = 0,
+    ) -> None:
+        self.dataset = dataset
+        self.batchSize = batchSize
+        self.nBatches = 0
+        shards = dataset.shards()
+        nWorkers = max(1, min(nWorkers, len(shards)))
+        context = mp.get_context("spawn")
+        self.batches = context.Queue(maxsize=prefetch)
+        self.stopEvent = context.Event()
+        self.processes = []
+        for workerId in range(nWorkers):
+            process = context.Process(
+                target=trajectory_loader_worker,
+                args=(
+                    shards[workerId::nWorkers],
+                    pipelineParams,
+                    batchSize,
+                    bufferSize,
+                    seed + workerId,
+                    self.batches,
+                    self.stopEvent,
+                ),
+                name=f"raijin-loader-{workerId}",
+                daemon=True,
+            )
+            self.processes.append(process)
+
+    # -----
+    # start
+    # -----
+    def start(self) -> None:
+        for process in self.processes:
+            process.start()
+
+    # -----
+    # sample
+    # -----
+    def sample(self, batchSize: int) -> Tuple:
+        if batchSize != self.batchSize:
+            raise ValueError(
+                f"The loader makes batches of {self.batchSize}, not "
+                f"{batchSize}."
+            )
+        while True:
+            try:
+                batch = self.batches.get(timeout=1.0)
+                break
+            except queue.Empty:
+                self._check_processes()
+        self.nBatches += 1
+        return batch
+
+    # -----
+    # close
+    # -----
+    def close(self) -> None:
+        self.stopEvent.set()
+        # Workers blocked on a full queue need room to notice the stop.
+        # The batches are thrown away, and one whose worker has already
+        # exited can't be received since its shared memory is gone
+        while any(p.is_alive() for p in self.processes):
+            try:
+                self.batches.get(timeout=0.1)
+            except (queue.Empty, OSError):
+                pass
+        for process in self.processes:
+            process.join()
+
+    # -----
+    # _check_processes
+    # -----
+    def _check_processes(self) -> None:
+        for process in self.processes:
+            if process.exitcode not in (None, 0):
+                raise RuntimeError(
+                    f"Loader worker {process.name} failed (exit code "
+                    f"{process.exitcode})."
+                )
+
+
+# ============================================
+#               ShuffleBuffer
+# ============================================
+class ShuffleBuffer:
+    """
+    Holds up to `size` transitions and hands out minibatches drawn at
+    random from them. Each transition handed out is replaced by the
+    next one to come in, so the stream is shuffled over a window of
+    `size` transitions without random access to the files.
+
+    The transitions aren't stored individually: each decoded shard is
+    kept (its processed frames plus, for each transition, the indices
+    of the frames making up its state and next state) and the buffer
+    is just an array of (shard, transition) pairs. The states are only
+    put together for the transitions in a minibatch, and a shard is
+    dropped once all of its transitions have been handed out.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, size: int, rng: np.random.Generator) -> None:
+        self.size = size
+        self.rng = rng
+        self.shards = {}
+        self.remaining = {}
+        self.nextShardId = 0
+        self.poolShards = np.empty(0, dtype=np.int64)
+        self.poolRows = np.empty(0, dtype=np.int64)
+        self.inShards = np.empty(0, dtype=np.int64)
+        self.inRows = np.empty(0, dtype=np.int64)
+
+    # -----
+    # add
+    # -----
+    def add(self, shard: Dict) -> None:
+        n = len(shard["actions"])
+        if n == 0:
+            return
+        shardId = self.nextShardId
+        self.nextShardId += 1
+        self.shards[shardId] = shard
+        self.remaining[shardId] = n
+        self.inShards = np.concatenate(
+            [self.inShards, np.full(n, shardId, dtype=np.int64)]
+        )
+        self.inRows = np.concatenate([self.inRows, np.arange(n)])
+        # Fill the pool before anything is handed out
+        nFill = min(self.size - len(self.poolShards), len(self.inShards))
+        if nFill > 0:
+            self.poolShards = np.concatenate(
+                [self.poolShards, self.inShards[:nFill]]
+            )
+            self.poolRows = np.concatenate([self.poolRows, self.inRows[:nFill]])
+            self.inShards = self.inShards[nFill:]
+            self.inRows = self.inRows[nFill:]
+
+    # -----
+    # ready
+    # -----
+    def ready(self, batchSize: int) -> bool:
+        return (
+            len(self.poolShards) == self.size
+            and len(self.inShards) >= batchSize
+        )
+
+    # -----
+    # batch
+    # -----
+    def batch(self, batchSize: int) -> Tuple:
+        positions = self.rng.choice(self.size, batchSize, replace=False)
+        shardIds = self.poolShards[positions]
+        rows = self.poolRows[positions]
+        # The transitions handed out are replaced with new ones
+        self.poolShards[positions] = self.inShards[:batchSize]
+        self.poolRows[positions] = self.inRows[:batchSize]
+        self.inShards = self.inShards[batchSize:]
+        self.inRows = self.inRows[batchSize:]
+        batch = self._gather(shardIds, rows)
+        for shardId, count in zip(*np.unique(shardIds, return_counts=True)):
+            self.remaining[shardId] -= count
+            if self.remaining[shardId] == 0:
+                del self.shards[shardId]
+                del self.remaining[shardId]
+        return batch
+
+    # -----
+    # _gather
+    # -----
+    def _gather(self, shardIds: np.ndarray, rows: np.ndarray) -> Tuple:
+        """
+        Puts the minibatch together in the same form as
+        `QMemory.sample`.
+        """
+        batchSize = len(rows)
+        first = self.shards[shardIds[0]]
+        stateShape = (batchSize,) + first["stateIndices"].shape[1:]
+        stateShape += first["frames"].shape[1:]
+        states = torch.empty(stateShape)
+        nextStates = torch.empty(stateShape)
+        actions = np.empty(batchSize, dtype=np.float32)
+        rewards = np.empty(batchSize, dtype=np.float32)
+        dones = np.empty(batchSize, dtype=np.float32)
+        for shardId in np.unique(shardIds):
+            shard = self.shards[shardId]
+            mask = shardIds == shardId
+            shardRows = rows[mask]
+            maskTensor = torch.from_numpy(mask)
+            frames = shard["frames"]
+            stateIndices = shard["stateIndices"][shardRows]
+            nextStateIndices = shard["nextStateIndices"][shardRows]
+            states[maskTensor] = frames[torch.from_numpy(stateIndices)]
+            nextStates[maskTensor] = frames[torch.from_numpy(nextStateIndices)]
+            actions[mask] = shard["actions"][shardRows]
+            rewards[mask] = shard["rewards"][shardRows]
+            dones[mask] = shard["dones"][shardRows]
+        return (
+            states,
+            torch.from_numpy(actions).reshape((batchSize, 1)),
+            torch.from_numpy(rewards).reshape((batchSize, 1)),
+            nextStates,
+            torch.from_numpy(dones).reshape((batchSize, 1)),
+        )
+
+
+# ============================================
+#               ShardReader
+# ============================================
+class ShardReader:
+    """
+    Reads shards of trajectory files and rebuilds their transitions.
+
+    Uncompressed files are memory-mapped, so only the pages holding
+    the shard's frames are read from disk. The maps (and the
+    locations of the files' chunks) are kept for reuse since each
+    file is visited once per shard per pass.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, pipeline) -> None:
+        self.pipeline = pipeline
+        self.traceLen = pipeline.traceLen
+        self.frameChunks = {}
+
+    # -----
+    # read
+    # -----
+    def read(self, path: str, start: int, stop: int) -> Dict:
+        """
+        Returns the transitions for rows [start, stop) of the file.
+
+        The state for row t is the stack of frames t - traceLen + 1
+        through t, where frames from before the start of the episode
+        are replaced by the episode's first frame (which is what the
+        pipeline does at the start of an episode). The next state is
+        the same for row t + 1. Rows at the end of an episode that
+        didn't finish (e.g., it hit the episode length) have no next
+        frame and are skipped. Rows where the episode finished don't
+        need one since the next state is masked out, so their state is
+        used in its place.
+
+        Episodes are only followed within a file, so the first few
+        states of an episode that carries over from the previous file
+        start with repeated frames.
+        """
+        # The preceding frames are needed for the first states, and
+        # the following one for the last next state
+        first = max(0, start - self.traceLen + 1)
+        with h5py.File(path, "r") as fd:
+            last = min(len(fd["actions"]), stop + 1)
+            episodes = fd["episodes"][first:last]
+            dones = fd["dones"][first:last]
+            actions = fd["actions"][first:last]
+            rewards = fd["rewards"][first:last]
+            frames = self._read_frames(path, fd["frames"], first, last)
+        frames = self.pipeline.process_frames(frames)
+        # Row positions relative to `first`
+        rows = np.arange(start - first, stop - first)
+        n = len(episodes)
+        isStart = np.ones(n, dtype=bool)
+        isStart[1:] = episodes[1:] != episodes[:-1]
+        episodeStart = np.maximum.accumulate(np.where(isStart, np.arange(n), 0))
+        hasNext = np.zeros(n, dtype=bool)
+        hasNext[:-1] = ~isStart[1:]
+        rows = rows[(dones[rows] != 0) | hasNext[rows]]
+        offsets = np.arange(-self.traceLen + 1, 1)
+        starts = episodeStart[rows][:, None]
+        stateIndices = np.maximum(rows[:, None] + offsets, starts)
+        nextStateIndices = np.maximum(rows[:, None] + 1 + offsets, starts)
+        terminal = dones[rows] != 0
+        nextStateIndices[terminal] = stateIndices[terminal]
+        return {
+            "frames": frames,
+            "stateIndices": stateIndices,
+            "nextStateIndices": nextStateIndices,
+            "actions": actions[rows],
+            "rewards": rewards[rows],
+            "dones": dones[rows],
+        }
+
+    # -----
+    # _read_frames
+    # -----
+    def _read_frames(
+        self, path: str, dataset: h5py.Dataset, start: int, stop: int
+    ) -> np.ndarray:
+        if dataset.compression is not None:
+            return dataset[start:stop]
+        if path not in self.frameChunks:
+            fileMap = np.memmap(path, dtype=np.uint8, mode="r")
+            self.frameChunks[path] = map_chunks(fileMap, dataset)
+        pieces = []
+        for chunkStart, chunkStop, chunk in self.frameChunks[path]:
+            if chunkStop <= start or chunkStart >= stop:
+                continue
+            lo = max(start, chunkStart) - chunkStart
+            hi = min(stop, chunkStop) - chunkStart
+            pieces.append(chunk[lo:hi])
+        return np.concatenate(pieces)
+
+
+# ============================================
+#          trajectory_loader_worker
+# ============================================
+def trajectory_loader_worker(
+    shards: List[Tuple[str, int, int]],
+    pipelineParams: DictConfig,
+    batchSize: int,
+    bufferSize: int,
+    seed: int,
+    batches,
+    stopEvent,
+) -> None:
+    """
+    Reads its shards over and over (in a new random order each pass)
+    and puts minibatches on the queue until it's told to stop.
+    """
+    # One thread per worker; the learner gets the rest
+    torch.set_num_threads(1)
+    pipeline = registry[pipelineParams.name](pipelineParams)
+    reader = ShardReader(pipeline)
+    rng = np.random.default_rng(seed)
+    buffer = ShuffleBuffer(bufferSize, rng)
+    while not stopEvent.is_set():
+        for i in rng.permutation(len(shards)):
+            buffer.add(reader.read(*shards[i]))
+            while buffer.ready(batchSize):
+                batch = buffer.batch(batchSize)
+                while not stopEvent.is_set():
+                    try:
+                        batches.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stopEvent.is_set():
+                    return
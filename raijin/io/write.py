@@ -1,16 +1,18 @@
 import os
+import shutil
 
 import h5py
-import numpy as np
 from omegaconf import OmegaConf as config
 from omegaconf.dictconfig import DictConfig
 import torch
 import yaml
 
 from raijin.memory import base_memory as bm
+from raijin.networks.scripting import script_network
 from raijin.trainers import base_trainer as bt
-from raijin.utilities.io_utilities import get_chkpt_dir
+from raijin.utilities.io_utilities import get_chkpt_num
 from raijin.utilities.io_utilities import sanitize_path
+from raijin.utilities.timing import timers
 
 
 # ============================================
@@ -37,16 +39,53 @@ def save_checkpoint(trainer: "bt.BaseTrainer", params: DictConfig) -> None:
 
     See: https://tinyurl.com/ycyuww2c
     """
-    # Create checkpoint directory
-    chkptDir = get_chkpt_dir(params.io.outputDir)
+    with timers.time("save_checkpoint"):
+        write_checkpoint(
+            params, trainer.metrics, trainer.state_dict(), trainer.memory
+        )
+
+
+# ============================================
+#              write_checkpoint
+# ============================================
+def write_checkpoint(
+    params: DictConfig,
+    metrics: dict,
+    stateDict: dict,
+    memory: "bm.BaseMemory",
+) -> str:
+    """
+    Writes the pieces of a checkpoint to the next checkpoint directory
+    and returns its path.
+
+    Everything is first written to a hidden temporary directory that's
+    renamed once the checkpoint is complete. Since a rename is atomic,
+    a `checkpoint_N` directory is never seen half-written, even if
+    training is killed partway through a save.
+    """
+    outputDir = sanitize_path(params.io.outputDir)
+    chkptNum = get_chkpt_num(outputDir) + 1
+    chkptDir = os.path.join(outputDir, f"checkpoint_{chkptNum}")
+    tmpDir = os.path.join(outputDir, f".checkpoint_{chkptNum}.tmp")
+    # Left over from a save that was interrupted
+    if os.path.isdir(tmpDir):
+        shutil.rmtree(tmpDir)
+    os.makedirs(tmpDir)
     # Save copy of parameter file
-    save_params(chkptDir, params)
+    save_params(tmpDir, params)
     # Save metrics
-    save_metrics(chkptDir, trainer.metrics)
+    save_metrics(tmpDir, metrics)
     # Save state dicts
-    save_state_dicts(trainer, chkptDir, params.io.checkpointBase)
-    # Save experience buffer
-    save_memory(trainer.memory, chkptDir)
+    save_state_dicts(stateDict, tmpDir, params.io.checkpointBase)
+    # Save experience buffer (offline trainers don't have one)
+    if memory is not None:
+        save_memory(
+            memory,
+            tmpDir,
+            compression=params.io.get("memoryCompression", None),
+        )
+    os.rename(tmpDir, chkptDir)
+    return chkptDir
 
 
 # ============================================
@@ -61,10 +100,7 @@ def save_params(outputDir: str, params: DictConfig) -> None:
 # ============================================
 #             save_state_dicts
 # ============================================
-def save_state_dicts(
-    trainer: "bt.BaseTrainer", outputDir: str, baseName: str
-) -> None:
-    stateDict = trainer.state_dict()
+def save_state_dicts(stateDict: dict, outputDir: str, baseName: str) -> None:
     chkptFile = os.path.join(outputDir, f"{baseName}.tar")
     torch.save(stateDict, chkptFile)
 
@@ -78,6 +114,10 @@ def save_final_model(
     """
     Saves the network parameters once training is finished.
 
+    A torchscript version of the network is saved alongside the
+    parameters so that the model can be loaded without the python
+    class that defines it.
+
     See: https://tinyurl.com/hr7fw54w
     """
     outputDir = sanitize_path(outputDir)
@@ -85,61 +125,94 @@ def save_final_model(
         os.makedirs(outputDir)
     modelFile = os.path.join(outputDir, "model.pt")
     torch.save(trainer.net.state_dict(), modelFile)
+    scriptedFile = os.path.join(outputDir, "model_scripted.pt")
+    torch.jit.save(script_network(trainer.net), scriptedFile)
 
 
 # ============================================
 #                save_memory
 # ============================================
-def save_memory(memory: "bm.BaseMemory", outputDir: str) -> None:
+def save_memory(
+    memory: "bm.BaseMemory",
+    outputDir: str,
+    compression: str = None,
+    blockBytes: int = 64 * 2**20,
+) -> None:
+    """
+    Saves the memory buffer to a single hdf5 file, `memory.h5`.
+
+    There's one dataset per component of the experiences (states,
+    actions, rewards, nextStates, and dones), each with the experience
+    axis first. That way each experience is a contiguous slab and the
+    buffer can be written with bulk slice writes: it's pulled out of
+    the memory in blocks of roughly `blockBytes` and each block is
+    written with a single assignment per dataset.
+
+    The datasets are chunked along the experience axis (about 1 MB
+    per chunk, which is h5py's default chunk cache size) so that
+    `compression` (e.g., "lzf" or "gzip") can be used, and so that
+    parts of the buffer can be read back without reading the rest.
+
+    Nothing is written for an empty buffer, since there's no
+    experience to take the datasets' shapes from. The readers treat a
+    missing file as an empty buffer.
     """
-    Saves the memory buffer.
+    nExperiences = len(memory)
+    if nExperiences == 0:
+        return
+    with h5py.File(os.path.join(outputDir, "memory.h5"), "w") as fd:
+        datasets = None
+        for start, arrays in memory.iter_arrays(
+            _get_block_size(memory, blockBytes)
+        ):
+            if datasets is None:
+                datasets = _create_memory_datasets(
+                    fd, arrays, nExperiences, compression
+                )
+            stop = start + len(arrays["actions"])
+            for name, array in arrays.items():
+                datasets[name][start:stop] = array
 
-    This is done by breaking each experience into its component parts
-    (states, actions, rewards, nextStates, and dones) and then saving
-    each one to is own hdf5 file.
+
+# ============================================
+#             _get_block_size
+# ============================================
+def _get_block_size(memory: "bm.BaseMemory", blockBytes: int) -> int:
     """
-    # Set up file names
-    statesFile = os.path.join(outputDir, "buffer_states.h5py")
-    actionsFile = os.path.join(outputDir, "buffer_actions.h5py")
-    rewardsFile = os.path.join(outputDir, "buffer_rewards.h5py")
-    nextStatesFile = os.path.join(outputDir, "buffer_nextStates.h5py")
-    donesFile = os.path.join(outputDir, "buffer_dones.h5py")
-    # Create file objects
-    fs = h5py.File(statesFile, "w")
-    fa = h5py.File(actionsFile, "w")
-    fr = h5py.File(rewardsFile, "w")
-    fn = h5py.File(nextStatesFile, "w")
-    fd = h5py.File(donesFile, "w")
-    # Initialize datasets
-    m = len(memory.buffer)
-    statesShape = list(memory.buffer[0].state.numpy().shape) + [
-        m,
-    ]
-    statesDs = fs.create_dataset("states", statesShape, dtype=np.float32)
-    actionsDs = fa.create_dataset("actions", m, dtype=np.int32)
-    rewardsDs = fr.create_dataset("rewards", m, dtype=np.float32)
-    nextStatesDs = fn.create_dataset(
-        "nextStates", statesShape, dtype=np.float32
-    )
-    donesDs = fd.create_dataset("dones", m, dtype=np.int32)
-    # Write data
-    for i, experience in enumerate(memory.buffer):
-        statesDs[:, :, :, i] = experience.state.numpy()
-        actionsDs[i] = experience.action
-        rewardsDs[i] = experience.reward
-        nextStatesDs[:, :, :, i] = experience.nextState.numpy()
-        donesDs[i] = experience.done
-    # Close files
-    fs.close()
-    fa.close()
-    fr.close()
-    fn.close()
-    fd.close()
+    Returns how many experiences make up roughly `blockBytes`, going
+    by the size of the first one.
+    """
+    _, arrays = next(memory.iter_arrays(1))
+    experienceBytes = sum(a.nbytes for a in arrays.values())
+    return max(1, blockBytes // experienceBytes)
+
+
+# ============================================
+#          _create_memory_datasets
+# ============================================
+def _create_memory_datasets(
+    fd: h5py.File, arrays: dict, nExperiences: int, compression: str
+) -> dict:
+    datasets = {}
+    for name, array in arrays.items():
+        rowBytes = array[0].nbytes
+        chunkRows = min(nExperiences, max(1, 2**20 // rowBytes))
+        datasets[name] = fd.create_dataset(
+            name,
+            (nExperiences,) + array.shape[1:],
+            dtype=array.dtype,
+            chunks=(chunkRows,) + array.shape[1:],
+            compression=compression,
+        )
+    return datasets
 
 
 # ============================================
 #                save_metrics
 # ============================================
-def save_metrics(outputDir: str, metrics: dict) -> None:
-    with open(os.path.join(outputDir, "metrics.yaml"), "w") as fd:
+def save_metrics(
+    outputDir: str, metrics: dict, fileName: str = "metrics.yaml"
+) -> None:
+    outputDir = sanitize_path(outputDir)
+    with open(os.path.join(outputDir, fileName), "w") as fd:
         yaml.safe_dump(metrics, fd)
@@ -1,5 +1,13 @@
-from . import (
-    base_memory,
-    experience,
-    qmemory,
+from raijin.utilities.lazy import lazy_submodules
+
+
+# The submodules are imported the first time they're used
+__getattr__, __dir__ = lazy_submodules(
+    __name__,
+    (
+        "base_memory",
+        "experience",
+        "qmemory",
+        "tiered_memory",
+    ),
 )
@@ -1,7 +1,11 @@
 from abc import ABC
 from abc import abstractmethod
+from typing import Dict
+from typing import Iterator
 from typing import Tuple
 
+import numpy as np
+
 from raijin.utilities.register import register_object
 
 
@@ -9,6 +13,15 @@ from raijin.utilities.register import register_object
 #                  BaseMemory
 # ============================================
 class BaseMemory(ABC):
+    """
+    Besides adding and sampling, a memory has to support the bulk
+    array methods below, which the checkpoint writers and readers use
+    to save and load the buffer. It also has to keep `nAdded`, the
+    total number of experiences ever added (including ones that have
+    since been dropped), which the checkpoint store uses to tell which
+    experiences it already has.
+    """
+
     # -----
     # subclass_hook
     # -----
@@ -42,3 +55,67 @@ class BaseMemory(ABC):
     @abstractmethod
     def state_dict(self) -> dict:
         pass
+
+    # -----
+    # snapshot
+    # -----
+    @abstractmethod
+    def snapshot(self) -> "BaseMemory":
+        """
+        Returns a copy of the memory that isn't affected by further
+        additions, for writing checkpoints in the background.
+        """
+        pass
+
+    # -----
+    # iter_arrays
+    # -----
+    @abstractmethod
+    def iter_arrays(
+        self, blockSize: int
+    ) -> Iterator[Tuple[int, Dict[str, np.ndarray]]]:
+        """
+        Walks through the buffer in order, yielding the position of
+        the first experience in each block along with one array per
+        component (states, actions, rewards, nextStates, dones).
+        """
+        pass
+
+    # -----
+    # get_arrays
+    # -----
+    @abstractmethod
+    def get_arrays(self, start: int, stop: int) -> Dict[str, np.ndarray]:
+        """
+        Returns the experiences at buffer positions [start, stop) in
+        the same form as `iter_arrays`.
+        """
+        pass
+
+    # -----
+    # load_arrays
+    # -----
+    @abstractmethod
+    def load_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        """
+        Adds the experiences in the given arrays (as returned by
+        `iter_arrays`) to the buffer.
+        """
+        pass
+
+    # -----
+    # __len__
+    # -----
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    # -----
+    # close
+    # -----
+    def close(self) -> None:
+        """
+        Releases anything the memory holds besides its experiences
+        (e.g., background threads). Called after training.
+        """
+        pass
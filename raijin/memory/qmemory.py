@@ -1,4 +1,8 @@
 from collections import deque
+import copy
+import itertools
+from typing import Dict
+from typing import Iterator
 from typing import Tuple
 
 import numpy as np
@@ -30,12 +34,17 @@ class QMemory(BaseMemory):
     def __init__(self, params: DictConfig) -> None:
         self.capacity = params.capacity
         self.buffer = deque(maxlen=self.capacity)
+        # Total number of experiences ever added. The experiences in
+        # the buffer are numbers nAdded - len(buffer) through
+        # nAdded - 1
+        self.nAdded = 0
 
     # -----
     # add
     # -----
     def add(self, experience: Experience) -> None:
         self.buffer.append(experience)
+        self.nAdded += 1
 
     # -----
     # sample
@@ -47,6 +56,111 @@ class QMemory(BaseMemory):
         batch = zip(*[self.buffer[i] for i in indices])
         return self._process_batch(batch, batchSize)
 
+    # -----
+    # snapshot
+    # -----
+    def snapshot(self) -> "QMemory":
+        """
+        Returns a copy of the memory that isn't affected by further
+        additions. Only the buffer's index is copied: the experiences
+        themselves are shared, since they're never changed once
+        they've been added.
+        """
+        memory = copy.copy(self)
+        memory.buffer = deque(self.buffer, maxlen=self.capacity)
+        return memory
+
+    # -----
+    # iter_arrays
+    # -----
+    def iter_arrays(
+        self, blockSize: int
+    ) -> Iterator[Tuple[int, Dict[str, np.ndarray]]]:
+        """
+        Walks through the buffer in order, yielding the index of the
+        first experience in each block along with the block's
+        experiences as one contiguous array per component (experience
+        axis first). This lets the buffer be written out with a few
+        bulk copies instead of one small copy per experience.
+        """
+        block = []
+        start = 0
+        for experience in self.buffer:
+            block.append(experience)
+            if len(block) == blockSize:
+                yield start, self._to_arrays(block)
+                start += len(block)
+                block = []
+        if block:
+            yield start, self._to_arrays(block)
+
+    # -----
+    # get_arrays
+    # -----
+    def get_arrays(self, start: int, stop: int) -> Dict[str, np.ndarray]:
+        """
+        Returns the experiences at buffer positions [start, stop) in
+        the same form as `iter_arrays`.
+        """
+        return self._to_arrays(list(itertools.islice(self.buffer, start, stop)))
+
+    # -----
+    # load_arrays
+    # -----
+    def load_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        """
+        Adds the experiences in the given arrays (as returned by
+        `iter_arrays`) to the buffer. The states are views into the
+        arrays rather than copies.
+        """
+        states = torch.from_numpy(arrays["states"])
+        nextStates = torch.from_numpy(arrays["nextStates"])
+        actions = arrays["actions"].tolist()
+        rewards = arrays["rewards"].tolist()
+        dones = arrays["dones"].astype(bool).tolist()
+        for i in range(len(actions)):
+            self.buffer.append(
+                Experience(
+                    states[i], actions[i], rewards[i], nextStates[i], dones[i]
+                )
+            )
+        self.nAdded = max(self.nAdded, len(self.buffer))
+
+    # -----
+    # __len__
+    # -----
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    # -----
+    # nbytes
+    # -----
+    def nbytes(self) -> int:
+        """
+        Roughly how much memory the experiences in the buffer take up,
+        estimated from the newest one since they're all the same size.
+        The action, reward, and done flag are counted as 8 bytes each.
+        """
+        if not self.buffer:
+            return 0
+        state, _, _, nextState, _ = self.buffer[-1]
+        size = state.element_size() * state.nelement()
+        size += nextState.element_size() * nextState.nelement()
+        return len(self.buffer) * (size + 24)
+
+    # -----
+    # _to_arrays
+    # -----
+    def _to_arrays(self, experiences: list) -> Dict[str, np.ndarray]:
+        states, actions, rewards, nextStates, dones = zip(*experiences)
+        return {
+            "states": torch.stack(states).numpy(),
+            "actions": np.array(actions, dtype=np.int64),
+            "rewards": np.array(rewards, dtype=np.float32),
+            "nextStates": torch.stack(nextStates).numpy(),
+            "dones": np.array(dones, dtype=np.uint8),
+        }
+
     # -----
     # _process_batch
     # -----
@@ -79,4 +193,11 @@ class QMemory(BaseMemory):
     # state_dict
     # -----
     def state_dict(self) -> dict:
-        return {}
+        # The buffer itself is saved separately (see `save_memory`)
+        return {"nAdded": self.nAdded}
+
+    # -----
+    # load_state_dict
+    # -----
+    def load_state_dict(self, stateDict: dict) -> None:
+        self.nAdded = stateDict.get("nAdded", 0)
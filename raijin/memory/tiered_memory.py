@@ -0,0 +1,593 @@
+import collections
+import copy
+import os
+import queue
+import random
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+import numpy as np
+from omegaconf.dictconfig import DictConfig
+import torch
+
+from raijin.utilities.io_utilities import sanitize_path
+
+from .base_memory import BaseMemory
+from .experience import Experience
+
+
+# ============================================
+#                TieredMemory
+# ============================================
+class TieredMemory(BaseMemory):
+    """
+    A memory buffer that keeps the newest experiences in RAM and the
+    older ones on disk, so its capacity isn't limited by RAM while
+    recent experiences are still quick to sample.
+
+    Experiences are stored in segments of `segmentSize`. The newest
+    `hotCapacity` worth of segments make up the hot tier, which lives
+    in RAM. As soon as a segment fills up it's written (spilled) to
+    its own file in `spillDir` by a background thread, and it joins
+    the cold tier once it's pushed out of the hot one. The cold tier
+    holds the rest of the `capacity` and is read through memory maps.
+    The oldest cold segments are deleted as new ones arrive.
+
+    Sampling never touches the disk. A background pager copies
+    `cacheSegments` randomly chosen cold segments into RAM, with the
+    next `readAhead` segments already read in so they can be swapped
+    in right away. Each time about a segment's worth of cold
+    experiences has been sampled, the pager swaps out the oldest
+    cached segment for a new one, so the whole cold tier gets sampled
+    over time. Each batch takes `hotFraction` of its experiences from
+    the hot tier and the rest from the cached cold segments (or all of
+    them from the hot tier until there are some).
+
+    If the disk falls behind, `add` waits once `maxPendingSpills`
+    segments are waiting to be written (counted in `stallTime`) rather
+    than letting them pile up in RAM.
+
+    The buffer never holds more than `capacity`: the segments and the
+    hot tier are shrunk to fit it if need be, and it's rounded down to
+    a whole number of segments.
+
+    The spill files are a cache rather than a copy of the buffer to
+    keep: checkpoints save the buffer as usual and the files are
+    deleted by `close` (or when the program exits).
+    """
+
+    __name__ = "TieredMemory"
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, params: DictConfig) -> None:
+        if params.capacity < 2:
+            raise ValueError("capacity must be at least two.")
+        # The hot tier needs at least two segments
+        self.segmentSize = min(
+            params.get("segmentSize", 1024), params.capacity // 2
+        )
+        hotCapacity = min(
+            params.get("hotCapacity", 16 * self.segmentSize), params.capacity
+        )
+        if hotCapacity < 2 * self.segmentSize:
+            raise ValueError("hotCapacity must hold at least two segments.")
+        self.nHotSegments = hotCapacity // self.segmentSize
+        self.nColdSegments = max(0, params.capacity - hotCapacity)
+        self.nColdSegments //= self.segmentSize
+        self.capacity = (
+            self.nHotSegments + self.nColdSegments
+        ) * self.segmentSize
+        self.hotFraction = params.get("hotFraction", 0.5)
+        self.cacheSegments = params.get("cacheSegments", 8)
+        self.readAhead = params.get("readAhead", 2)
+        self.maxPendingSpills = params.get("maxPendingSpills", 4)
+        self.spillParent = params.get("spillDir")
+        # Total number of experiences ever added, as with QMemory
+        self.nAdded = 0
+        # The experiences' layout, set by the first one added
+        self.rowDtype = None
+        # Segment k holds experiences k * segmentSize through
+        # (k + 1) * segmentSize - 1 in the order they were stored.
+        # The hot tier is segments hotFirst on, the last of which is
+        # being filled, and the cold tier is coldFirst to hotFirst - 1
+        self.hot = collections.deque()
+        self.hotFirst = 0
+        self.coldFirst = 0
+        self.nStored = 0
+        # Cold segments, by number: those still waiting to be written
+        # and the memory maps of those that have been
+        self.spillBuffers = {}
+        self.coldFiles = {}
+        # Cold segments copied into RAM by the pager, as (number,
+        # segment) pairs. Only the pager changes these, by swapping in
+        # new lists
+        self.cache = []
+        self.readAheadSegments = []
+        self.nColdSampled = 0
+        self.stallTime = 0.0
+        self.spillDir = None
+        self.error = None
+        self.stopEvent = threading.Event()
+        self.pagerWakeup = threading.Event()
+        self.spillQueue = queue.Queue()
+        self.spillSlots = threading.Semaphore(self.maxPendingSpills)
+        self.threads = []
+
+    # -----
+    # add
+    # -----
+    def add(self, experience: Experience) -> None:
+        self._check_error()
+        if self.rowDtype is None:
+            self._set_layout(experience.state.numpy())
+        segment, row = self._next_row()
+        segment["states"][row] = experience.state.numpy()
+        segment["nextStates"][row] = experience.nextState.numpy()
+        segment["actions"][row] = experience.action
+        segment["rewards"][row] = experience.reward
+        segment["dones"][row] = experience.done
+        self._stored(1)
+        self.nAdded += 1
+
+    # -----
+    # sample
+    # -----
+    def sample(self, batchSize: int) -> Tuple:
+        cache = [segment for k, segment in self.cache if k >= self.coldFirst]
+        nCold = 0
+        if cache:
+            nCold = int(round(batchSize * (1.0 - self.hotFraction)))
+            nCold = min(nCold, len(cache) * self.segmentSize)
+        batch = {
+            name: np.empty(
+                (batchSize,) + self.rowDtype[name].shape,
+                dtype=self.rowDtype[name].base,
+            )
+            for name in _fieldNames
+        }
+        hot = list(self.hot)
+        nHot = (len(hot) - 1) * self.segmentSize + self._fill()
+        indices = np.random.choice(nHot, batchSize - nCold, replace=False)
+        _gather(hot, indices, self.segmentSize, batch, 0)
+        if nCold:
+            indices = np.random.choice(
+                len(cache) * self.segmentSize, nCold, replace=False
+            )
+            _gather(cache, indices, self.segmentSize, batch, batchSize - nCold)
+            self.nColdSampled += nCold
+            if self.nColdSampled >= self.segmentSize:
+                self.pagerWakeup.set()
+        return self._to_batch(batch)
+
+    # -----
+    # snapshot
+    # -----
+    def snapshot(self) -> "TieredMemory":
+        """
+        Returns a copy of the memory that isn't affected by further
+        additions. Full segments are never changed, so only the one
+        being filled is copied. Files of cold segments that are later
+        deleted stay readable through the copy's memory maps.
+        """
+        memory = copy.copy(self)
+        memory.hot = collections.deque(self.hot)
+        if memory.hot:
+            memory.hot[-1] = memory.hot[-1].copy()
+        memory.spillBuffers = dict(self.spillBuffers)
+        memory.coldFiles = dict(self.coldFiles)
+        memory.threads = []
+        return memory
+
+    # -----
+    # iter_arrays
+    # -----
+    def iter_arrays(
+        self, blockSize: int
+    ) -> Iterator[Tuple[int, Dict[str, np.ndarray]]]:
+        """
+        Walks through the buffer in order, yielding the index of the
+        first experience in each block along with the block's
+        experiences as one contiguous array per component (see
+        `QMemory.iter_arrays`).
+        """
+        for start in range(0, len(self), blockSize):
+            yield start, self.get_arrays(
+                start, min(start + blockSize, len(self))
+            )
+
+    # -----
+    # get_arrays
+    # -----
+    def get_arrays(self, start: int, stop: int) -> Dict[str, np.ndarray]:
+        """
+        Returns the experiences at buffer positions [start, stop) in
+        the same form as `iter_arrays`. Cold ones are read from disk.
+        """
+        first = self.coldFirst * self.segmentSize
+        blocks = []
+        position = first + start
+        while position < first + stop:
+            k, row = divmod(position, self.segmentSize)
+            n = min(self.segmentSize - row, first + stop - position)
+            blocks.append(self._segment(k)[row : row + n])
+            position += n
+        rows = np.concatenate(blocks)
+        return {name: np.ascontiguousarray(rows[name]) for name in _fieldNames}
+
+    # -----
+    # load_arrays
+    # -----
+    def load_arrays(self, arrays: Dict[str, np.ndarray]) -> None:
+        """
+        Adds the experiences in the given arrays (as returned by
+        `iter_arrays`) to the buffer, a segment's worth at a time.
+        """
+        nExperiences = len(arrays["actions"])
+        if nExperiences and self.rowDtype is None:
+            self._set_layout(arrays["states"][0])
+        start = 0
+        while start < nExperiences:
+            self._check_error()
+            segment, row = self._next_row()
+            n = min(self.segmentSize - row, nExperiences - start)
+            for name in _fieldNames:
+                segment[name][row : row + n] = arrays[name][start : start + n]
+            self._stored(n)
+            start += n
+        self.nAdded = max(self.nAdded, len(self))
+
+    # -----
+    # close
+    # -----
+    def close(self) -> None:
+        """
+        Stops the background threads and deletes the spill files.
+        """
+        self.stopEvent.set()
+        self.pagerWakeup.set()
+        self.spillQueue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        if self.spillDir is not None:
+            shutil.rmtree(self.spillDir, ignore_errors=True)
+
+    # -----
+    # nbytes
+    # -----
+    def nbytes(self) -> int:
+        """
+        How much RAM the experiences take up: the hot tier, the cold
+        segments waiting to be written, and the pager's cache.
+        """
+        if self.rowDtype is None:
+            return 0
+        nSegments = len(self.hot) + len(self.spillBuffers) + len(self.cache)
+        nSegments += len(self.readAheadSegments)
+        return nSegments * self.segmentSize * self.rowDtype.itemsize
+
+    # -----
+    # __len__
+    # -----
+    def __len__(self) -> int:
+        return self.nStored - self.coldFirst * self.segmentSize
+
+    # -----
+    # state_dict
+    # -----
+    def state_dict(self) -> dict:
+        # The buffer itself is saved separately (see `save_memory`)
+        return {"nAdded": self.nAdded}
+
+    # -----
+    # load_state_dict
+    # -----
+    def load_state_dict(self, stateDict: dict) -> None:
+        self.nAdded = stateDict.get("nAdded", 0)
+
+    # -----
+    # _set_layout
+    # -----
+    def _set_layout(self, state: np.ndarray) -> None:
+        self.rowDtype = np.dtype(
+            [
+                ("states", state.dtype, state.shape),
+                ("actions", np.int64),
+                ("rewards", np.float32),
+                ("nextStates", state.dtype, state.shape),
+                ("dones", np.uint8),
+            ]
+        )
+
+    # -----
+    # _fill
+    # -----
+    def _fill(self) -> int:
+        """
+        Number of experiences in the segment being filled.
+        """
+        return self.nStored - (self.hotFirst + len(self.hot) - 1) * (
+            self.segmentSize
+        )
+
+    # -----
+    # _next_row
+    # -----
+    def _next_row(self) -> Tuple[np.ndarray, int]:
+        """
+        Returns the segment and row the next experience goes in,
+        starting a new segment if the current one is full.
+        """
+        if not self.hot or self._fill() == self.segmentSize:
+            self._start_segment()
+        return self.hot[-1], self._fill()
+
+    # -----
+    # _stored
+    # -----
+    def _stored(self, n: int) -> None:
+        self.nStored += n
+        if self._fill() == self.segmentSize and self.nColdSegments:
+            self._spill(self.hotFirst + len(self.hot) - 1, self.hot[-1])
+
+    # -----
+    # _start_segment
+    # -----
+    def _start_segment(self) -> None:
+        self.hot.append(np.empty(self.segmentSize, dtype=self.rowDtype))
+        if len(self.hot) <= self.nHotSegments:
+            return
+        # The oldest hot segment becomes the newest cold one, and the
+        # oldest cold one is dropped
+        self.hot.popleft()
+        self.hotFirst += 1
+        # coldFirst is moved on before evicting: if the spill thread
+        # finishes one of these segments in the meantime, it then sees
+        # that the segment was dropped and evicts it itself
+        oldFirst = self.coldFirst
+        self.coldFirst = max(0, self.hotFirst - self.nColdSegments)
+        for k in range(oldFirst, self.coldFirst):
+            self._evict(k)
+        self.pagerWakeup.set()
+
+    # -----
+    # _spill
+    # -----
+    def _spill(self, k: int, segment: np.ndarray) -> None:
+        """
+        Hands a full segment to the spill thread.
+        """
+        if not self.threads:
+            self._start_threads()
+        start = time.perf_counter()
+        self.spillSlots.acquire()
+        self.stallTime += time.perf_counter() - start
+        self.spillBuffers[k] = segment
+        self.spillQueue.put(k)
+
+    # -----
+    # _evict
+    # -----
+    def _evict(self, k: int) -> None:
+        self.spillBuffers.pop(k, None)
+        if self.coldFiles.pop(k, None) is not None:
+            _remove(self._segment_path(k))
+
+    # -----
+    # _segment
+    # -----
+    def _segment(self, k: int) -> np.ndarray:
+        if k >= self.hotFirst:
+            return self.hot[k - self.hotFirst]
+        # The spill thread adds the file before dropping the buffer, so
+        # looking in this order always finds one of them
+        segment = self.spillBuffers.get(k)
+        if segment is None:
+            segment = self.coldFiles[k]
+        return segment
+
+    # -----
+    # _segment_path
+    # -----
+    def _segment_path(self, k: int) -> str:
+        return os.path.join(self.spillDir, f"segment-{k:09d}.npy")
+
+    # -----
+    # _start_threads
+    # -----
+    def _start_threads(self) -> None:
+        parent = None
+        if self.spillParent is not None:
+            parent = sanitize_path(self.spillParent)
+            os.makedirs(parent, exist_ok=True)
+        self.spillDir = tempfile.mkdtemp(prefix="raijin-memory-", dir=parent)
+        weakref.finalize(self, shutil.rmtree, self.spillDir, True)
+        self.threads = [
+            threading.Thread(
+                target=self._spill_loop, name="raijin-spill", daemon=True
+            ),
+            threading.Thread(
+                target=self._page_loop, name="raijin-pager", daemon=True
+            ),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    # -----
+    # _spill_loop
+    # -----
+    def _spill_loop(self) -> None:
+        while True:
+            k = self.spillQueue.get()
+            if k is None:
+                return
+            try:
+                segment = self.spillBuffers.get(k)
+                # The segment may have been dropped while it waited
+                if segment is not None:
+                    path = self._segment_path(k)
+                    np.save(path + ".tmp.npy", segment)
+                    os.replace(path + ".tmp.npy", path)
+                    self.coldFiles[k] = np.load(path, mmap_mode="r")
+                    self.spillBuffers.pop(k, None)
+                    if k < self.coldFirst:
+                        self._evict(k)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.spillSlots.release()
+
+    # -----
+    # _page_loop
+    # -----
+    def _page_loop(self) -> None:
+        lastSwap = 0
+        while not self.stopEvent.is_set():
+            self.pagerWakeup.wait(timeout=0.1)
+            self.pagerWakeup.clear()
+            try:
+                lastSwap = self._page(lastSwap)
+            except Exception as e:
+                self.error = e
+                return
+
+    # -----
+    # _page
+    # -----
+    def _page(self, lastSwap: int) -> int:
+        """
+        Keeps the read-ahead segments topped up, fills the cache, and
+        swaps out a cached segment once about a segment's worth of
+        cold experiences has been sampled since the last swap. Returns
+        when the last swap happened, in cold experiences sampled.
+        """
+        coldFirst = self.coldFirst
+        cache = [(k, s) for k, s in self.cache if k >= coldFirst]
+        readAhead = [
+            (k, s) for k, s in self.readAheadSegments if k >= coldFirst
+        ]
+        paged = set(k for k, _ in cache) | set(k for k, _ in readAhead)
+        candidates = [
+            k
+            for k in range(coldFirst, self.hotFirst)
+            if k not in paged and k in self.coldFiles
+        ]
+        random.shuffle(candidates)
+        while candidates and len(readAhead) < self.readAhead:
+            k = candidates.pop()
+            segmentFile = self.coldFiles.get(k)
+            if segmentFile is not None:
+                segment = _read_segment(segmentFile)
+                if segment is not None:
+                    readAhead.append((k, segment))
+        while readAhead and len(cache) < self.cacheSegments:
+            cache.append(readAhead.pop(0))
+        nColdSampled = self.nColdSampled
+        if readAhead and nColdSampled - lastSwap >= self.segmentSize:
+            cache.pop(0)
+            cache.append(readAhead.pop(0))
+            lastSwap = nColdSampled
+            # Read the next one in right away
+            self.pagerWakeup.set()
+        self.readAheadSegments = readAhead
+        self.cache = cache
+        return lastSwap
+
+    # -----
+    # _to_batch
+    # -----
+    def _to_batch(self, batch: Dict[str, np.ndarray]) -> Tuple:
+        """
+        Converts the sampled experiences to tensors of the same shapes
+        and types as `QMemory.sample`.
+        """
+        batchSize = len(batch["actions"])
+        states = torch.from_numpy(batch["states"])
+        nextStates = torch.from_numpy(batch["nextStates"])
+        actions = torch.from_numpy(batch["actions"].astype(np.float32))
+        rewards = torch.from_numpy(batch["rewards"].astype(np.float32))
+        dones = torch.from_numpy(batch["dones"].astype(np.float32))
+        return (
+            states,
+            actions.reshape((batchSize, 1)),
+            rewards.reshape((batchSize, 1)),
+            nextStates,
+            dones.reshape((batchSize, 1)),
+        )
+
+    # -----
+    # _check_error
+    # -----
+    def _check_error(self) -> None:
+        if self.error is not None:
+            error = self.error
+            self.error = None
+            raise RuntimeError("Spilling the memory to disk failed.") from error
+
+
+# The components of an experience, as named by `iter_arrays`
+_fieldNames = ("states", "actions", "rewards", "nextStates", "dones")
+
+
+# ============================================
+#                  _gather
+# ============================================
+def _gather(
+    segments: List[np.ndarray],
+    indices: np.ndarray,
+    segmentSize: int,
+    batch: Dict[str, np.ndarray],
+    start: int,
+) -> None:
+    """
+    Copies the rows at the given indices into the segments (laid end
+    to end) into the batch's arrays, from position `start` on. Going
+    field by field copies each state once, rather than copying whole
+    rows and then pulling the fields out of them.
+    """
+    which, rows = np.divmod(indices, segmentSize)
+    for i in np.unique(which):
+        mask = which == i
+        positions = start + np.flatnonzero(mask)
+        for name in _fieldNames:
+            batch[name][positions] = segments[i][name][rows[mask]]
+
+
+# ============================================
+#               _read_segment
+# ============================================
+def _read_segment(segmentFile: np.memmap) -> np.ndarray:
+    """
+    Reads a spilled segment into RAM. Reading the file, rather than
+    copying from its memory map, lets the other threads run while this
+    one waits on the disk. Returns None if the segment has since been
+    dropped.
+    """
+    segment = np.empty(segmentFile.shape, dtype=segmentFile.dtype)
+    try:
+        with open(segmentFile.filename, "rb") as fd:
+            fd.seek(segmentFile.offset)
+            fd.readinto(segment.view(np.uint8))
+    except FileNotFoundError:
+        return None
+    return segment
+
+
+# ============================================
+#                  _remove
+# ============================================
+def _remove(path: str) -> None:
+    # Memory maps of the file (e.g., in a snapshot) stay readable
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
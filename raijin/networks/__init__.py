@@ -1,4 +1,12 @@
-from . import (
-    base_network,
-    qnetwork,
+from raijin.utilities.lazy import lazy_submodules
+
+
+# The submodules are imported the first time they're used
+__getattr__, __dir__ = lazy_submodules(
+    __name__,
+    (
+        "base_network",
+        "qnetwork",
+        "scripting",
+    ),
 )
@@ -1,5 +1,6 @@
 from abc import ABC
 from abc import abstractmethod
+from typing import List
 
 import numpy as np
 import torch
@@ -35,6 +36,17 @@ class BaseNetwork(ABC, torch.nn.Module):
         """
         pass
 
+    # -----
+    # fusable_layers
+    # -----
+    def fusable_layers(self) -> List[List[str]]:
+        """
+        Returns the names of groups of consecutive layers (e.g., a
+        conv followed by a relu) that can be fused into one layer when
+        the network is quantized.
+        """
+        return []
+
     # -----
     # get_conv_out_shape
     # -----
@@ -1,6 +1,10 @@
+from typing import List
+
 import torch
 from torch import nn
 
+from raijin.utilities.precision import channels_last_available
+
 from .base_network import BaseNetwork
 
 
@@ -11,6 +15,12 @@ class QNetwork(BaseNetwork):
     """
     Implements the network described in [Mnih et al. 2013][1].
 
+    Setting `channelsLast` in the network's parameters stores the
+    convolutional weights and the inputs in NHWC order, which the
+    cpu convolution kernels are generally faster with. Setting `jit`
+    compiles the layers with torchscript, which cuts down on the
+    python overhead of each forward pass.
+
     [1]: https://arxiv.org/abs/1312.5602
     """
 
@@ -21,6 +31,10 @@ class QNetwork(BaseNetwork):
     # -----
     def __init__(self, inChannels: int, nActions: int, **kwargs: dict) -> None:
         super().__init__()
+        params = kwargs.get("params", {})
+        self.channelsLast = (
+            params.get("channelsLast", False) and channels_last_available()
+        )
         # First convolutional layer
         conv1 = nn.Conv2d(
             in_channels=inChannels, out_channels=16, kernel_size=8, stride=4
@@ -34,7 +48,10 @@ class QNetwork(BaseNetwork):
             conv1OutShape[1], conv1OutShape[2], conv2
         )
         # First fully connected layer
-        fc1 = nn.Linear(in_features=conv2OutShape.prod(), out_features=256)
+        # The shape is a numpy array, but torchscript needs a python int
+        fc1 = nn.Linear(
+            in_features=int(conv2OutShape.prod()), out_features=256
+        )
         # Output layer
         outputLayer = nn.Linear(in_features=256, out_features=nActions)
         # Network
@@ -48,9 +65,22 @@ class QNetwork(BaseNetwork):
             nn.ReLU(),
             outputLayer,
         )
+        if self.channelsLast:
+            self.to(memory_format=torch.channels_last)
+        if params.get("jit", False):
+            self.net = torch.jit.script(self.net)
+
+    # -----
+    # fusable_layers
+    # -----
+    def fusable_layers(self) -> List[List[str]]:
+        # conv1 + relu, conv2 + relu, and fc1 + relu
+        return [["net.0", "net.1"], ["net.2", "net.3"], ["net.5", "net.6"]]
 
     # -----
     # forward
     # -----
     def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if self.channelsLast:
+            x = x.contiguous(memory_format=torch.channels_last)
         return self.net(x)
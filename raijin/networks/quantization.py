@@ -0,0 +1,188 @@
+import copy
+import time
+from typing import Dict
+
+import numpy as np
+import torch
+from torch import nn
+
+from raijin.agents import base_agent as ba
+
+
+# ============================================
+#               StaticQuantized
+# ============================================
+class StaticQuantized(nn.Module):
+    """
+    Wraps a network so that its input is quantized to int8 on the way
+    in and its output is converted back to float32 on the way out.
+    Everything in between runs with int8 kernels.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, net: nn.Module) -> None:
+        super().__init__()
+        self.quant = torch.quantization.QuantStub()
+        self.net = net
+        self.dequant = torch.quantization.DeQuantStub()
+
+    # -----
+    # forward
+    # -----
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.dequant(self.net(self.quant(x)))
+
+
+# ============================================
+#              quantize_network
+# ============================================
+def quantize_network(
+    net: nn.Module, method: str, calibrationStates: torch.Tensor = None
+) -> nn.Module:
+    """
+    Returns an int8, inference-only copy of the given network. The
+    original network is left untouched, so this can be called
+    repeatedly on a network that's still training.
+
+    * dynamic: the weights of the linear layers are stored as int8
+        and the activations are quantized on the fly. Needs no
+        calibration
+    * static: the conv and linear layers (fused with their relus) run
+        entirely in int8. The activation ranges are calibrated by
+        running `calibrationStates` through the network
+
+    Networks with torchscript in them can't be quantized, since both
+    methods work on the network's python modules. (Dynamic
+    quantization would otherwise quietly leave the scripted layers in
+    float32.)
+    """
+    if is_scripted(net):
+        raise ValueError(
+            "Networks compiled with torchscript (e.g., `jit: true`) can't "
+            "be quantized."
+        )
+    if method == "dynamic":
+        return quantize_dynamic(net)
+    if method == "static":
+        if calibrationStates is None:
+            raise ValueError("Static quantization needs calibration states.")
+        return quantize_static(net, calibrationStates)
+    raise ValueError(f"Unknown quantization method: `{method}`.")
+
+
+# ============================================
+#                is_scripted
+# ============================================
+def is_scripted(net: nn.Module) -> bool:
+    """
+    Returns True if the network or any of its layers is a torchscript
+    module.
+    """
+    return any(isinstance(m, torch.jit.ScriptModule) for m in net.modules())
+
+
+# ============================================
+#              quantize_dynamic
+# ============================================
+def quantize_dynamic(net: nn.Module) -> nn.Module:
+    net = copy.deepcopy(net)
+    net.eval()
+    net = torch.quantization.quantize_dynamic(
+        net, {nn.Linear}, dtype=torch.qint8
+    )
+    net.requires_grad_(False)
+    return net
+
+
+# ============================================
+#              quantize_static
+# ============================================
+def quantize_static(
+    net: nn.Module, calibrationStates: torch.Tensor
+) -> nn.Module:
+    engine = _get_engine()
+    net = copy.deepcopy(net)
+    net.eval()
+    if isinstance(getattr(net, "net", None), torch.jit.ScriptModule):
+        raise ValueError("Torchscript networks can't be statically quantized.")
+    fuseGroups = net.fusable_layers()
+    if fuseGroups:
+        net = torch.quantization.fuse_modules(net, fuseGroups)
+    qnet = StaticQuantized(net)
+    qnet.qconfig = torch.quantization.get_default_qconfig(engine)
+    torch.quantization.prepare(qnet, inplace=True)
+    with torch.no_grad():
+        qnet(calibrationStates)
+    torch.quantization.convert(qnet, inplace=True)
+    qnet.requires_grad_(False)
+    return qnet
+
+
+# ============================================
+#               record_states
+# ============================================
+def record_states(
+    agent: "ba.BaseAgent", net: nn.Module, nSteps: int
+) -> torch.Tensor:
+    """
+    Plays `nSteps` random moves and returns the states that were seen.
+    These are used both to calibrate static quantization and to check
+    the quantized network against the original.
+    """
+    agent.reset()
+    states = []
+    for _ in range(nSteps):
+        states.append(agent.step("explore", net).state)
+    return torch.stack(states)
+
+
+# ============================================
+#              compare_networks
+# ============================================
+def compare_networks(
+    reference: nn.Module, candidate: nn.Module, states: torch.Tensor
+) -> Dict:
+    """
+    Runs each state through both networks one at a time (as is done
+    when choosing actions) and reports the average latency of each
+    along with the fraction of states for which they pick the same
+    action.
+    """
+    results = {}
+    actions = {}
+    for name, net in (("reference", reference), ("candidate", candidate)):
+        chosen = []
+        with torch.no_grad():
+            # Warm up
+            net(states[:1])
+            start = time.perf_counter()
+            for state in states:
+                chosen.append(torch.argmax(net(state.unsqueeze(0))).item())
+            elapsed = time.perf_counter() - start
+        results[f"{name}LatencyMs"] = 1000.0 * elapsed / len(states)
+        actions[name] = np.array(chosen)
+    results["speedup"] = (
+        results["referenceLatencyMs"] / results["candidateLatencyMs"]
+    )
+    results["agreement"] = float(
+        np.mean(actions["reference"] == actions["candidate"])
+    )
+    return results
+
+
+# ============================================
+#                _get_engine
+# ============================================
+def _get_engine() -> str:
+    """
+    Picks the best available int8 backend. fbgemm is the x86 one and
+    qnnpack is the arm one.
+    """
+    engines = torch.backends.quantized.supported_engines
+    for engine in ("fbgemm", "qnnpack"):
+        if engine in engines:
+            torch.backends.quantized.engine = engine
+            return engine
+    raise RuntimeError("No quantized backend is available.")
@@ -0,0 +1,38 @@
+import copy
+
+import torch
+
+
+# ============================================
+#               script_network
+# ============================================
+def script_network(net: torch.nn.Module) -> torch.jit.ScriptModule:
+    """
+    Compiles a copy of the given network with torchscript.
+
+    The compiled network can be saved and then loaded with
+    `torch.jit.load` without needing the python class that defines
+    it. The original network is left untouched.
+    """
+    net = copy.deepcopy(net)
+    net.eval()
+    return torch.jit.script(net)
+
+
+# ============================================
+#           optimize_for_inference
+# ============================================
+def optimize_for_inference(
+    net: torch.jit.ScriptModule,
+) -> torch.jit.ScriptModule:
+    """
+    Freezes a compiled network so its weights become constants, which
+    lets torchscript fold and fuse operations (e.g., conv + relu).
+
+    A frozen network can no longer be trained or have its state dict
+    loaded, so this is only for networks that are done training.
+    """
+    net.eval()
+    if hasattr(torch.jit, "freeze"):
+        net = torch.jit.freeze(net)
+    return net
@@ -1,4 +1,11 @@
-from . import (
-    base_pipeline,
-    qpipeline,
+from raijin.utilities.lazy import lazy_submodules
+
+
+# The submodules are imported the first time they're used
+__getattr__, __dir__ = lazy_submodules(
+    __name__,
+    (
+        "base_pipeline",
+        "qpipeline",
+    ),
 )
@@ -101,8 +101,36 @@ class QPipeline(BasePipeline):
         state = self.stack(cropFrame, newEpisode)
         return state
 
+    # -----
+    # process_frames
+    # -----
+    def process_frames(self, frames: np.ndarray) -> torch.Tensor:
+        """
+        Runs a batch of raw frames with shape (N, H, W, C) through
+        everything in `process` except the stacking. Returns a tensor
+        of shape (N, cropHeight, cropWidth).
+
+        Used to rebuild states from recorded trajectories, so it has
+        to match `process` frame for frame.
+        """
+        # Each frame is reshaped the same way _reshape_frame does it
+        frames = frames.reshape(
+            (frames.shape[0], frames.shape[-1]) + frames.shape[1:-1]
+        )
+        frameTensor = torch.from_numpy(frames)
+        normFrames = self.normalize_frame(frameTensor)
+        grayFrames = self.grayscale(normFrames)
+        cropFrames = self.crop(grayFrames)
+        return torch.squeeze(cropFrames, 1)
+
     # -----
     # state_dict
     # -----
     def state_dict(self) -> dict:
         return {"frameStack": self.frameStack}
+
+    # -----
+    # load_state_dict
+    # -----
+    def load_state_dict(self, stateDict: dict) -> None:
+        self.frameStack = deque(stateDict["frameStack"], maxlen=self.traceLen)
@@ -3,6 +3,7 @@ from typing import List
 from omegaconf.dictconfig import DictConfig
 
 from raijin.agents import base_agent as ba
+from raijin.utilities.timing import timers
 
 from .base_proctor import BaseProctor
 
@@ -19,13 +20,24 @@ class QProctor(BaseProctor):
     def __init__(self, agent: "ba.BaseAgent", nets: List, modelStateDict: dict, params: DictConfig) -> None:
         self.agent = agent
         self.net = nets[0]
-        self.net.load_state_dict(modelStateDict)
+        # Torchscript networks are loaded with their weights already
+        if modelStateDict is not None:
+            self.net.load_state_dict(modelStateDict)
         self.nEpisodes = params.nEpisodes
         self.episodeLength = params.episodeLength
         self.episodeOver = False
         self.episodeReward = 0.0
         self.episode = 0
         self.metrics = {}
+        # Set by the test command when the parameter file has a
+        # resources section
+        self.scheduler = None
+        # The scheduler role the proctor takes on. Evaluating alongside
+        # training keeps to the evaluation cores, while testing on its
+        # own gets the testing role (every core)
+        self.role = "evaluation"
+        # Set by the test command when recording trajectories
+        self.recorder = None
         # Put the network into evaluation mode
         self.net.eval()
 
@@ -33,15 +45,21 @@ class QProctor(BaseProctor):
     # pre_test
     # -----
     def pre_test(self) -> None:
+        if self.scheduler is not None:
+            self.scheduler.apply(self.role)
         self._initialize_metrics()
 
     # -----
     # testing_step
     # -----
     def testing_step(self) -> None:
+        frame, episodeId = self.agent.frame, self.agent.episodeId
         experience = self.agent.step("exploit", self.net)
         self.episodeReward += experience.reward
         self.episodeOver = experience.done
+        if self.recorder is not None:
+            with timers.time("recorder.record"):
+                self.recorder.record(frame, experience, episodeId)
 
     # -----
     # test
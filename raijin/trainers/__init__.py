@@ -1,4 +1,13 @@
-from . import (
-    base_trainer,
-    qtrainer,
+from raijin.utilities.lazy import lazy_submodules
+
+
+# The submodules are imported the first time they're used
+__getattr__, __dir__ = lazy_submodules(
+    __name__,
+    (
+        "async_qtrainer",
+        "base_trainer",
+        "offline_qtrainer",
+        "qtrainer",
+    ),
 )
@@ -0,0 +1,324 @@
+import copy
+import os
+import threading
+import time
+from typing import List
+
+import numpy as np
+from omegaconf.dictconfig import DictConfig
+import torch
+
+from raijin.agents import base_agent as ba
+from raijin.memory import base_memory as bm
+from raijin.utilities.timing import timers
+
+from .qtrainer import QTrainer
+
+
+# ============================================
+#                AsyncQTrainer
+# ============================================
+class AsyncQTrainer(QTrainer):
+    """
+    A version of the QTrainer where acting and learning happen at the
+    same time.
+
+    * A learner thread continuously samples from the memory buffer and
+        updates the network
+    * The actor (the main thread) steps through the game using a
+        snapshot of the network's weights
+
+    Every `syncFreq` updates the learner publishes a copy of the
+    weights tagged with the number of updates that produced it (the
+    version). The actor picks up the newest snapshot before each step.
+    The staleness of the actor is the number of updates the learner is
+    ahead of the actor's snapshot. The learner waits whenever the
+    staleness would exceed `maxStaleness`, so the actor is never acting
+    with weights that are arbitrarily out of date.
+
+    The memory buffer is guarded by a lock since the actor is adding
+    to it while the learner is sampling from it.
+    """
+
+    __name__ = "AsyncQTrainer"
+
+    _unsavedAttrs = QTrainer._unsavedAttrs + ("snapshotNet",)
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        agent: "ba.BaseAgent",
+        lossFunctions: List,
+        memory: "bm.BaseMemory",
+        nets: List,
+        optimizers: List,
+        params: DictConfig,
+    ) -> None:
+        super().__init__(agent, lossFunctions, memory, nets, optimizers, params)
+        self.syncFreq = params.get("syncFreq", 10)
+        self.maxStaleness = params.get("maxStaleness", 100)
+        nCores = len(os.sched_getaffinity(0))
+        self.learnerThreads = params.get("learnerThreads", max(1, nCores - 1))
+        self.actorThreads = params.get("actorThreads", 1)
+        # Snapshots are loaded into a copy of the network that's never
+        # trained directly. The actor uses this copy (or a quantized
+        # version of it)
+        self.snapshotNet = copy.deepcopy(self.net)
+        self.snapshotNet.eval()
+        self.snapshotNet.requires_grad_(False)
+        self.actorNet = self.snapshotNet
+        self.actorVersion = 0
+        # Learner state
+        self.version = 0
+        self.snapshot = None
+        self.snapshotVersion = 0
+        self.memoryLock = threading.Lock()
+        # Reentrant so that snapshot_state_dict can hold it across
+        # the call to state_dict
+        self.learnLock = threading.RLock()
+        self.snapshotLock = threading.Condition()
+        self.stopEvent = threading.Event()
+        self.learnerThread = None
+        self.learnerError = None
+        self._episodeStaleness = []
+
+    # -----
+    # pre_train
+    # -----
+    def pre_train(self) -> None:
+        super().pre_train()
+        if self.scheduler is not None:
+            self.scheduler.apply("actors")
+        else:
+            torch.set_num_threads(self.actorThreads)
+        self._start_learner()
+
+    # -----
+    # training_step
+    # -----
+    def training_step(self, actionChoiceType: str) -> None:
+        self._sync_actor()
+        frame, episodeId = self.agent.frame, self.agent.episodeId
+        experience = self.agent.step(actionChoiceType, self.actorNet)
+        self.episodeReward += experience.reward
+        with timers.time("memory.add"), self.memoryLock:
+            self.memory.add(experience)
+        self.nEnvSteps += 1
+        self.episodeOver = experience.done
+        if self.recorder is not None:
+            with timers.time("recorder.record"):
+                self.recorder.record(frame, experience, episodeId)
+
+    # -----
+    # train
+    # -----
+    def train(self) -> None:
+        """
+        Steps through one episode. Learning is handled by the learner
+        thread, so the actor never waits on an optimizer step.
+        """
+        self.agent.reset()
+        for episodeStep in range(self.episodeLength):
+            self._check_learner()
+            self.training_step("train")
+            if self.metricsLog is not None:
+                self.metricsLog.env_step()
+            self._episodeStaleness.append(self.version - self.actorVersion)
+            if self.profiler is not None:
+                self.profiler.step()
+            if self.episodeOver:
+                break
+
+    # -----
+    # train_step_end
+    # -----
+    def train_step_end(self) -> None:
+        super().train_step_end()
+        self.metrics["snapshotVersions"].append(self.actorVersion)
+        # An episode can end before the actor takes a step (e.g., when
+        # it's cut short), in which case there's no staleness to report
+        staleness = self._episodeStaleness or [0]
+        self.metrics["meanStaleness"].append(float(np.mean(staleness)))
+        self.metrics["maxStaleness"].append(int(np.max(staleness)))
+        self._episodeStaleness = []
+
+    # -----
+    # post_train
+    # -----
+    def post_train(self) -> None:
+        self._stop_learner()
+        self._check_learner()
+        super().post_train()
+
+    # -----
+    # state_dict
+    # -----
+    def state_dict(self) -> dict:
+        # Holding the learn lock keeps the learner from changing the
+        # weights and optimizer state while they're being copied
+        with self.learnLock:
+            stateDicts = super().state_dict()
+        stateDicts["QTrainer"]["version"] = self.version
+        return stateDicts
+
+    # -----
+    # load_state_dict
+    # -----
+    def load_state_dict(self, stateDicts: dict) -> None:
+        super().load_state_dict(stateDicts)
+        self.version = stateDicts["QTrainer"].get("version", 0)
+        # The actor starts from the restored weights
+        self.snapshotNet.load_state_dict(self.net.state_dict())
+        self.snapshotVersion = self.version
+        self.actorVersion = self.version
+
+    # -----
+    # snapshot_weights
+    # -----
+    def snapshot_weights(self) -> dict:
+        with self.learnLock:
+            return super().snapshot_weights()
+
+    # -----
+    # snapshot_state_dict
+    # -----
+    def snapshot_state_dict(self) -> dict:
+        with self.learnLock:
+            return super().snapshot_state_dict()
+
+    # -----
+    # _start_learner
+    # -----
+    def _start_learner(self) -> None:
+        self.stopEvent.clear()
+        self.learnerThread = threading.Thread(
+            target=self._learner_loop, name="raijin-learner", daemon=True
+        )
+        self.learnerThread.start()
+
+    # -----
+    # _stop_learner
+    # -----
+    def _stop_learner(self) -> None:
+        self.stopEvent.set()
+        with self.snapshotLock:
+            self.snapshotLock.notify_all()
+        if self.learnerThread is not None:
+            self.learnerThread.join()
+            self.learnerThread = None
+
+    # -----
+    # _check_learner
+    # -----
+    def _check_learner(self) -> None:
+        """
+        Re-raises any exception raised in the learner thread so that
+        it isn't silently swallowed.
+        """
+        if self.learnerError is not None:
+            error = self.learnerError
+            self.learnerError = None
+            raise RuntimeError("The learner thread failed.") from error
+
+    # -----
+    # _learner_loop
+    # -----
+    def _learner_loop(self) -> None:
+        if self.scheduler is not None:
+            self.scheduler.apply("learner")
+        else:
+            torch.set_num_threads(self.learnerThreads)
+        try:
+            while not self.stopEvent.is_set():
+                if not self._wait_for_actor():
+                    break
+                # The sample time includes waiting on the actor for
+                # the memory lock
+                start = time.perf_counter()
+                with timers.time("memory.sample"), self.memoryLock:
+                    batch = self.memory.sample(self.batchSize)
+                sampleTime = time.perf_counter() - start
+                with self.learnLock, timers.time("learn"):
+                    loss = self.learn(batch)
+                    self.version += 1
+                self.nUpdates += 1
+                if self.metricsLog is not None:
+                    self.metricsLog.update(
+                        self.episode, loss, sampleTime, self.agent.epsilon
+                    )
+                if self.version - self.snapshotVersion >= self.syncFreq:
+                    self._publish_snapshot()
+        except Exception as e:
+            self.learnerError = e
+
+    # -----
+    # _wait_for_actor
+    # -----
+    def _wait_for_actor(self) -> bool:
+        """
+        Blocks the learner while the actor's weights are too stale.
+
+        Returns False if the learner was told to stop while waiting.
+        """
+        if self.version - self.actorVersion < self.maxStaleness:
+            return True
+        # The actor can only catch up to the newest snapshot, so make
+        # sure one exists before waiting
+        if self.snapshotVersion < self.version:
+            self._publish_snapshot()
+        with self.snapshotLock:
+            while self.version - self.actorVersion >= self.maxStaleness:
+                if self.stopEvent.is_set():
+                    return False
+                self.snapshotLock.wait(timeout=0.1)
+        return True
+
+    # -----
+    # _publish_snapshot
+    # -----
+    def _publish_snapshot(self) -> None:
+        with self.learnLock:
+            snapshot = {
+                k: v.detach().clone() for k, v in self.net.state_dict().items()
+            }
+            version = self.version
+        with self.snapshotLock:
+            self.snapshot = snapshot
+            self.snapshotVersion = version
+
+    # -----
+    # _sync_actor
+    # -----
+    def _sync_actor(self) -> None:
+        """
+        Loads the newest snapshot into the actor's network, if there
+        is one.
+        """
+        if self.snapshotVersion <= self.actorVersion:
+            return
+        with self.snapshotLock:
+            self.snapshotNet.load_state_dict(self.snapshot)
+            version = self.snapshotVersion
+        if self.actorQuantization is not None:
+            self.actorNet = self._quantize_actor(self.snapshotNet)
+        with self.snapshotLock:
+            self.actorVersion = version
+            self.snapshotLock.notify_all()
+
+    # -----
+    # _get_calibration_states
+    # -----
+    def _get_calibration_states(self) -> torch.Tensor:
+        with self.memoryLock:
+            return super()._get_calibration_states()
+
+    # -----
+    # _initialize_metrics
+    # -----
+    def _initialize_metrics(self) -> None:
+        super()._initialize_metrics()
+        self.metrics["snapshotVersions"] = []
+        self.metrics["meanStaleness"] = []
+        self.metrics["maxStaleness"] = []
@@ -0,0 +1,100 @@
+import time
+from typing import List
+
+import numpy as np
+from omegaconf.dictconfig import DictConfig
+
+from raijin.io import trajectory_dataset as td
+from raijin.utilities.timing import timers
+
+from .qtrainer import QTrainer
+
+
+# ============================================
+#               OfflineQTrainer
+# ============================================
+class OfflineQTrainer(QTrainer):
+    """
+    Trains the network with the same updates as the QTrainer, but on
+    transitions recorded earlier (see `TrajectoryRecorder`) rather than
+    ones it generates itself. There's no agent, environment, or memory
+    buffer: minibatches are streamed from disk by a `TrajectoryLoader`.
+
+    An "episode" is `episodeLength` updates, so checkpointing, metrics,
+    and evaluation work the same way as when training online. The mean
+    loss of each episode is kept in the metrics.
+    """
+
+    __name__ = "OfflineQTrainer"
+
+    # Built by the managers without an environment
+    offline = True
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        loader: "td.TrajectoryLoader",
+        lossFunctions: List,
+        nets: List,
+        optimizers: List,
+        params: DictConfig,
+    ) -> None:
+        super().__init__(None, lossFunctions, None, nets, optimizers, params)
+        self.loader = loader
+        self.episodeLoss = 0.0
+
+    # -----
+    # pre_train
+    # -----
+    def pre_train(self) -> None:
+        if self.scheduler is not None:
+            self.scheduler.apply("learner")
+        self.loader.start()
+        if not self.resumed:
+            self._initialize_metrics()
+
+    # -----
+    # training_step
+    # -----
+    def training_step(self) -> float:
+        start = time.perf_counter()
+        with timers.time("loader.sample"):
+            batch = self.loader.sample(self.batchSize)
+        sampleTime = time.perf_counter() - start
+        with timers.time("learn"):
+            loss = self.learn(batch)
+        self.nUpdates += 1
+        if self.metricsLog is not None:
+            self.metricsLog.update(self.episode, loss, sampleTime, np.nan)
+        return loss
+
+    # -----
+    # train
+    # -----
+    def train(self) -> None:
+        lossSum = 0.0
+        for episodeStep in range(self.episodeLength):
+            lossSum += self.training_step()
+            if self.profiler is not None:
+                self.profiler.step()
+        self.episodeLoss = float(lossSum) / self.episodeLength
+
+    # -----
+    # train_step_end
+    # -----
+    def train_step_end(self) -> None:
+        self.metrics["meanLosses"].append(self.episodeLoss)
+
+    # -----
+    # post_train
+    # -----
+    def post_train(self) -> None:
+        self.loader.close()
+
+    # -----
+    # _initialize_metrics
+    # -----
+    def _initialize_metrics(self) -> None:
+        self.metrics["meanLosses"] = []
@@ -1,3 +1,5 @@
+import copy
+import time
 from typing import List
 from typing import Tuple
 
@@ -6,16 +8,61 @@ import torch
 
 from raijin.agents import base_agent as ba
 from raijin.memory import base_memory as bm
+from raijin.networks.quantization import is_scripted
+from raijin.networks.quantization import quantize_network
+from raijin.utilities import distributed
+from raijin.utilities.precision import get_autocast
+from raijin.utilities.timing import timers
 
 from .base_trainer import BaseTrainer
 
 
+# ============================================
+#               chosen_q_values
+# ============================================
+def chosen_q_values(qVals: torch.Tensor, actions: torch.Tensor) -> torch.Tensor:
+    """
+    Picks out the Q-value of the chosen action for each sample.
+    """
+    nActions = qVals.shape[1]
+    # one_hot returns a tensor with one more dimension than the input,
+    # so we squeeze that out. The input also has to have a long dtype.
+    oneHot = qVals * torch.nn.functional.one_hot(
+        actions.to(torch.int64), nActions
+    ).squeeze(1)
+    return torch.sum(oneHot, 1, keepdim=True)
+
+
+# ============================================
+#               bellman_targets
+# ============================================
+def bellman_targets(
+    qNext: torch.Tensor,
+    dones: torch.Tensor,
+    rewards: torch.Tensor,
+    discountRate: float,
+) -> torch.Tensor:
+    """
+    Applies the Bellman equation to the Q-values of the next states,
+    masking out the bootstrapped term for terminal states.
+    """
+    # the max operation doesn't return a tensor; it returns an object
+    # that contains both the values and indices
+    qNextMax = torch.max(qNext, 1, keepdim=True).values
+    maskedVals = (1.0 - dones) * qNextMax
+    return rewards + discountRate * maskedVals
+
+
 # ============================================
 #                   QTrainer
 # ============================================
 class QTrainer(BaseTrainer):
     __name__ = "QTrainer"
 
+    # Attributes that hold alternate views of the network and so
+    # shouldn't be saved in the state dict
+    _unsavedAttrs = ("learnNet", "actorNet")
+
     # -----
     # constructor
     # -----
@@ -32,16 +79,61 @@ class QTrainer(BaseTrainer):
         self.loss_function = lossFunctions[0]
         self.memory = memory
         self.net = nets[0]
+        # The network that gradients flow through in learn. For
+        # data-parallel training this is a wrapper around net
+        self.learnNet = self.net
+        # The network used to choose actions. This is net itself
+        # unless actorQuantization is set, in which case it's an int8
+        # copy of net that's refreshed every actorSyncFreq steps
+        self.actorNet = self.net
+        self.actorQuantization = params.get("actorQuantization", None)
+        if self.actorQuantization is not None and is_scripted(self.net):
+            raise ValueError(
+                "actorQuantization can't be used with a network compiled "
+                "with torchscript (`jit: true`)."
+            )
+        self.actorSyncFreq = params.get("actorSyncFreq", 100)
+        self.actorStep = 0
         self.optimizer = optimizers[0]
         self.nEpisodes = params.nEpisodes
         self.episodeLength = params.episodeLength
-        self.prePopulateSteps = params.prePopulateSteps
+        self.prePopulateSteps = params.get("prePopulateSteps", 0)
         self.batchSize = params.batchSize
         self.discountRate = params.discountRate
+        # Number of env steps per learning step
+        self.learnFreq = params.get("learnFreq", 1)
+        # bfloat16 autocasting for the forward passes in learn. Falls
+        # back to float32 if torch or the cpu doesn't support it
+        self.autocast = get_autocast(params.get("mixedPrecision", False))
+        # Compiling the target and belief calculations with torchscript
+        # lets the elementwise ops be fused
+        if params.get("jit", False):
+            self.chosen_q_values = torch.jit.script(chosen_q_values)
+            self.bellman_targets = torch.jit.script(bellman_targets)
+        else:
+            self.chosen_q_values = chosen_q_values
+            self.bellman_targets = bellman_targets
         self.episodeOver = False
         self.episodeReward = 0.0
         self.episode = 0
+        # Running totals, read by the metrics server's thread. They're
+        # checkpointed so that they carry on from where they were
+        self.nEnvSteps = 0
+        self.nUpdates = 0
+        # Set when resuming from a checkpoint (see load_state_dict)
+        self.startEpisode = 0
+        self.resumed = False
         self.metrics = {}
+        # Set by the train command when the parameter file has a
+        # resources section
+        self.scheduler = None
+        # Set by the train command when the io section has a
+        # metricsLog section
+        self.metricsLog = None
+        # Set by the train command when recording trajectories
+        self.recorder = None
+        # Set by the train command when profiling
+        self.profiler = None
         # Put the network into training mode
         self.net.train()
 
@@ -49,28 +141,55 @@ class QTrainer(BaseTrainer):
     # pre_train
     # -----
     def pre_train(self) -> None:
-        self._pre_populate()
-        self._initialize_metrics()
+        # Acting and learning both happen in this thread
+        if self.scheduler is not None:
+            self.scheduler.apply("learner", "actors")
+        # A resumed trainer already has a full memory and the metrics
+        # from before the checkpoint
+        if not self.resumed:
+            self._pre_populate()
+            self._initialize_metrics()
+
+    # -----
+    # post_train
+    # -----
+    def post_train(self) -> None:
+        self.memory.close()
 
     # -----
     # training_step
     # -----
     def training_step(self, actionChoiceType: str) -> None:
-        experience = self.agent.step(actionChoiceType, self.net)
+        frame, episodeId = self.agent.frame, self.agent.episodeId
+        experience = self.agent.step(actionChoiceType, self.actorNet)
         self.episodeReward += experience.reward
-        self.memory.add(experience)
+        with timers.time("memory.add"):
+            self.memory.add(experience)
+        self.nEnvSteps += 1
         self.episodeOver = experience.done
+        if self.recorder is not None:
+            with timers.time("recorder.record"):
+                self.recorder.record(frame, experience, episodeId)
 
     # -----
     # train
     # -----
     def train(self) -> None:
         self.agent.reset()
+        self.episodeOver = False
         for episodeStep in range(self.episodeLength):
-            self.training_step("train")
-            batch = self.memory.sample(self.batchSize)
-            self.learn(batch)
-            if self.episodeOver:
+            # When training in parallel, processes whose episode is
+            # over keep learning until every process is done
+            if not self.episodeOver:
+                self._sync_actor()
+                self.training_step("train")
+                if self.metricsLog is not None:
+                    self.metricsLog.env_step()
+            if (episodeStep + 1) % self.learnFreq == 0:
+                self._learn_step()
+            if self.profiler is not None:
+                self.profiler.step()
+            if distributed.all_done(self.episodeOver):
                 break
 
     # -----
@@ -79,12 +198,14 @@ class QTrainer(BaseTrainer):
     def train_step_end(self) -> None:
         self.episodeOver = False
         self.metrics["episodeRewards"].append(self.episodeReward)
+        if self.metricsLog is not None:
+            self.metricsLog.end_episode(self.episode, self.episodeReward)
         self.episodeReward = 0.0
 
     # -----
     # learn
     # -----
-    def learn(self, batch: Tuple) -> None:
+    def learn(self, batch: Tuple) -> torch.Tensor:
         """
         Implements the Deep-Q Learning algorithm from
         [Mnih et al. 2013][1].
@@ -106,15 +227,44 @@ class QTrainer(BaseTrainer):
         on the weights. We do this by using `detach` when getting the
         loss.
 
+        When using mixed precision, only the forward passes are
+        autocast. The loss is always computed in float32.
+
+        Returns the (detached) loss.
+
         [1]: https://arxiv.org/abs/1312.5602
         """
         states, actions, rewards, nextStates, dones = batch
-        beliefs = self._get_beliefs(states, actions)
-        targets = self._get_targets(nextStates, dones, rewards)
-        loss = self.loss_function(beliefs, targets.detach())
+        with self.autocast():
+            beliefs = self._get_beliefs(states, actions)
+            targets = self._get_targets(nextStates, dones, rewards)
+        loss = self.loss_function(beliefs.float(), targets.detach().float())
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
+        return loss.detach()
+
+    # -----
+    # snapshot_weights
+    # -----
+    def snapshot_weights(self) -> dict:
+        """
+        Returns a copy of the network's current weights that can be
+        handed off (e.g., to the background evaluator) without being
+        changed by further training.
+        """
+        return {k: v.detach().clone() for k, v in self.net.state_dict().items()}
+
+    # -----
+    # snapshot_state_dict
+    # -----
+    def snapshot_state_dict(self) -> dict:
+        """
+        Returns a copy of the state dict that won't be changed by
+        further training (e.g., for writing a checkpoint in the
+        background).
+        """
+        return copy.deepcopy(self.state_dict())
 
     # -----
     # _pre_populate
@@ -129,6 +279,52 @@ class QTrainer(BaseTrainer):
         for _ in range(self.prePopulateSteps):
             self.training_step("explore")
 
+    # -----
+    # _learn_step
+    # -----
+    def _learn_step(self) -> None:
+        start = time.perf_counter()
+        with timers.time("memory.sample"):
+            batch = self.memory.sample(self.batchSize)
+        sampleTime = time.perf_counter() - start
+        with timers.time("learn"):
+            loss = self.learn(batch)
+        self.nUpdates += 1
+        if self.metricsLog is not None:
+            self.metricsLog.update(
+                self.episode, loss, sampleTime, self.agent.epsilon
+            )
+
+    # -----
+    # _sync_actor
+    # -----
+    def _sync_actor(self) -> None:
+        """
+        Refreshes the quantized copy of the network used for choosing
+        actions. Does nothing if the actor isn't quantized, since then
+        it's using the network directly.
+        """
+        if self.actorQuantization is None:
+            return
+        if self.actorStep % self.actorSyncFreq == 0:
+            self.actorNet = self._quantize_actor(self.net)
+        self.actorStep += 1
+
+    # -----
+    # _quantize_actor
+    # -----
+    def _quantize_actor(self, net: torch.nn.Module) -> torch.nn.Module:
+        calibrationStates = None
+        if self.actorQuantization == "static":
+            calibrationStates = self._get_calibration_states()
+        return quantize_network(net, self.actorQuantization, calibrationStates)
+
+    # -----
+    # _get_calibration_states
+    # -----
+    def _get_calibration_states(self) -> torch.Tensor:
+        return self.memory.sample(self.batchSize)[0]
+
     # -----
     # _get_beliefs
     # -----
@@ -143,18 +339,8 @@ class QTrainer(BaseTrainer):
         We only need to change the Q-values for the chosen actions,
         so we use a one-hot vector to vectorize the calculation.
         """
-        qVals = self.net(states)
-        nActions = qVals.shape[1]
-        # one_hot returns a tensor with one more dimension than the input,
-        # so we squeeze that out. The input also has to have a long dtype.
-        oneHot = (
-            qVals
-            * torch.nn.functional.one_hot(
-                actions.to(torch.int64), nActions
-            ).squeeze()
-        )
-        qChosen = torch.sum(oneHot, 1, keepdims=True)
-        return qChosen
+        qVals = self.learnNet(states)
+        return self.chosen_q_values(qVals, actions)
 
     # -----
     # _get_targets
@@ -175,12 +361,7 @@ class QTrainer(BaseTrainer):
         mask allows us to do both parts of the calculation at once.
         """
         qNext = self.net(nextStates)
-        # the max operation doesn't return a tensor; it returns an object
-        # that contains both the values and indices
-        qNextMax = torch.max(qNext, 1, keepdims=True).values
-        maskedVals = (1.0 - dones) * qNextMax
-        targets = rewards + self.discountRate * maskedVals
-        return targets
+        return self.bellman_targets(qNext, dones, rewards, self.discountRate)
 
     # -----
     # state_dict
@@ -188,24 +369,66 @@ class QTrainer(BaseTrainer):
     def state_dict(self) -> dict:
         stateDicts = {}
         # Get the state dicts for each component (agent, network, etc)
-        for attrVal in self.__dict__.values():
+        for attrName, attrVal in self.__dict__.items():
+            if attrName in self._unsavedAttrs:
+                continue
             if hasattr(attrVal, "state_dict"):
                 stateDict = attrVal.state_dict()
-                # The loss and optimizer don't have __name__ attrs, but
-                # the loss has a _get_name method. For the optimizer, we
-                # have to use str(). This prints the parameters, too,
-                # though, which need to be removed
-                if hasattr(attrVal, "__name__"):
-                    name = attrVal.__name__
-                elif hasattr(attrVal, "_get_name()"):
-                    name = attrVal._get_name()
-                else:
-                    name = str(attrVal).split()[0]
-                stateDicts[name] = stateDict
+                stateDicts[self._state_dict_name(attrVal)] = stateDict
         # Add trainer's stateful parameters
-        stateDicts.update({"QTrainer": {"episodeNum": self.episode}})
+        stateDicts.update(
+            {
+                "QTrainer": {
+                    "episodeNum": self.episode,
+                    "nEnvSteps": self.nEnvSteps,
+                    "nUpdates": self.nUpdates,
+                }
+            }
+        )
         return stateDicts
 
+    # -----
+    # load_state_dict
+    # -----
+    def load_state_dict(self, stateDicts: dict) -> None:
+        """
+        Restores each component (agent, network, optimizer, etc.) from
+        a checkpoint's state dicts. Training then continues from the
+        episode after the one the checkpoint was taken at.
+
+        The memory buffer isn't part of the state dicts and has to be
+        loaded separately.
+        """
+        for attrName, attrVal in self.__dict__.items():
+            if attrName in self._unsavedAttrs:
+                continue
+            if hasattr(attrVal, "load_state_dict"):
+                name = self._state_dict_name(attrVal)
+                if name in stateDicts:
+                    attrVal.load_state_dict(stateDicts[name])
+        trainerState = stateDicts["QTrainer"]
+        self.startEpisode = trainerState["episodeNum"] + 1
+        # Older checkpoints don't have the totals
+        self.nEnvSteps = trainerState.get("nEnvSteps", 0)
+        self.nUpdates = trainerState.get("nUpdates", 0)
+        self.resumed = True
+
+    # -----
+    # _state_dict_name
+    # -----
+    def _state_dict_name(self, attrVal) -> str:
+        # The loss and optimizer don't have __name__ attrs, but
+        # the loss has a _get_name method. For the optimizer, we
+        # have to use str(). This prints the parameters, too,
+        # though, which need to be removed
+        if hasattr(attrVal, "__name__"):
+            name = attrVal.__name__
+        elif hasattr(attrVal, "_get_name()"):
+            name = attrVal._get_name()
+        else:
+            name = str(attrVal).split()[0]
+        return name
+
     # -----
     # _initialize_metrics
     # -----
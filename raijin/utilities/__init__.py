@@ -1,6 +1,25 @@
-from . import (
-    config,
-    io_utilities,
-    managers,
-    register,
+from raijin.utilities.lazy import lazy_submodules
+
+
+# The submodules are imported the first time they're used
+__getattr__, __dir__ = lazy_submodules(
+    __name__,
+    (
+        "autotune",
+        "benchmark",
+        "config",
+        "distributed",
+        "evaluation",
+        "io_utilities",
+        "lazy",
+        "managers",
+        "metrics_server",
+        "precision",
+        "profiling",
+        "register",
+        "resources",
+        "sweep",
+        "synthetic_env",
+        "timing",
+    ),
 )
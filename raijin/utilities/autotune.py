@@ -0,0 +1,275 @@
+import copy
+import os
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+
+from omegaconf import OmegaConf as config
+from omegaconf.dictconfig import DictConfig
+import torch
+
+from .managers import get_scheduler
+from .managers import get_trainer
+from .register import registry
+from .synthetic_env import SyntheticAtariEnv
+from .timing import timers
+
+
+# The order the knobs are tuned in. The trainer goes first since it
+# changes how the others behave
+knobNames = ("trainer", "threads", "batchSize", "learnFreq")
+
+
+# ============================================
+#                 Autotuner
+# ============================================
+class Autotuner:
+    """
+    Searches for the throughput settings that suit the current machine:
+
+        * trainer: the QTrainer (acting and learning take turns) or the
+            AsyncQTrainer (the env is stepped on its own thread while
+            the learner runs)
+        * threads: the learner's cores (`resources.learner`)
+        * batchSize
+        * learnFreq: env steps per learning step (QTrainer only)
+
+    Each trial trains for `trialSeconds` with one set of values and
+    measures env steps/s and updates/s with the phase timers (see
+    `raijin.utilities.timing`). The score is the rate named by
+    `objective`: envSteps, updates, or samples (updates/s times the
+    batch size, i.e., transitions learned from per second).
+
+    The knobs are tuned one at a time (coordinate search): starting
+    from the values in the parameter file, each knob is set to the
+    value that scored best with the others held at their best so far.
+    That's a few trials per knob rather than one per combination. A
+    trial that's scoring below `cutoff` times the best score after
+    `probeSeconds` is stopped early.
+
+    Trials cap the memory's capacity at `maxCapacity`, only fill it
+    with a batch's worth of experiences first, and use episodes of at
+    most `episodeLength` steps, so that they start quickly and check
+    the clock often.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        params: DictConfig,
+        candidates: Dict[str, List],
+        trialSeconds: float = 10.0,
+        probeSeconds: float = 3.0,
+        cutoff: float = 0.5,
+        objective: str = "samples",
+        maxCapacity: int = 10000,
+        episodeLength: int = 50,
+        progress: Callable = None,
+    ) -> None:
+        if getattr(registry[params.trainer.name], "offline", False):
+            raise ValueError("Offline trainers can't be autotuned.")
+        if objective not in ("envSteps", "updates", "samples"):
+            raise ValueError(f"Unknown objective `{objective}`.")
+        self.params = params
+        self.candidates = candidates
+        self.trialSeconds = trialSeconds
+        self.probeSeconds = probeSeconds
+        self.cutoff = cutoff
+        self.objective = objective
+        self.maxCapacity = maxCapacity
+        self.episodeLength = episodeLength
+        self.progress = progress
+        self.trials = []
+        self.best = None
+        # Each trial's core scheduler pins this thread, so these are
+        # put back after every trial. Otherwise the later trials would
+        # only see the cores the earlier ones were pinned to
+        self.affinity = None
+        if hasattr(os, "sched_getaffinity"):
+            self.affinity = os.sched_getaffinity(0)
+        self.nThreads = torch.get_num_threads()
+
+    # -----
+    # run
+    # -----
+    def run(self) -> Dict:
+        """
+        Runs the search and returns the best trial.
+        """
+        self.best = self._trial(self._start_settings())
+        for knob in knobNames:
+            for value in self.candidates[knob]:
+                settings = dict(self.best["settings"], **{knob: value})
+                if settings == self.best["settings"]:
+                    continue
+                # The AsyncQTrainer learns as fast as it can
+                if knob == "learnFreq" and settings["trainer"] != "QTrainer":
+                    continue
+                trial = self._trial(settings)
+                if trial["score"] > self.best["score"]:
+                    self.best = trial
+        return self.best
+
+    # -----
+    # overlay
+    # -----
+    def overlay(self) -> DictConfig:
+        """
+        Returns the best settings as a parameter file overlay, to be
+        merged over the parameter file that was tuned.
+
+        Settings that wouldn't be used are left out: learnFreq when the
+        best trainer is the AsyncQTrainer, and the learner's cores when
+        the tuned file has no resources section (adding one would turn
+        on the core scheduler's pinning).
+        """
+        settings = self.best["settings"]
+        overlay = {
+            "trainer": {
+                "name": settings["trainer"],
+                "batchSize": settings["batchSize"],
+            }
+        }
+        if settings["trainer"] == "QTrainer":
+            overlay["trainer"]["learnFreq"] = settings["learnFreq"]
+        if "resources" in self.params:
+            overlay["resources"] = {"learner": settings["threads"]}
+        return config.create(overlay)
+
+    # -----
+    # _start_settings
+    # -----
+    def _start_settings(self) -> Dict:
+        trainerParams = self.params.trainer
+        threads = self.params.get("resources", {}).get("learner")
+        if threads is None:
+            threads = self.candidates["threads"][-1]
+        return {
+            "trainer": trainerParams.name,
+            "threads": threads,
+            "batchSize": trainerParams.batchSize,
+            "learnFreq": trainerParams.get("learnFreq", 1),
+        }
+
+    # -----
+    # _trial_params
+    # -----
+    def _trial_params(self, settings: Dict) -> DictConfig:
+        params = copy.deepcopy(self.params)
+        params.trainer.name = settings["trainer"]
+        params.trainer.batchSize = settings["batchSize"]
+        params.trainer.learnFreq = settings["learnFreq"]
+        params.trainer.prePopulateSteps = settings["batchSize"]
+        params.memory.capacity = min(params.memory.capacity, self.maxCapacity)
+        if "resources" not in params:
+            params.resources = {}
+        params.resources.learner = settings["threads"]
+        return params
+
+    # -----
+    # _trial
+    # -----
+    def _trial(self, settings: Dict) -> Dict:
+        """
+        Trains with the given settings until the time's up (or the
+        trial is cut off) and returns the measured rates.
+        """
+        params = self._trial_params(settings)
+        trial = {"settings": settings, "score": 0.0, "stoppedEarly": False}
+        trainer = None
+        try:
+            # Building the trainer changes the optimizer and loss
+            # params
+            trainer = get_trainer(copy.deepcopy(params))
+            trainer.scheduler = get_scheduler(params)
+            trainer.episodeLength = min(
+                trainer.episodeLength, self.episodeLength
+            )
+            trainer.pre_train()
+            timers.enable()
+            probed = False
+            while True:
+                trainer.train_step_start()
+                trainer.train()
+                trainer.train_step_end()
+                trainer.episode += 1
+                elapsed = time.perf_counter() - timers.startTime
+                if not probed and elapsed >= self.probeSeconds:
+                    probed = True
+                    score = self._score(timers.report(), settings)
+                    if (
+                        self.best is not None
+                        and score < self.cutoff * self.best["score"]
+                    ):
+                        trial["stoppedEarly"] = True
+                        break
+                if elapsed >= self.trialSeconds:
+                    break
+            report = timers.report()
+            trial["envStepsPerSec"] = report["envStepsPerSec"]
+            trial["updatesPerSec"] = report["updatesPerSec"]
+            trial["seconds"] = report["elapsedSec"]
+            trial["score"] = self._score(report, settings)
+        except Exception as e:
+            trial["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            timers.disable()
+            if trainer is not None:
+                trainer.post_train()
+            self._restore_resources()
+        self.trials.append(trial)
+        if self.progress is not None:
+            self.progress(trial)
+        return trial
+
+    # -----
+    # _restore_resources
+    # -----
+    def _restore_resources(self) -> None:
+        if self.affinity is not None:
+            os.sched_setaffinity(0, self.affinity)
+        torch.set_num_threads(self.nThreads)
+
+    # -----
+    # _score
+    # -----
+    def _score(self, report: Dict, settings: Dict) -> float:
+        if self.objective == "envSteps":
+            return report["envStepsPerSec"]
+        if self.objective == "updates":
+            return report["updatesPerSec"]
+        return report["updatesPerSec"] * settings["batchSize"]
+
+
+# ============================================
+#             default_candidates
+# ============================================
+def default_candidates() -> Dict[str, List]:
+    """
+    Powers of two up to the number of cores for the threads, and a
+    spread of common values for the rest.
+    """
+    nCores = len(os.sched_getaffinity(0))
+    threads = [1]
+    while threads[-1] * 2 <= nCores:
+        threads.append(threads[-1] * 2)
+    if threads[-1] != nCores:
+        threads.append(nCores)
+    return {
+        "trainer": ["QTrainer", "AsyncQTrainer"],
+        "threads": threads,
+        "batchSize": [16, 32, 64, 128],
+        "learnFreq": [1, 2, 4],
+    }
+
+
+# ============================================
+#               use_synthetic_env
+# ============================================
+def use_synthetic_env(params: DictConfig) -> DictConfig:
+    params = copy.deepcopy(params)
+    params.env.name = SyntheticAtariEnv.envName
+    return params
@@ -0,0 +1,358 @@
+import copy
+import itertools
+import os
+import platform
+import tempfile
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+
+from omegaconf import OmegaConf as config
+from omegaconf.dictconfig import DictConfig
+import torch
+
+import raijin
+from raijin.io.write import write_checkpoint
+from raijin.memory import base_memory as bm
+from raijin.memory.experience import Experience
+from raijin.trainers import base_trainer as bt
+
+from .managers import get_loss_functions
+from .managers import get_nets
+from .managers import get_optimizers
+from .register import registry
+from .synthetic_env import SyntheticAtariEnv
+from .timing import PhaseTimer
+
+
+# The parts of a parameter file that are benchmarked. A parameter file
+# given to the bench command is merged on top of these
+defaultParams = {
+    "trainer": {
+        "name": "QTrainer",
+        "nEpisodes": 1,
+        "episodeLength": 1,
+        "batchSize": 32,
+        "discountRate": 0.99,
+    },
+    "nets": {"net1": {"name": "QNetwork"}},
+    "optimizers": {"optimizer1": {"name": "Adam", "lr": 0.00025}},
+    "losses": {"loss1": {"name": "MSELoss"}},
+    "memory": {"name": "QMemory", "capacity": 1000},
+    "pipeline": {
+        "name": "QPipeline",
+        "normValue": 255,
+        "traceLen": 4,
+        "offsetHeight": 8,
+        "offsetWidth": 4,
+        "cropHeight": 110,
+        "cropWidth": 84,
+    },
+    "agent": {
+        "name": "QAgent",
+        "epsilonStart": 1.0,
+        "epsilonStop": 0.01,
+        "epsilonDecayRate": 0.001,
+    },
+    "io": {"checkpointBase": "bench"},
+}
+
+
+# How much each benchmark does, normally and with `quick`
+sizes = {
+    "full": {
+        "calls": 1000,
+        "capacities": [1000, 10000, 100000],
+        "batchSizes": [16, 32, 64, 128],
+        "learnCalls": 50,
+        "checkpointSizes": [100, 1000],
+        "checkpointCalls": 3,
+    },
+    "quick": {
+        "calls": 200,
+        "capacities": [1000, 10000],
+        "batchSizes": [32],
+        "learnCalls": 10,
+        "checkpointSizes": [100],
+        "checkpointCalls": 1,
+    },
+}
+
+
+# ============================================
+#               get_bench_params
+# ============================================
+def get_bench_params(params: DictConfig = None) -> DictConfig:
+    benchParams = config.create(defaultParams)
+    if params is not None:
+        benchParams = config.merge(benchParams, params)
+    return benchParams
+
+
+# ============================================
+#               run_benchmarks
+# ============================================
+def run_benchmarks(
+    params: DictConfig, quick: bool = False, progress: Callable = None
+) -> Dict:
+    """
+    Runs every benchmark against the synthetic env (see
+    `SyntheticAtariEnv`), so that only raijin's own overhead is
+    measured, and returns the results along with enough about the
+    machine and versions to compare runs.
+
+    Each result has the benchmark's name, its settings, and the timing
+    summary of its calls (see `PhaseTimer.summary`). `progress`, if
+    given, is called with each result as it's finished.
+    """
+    size = sizes["quick" if quick else "full"]
+    benchmarks = [
+        lambda: bench_pipeline(params, size["calls"]),
+        lambda: bench_memory(params, size["capacities"], size["calls"]),
+        lambda: bench_learn(params, size["batchSizes"], size["learnCalls"]),
+        lambda: bench_agent(params, size["calls"]),
+        lambda: bench_checkpoint(
+            params, size["checkpointSizes"], size["checkpointCalls"]
+        ),
+    ]
+    results = []
+    for benchmark in benchmarks:
+        for result in benchmark():
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    return {
+        "raijin": raijin.__version__,
+        "torch": torch.__version__,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpuCount": os.cpu_count(),
+        "torchThreads": torch.get_num_threads(),
+        "time": time.time(),
+        "quick": quick,
+        "results": results,
+    }
+
+
+# ============================================
+#               bench_pipeline
+# ============================================
+def bench_pipeline(params: DictConfig, nCalls: int) -> List[Dict]:
+    pipeline = registry[params.pipeline.name](params.pipeline)
+    env = SyntheticAtariEnv()
+    pipeline.process(env.reset(), True)
+    frames = itertools.cycle(env.frames)
+    return [
+        measure(
+            "pipeline.process",
+            {},
+            lambda: pipeline.process(next(frames), False),
+            nCalls,
+        )
+    ]
+
+
+# ============================================
+#                bench_memory
+# ============================================
+def bench_memory(
+    params: DictConfig, capacities: List[int], nCalls: int
+) -> List[Dict]:
+    """
+    Times adding to and sampling from a full memory of each capacity.
+    The experiences share a small pool of states so that big
+    capacities fit in memory; it's the buffer's overhead that's being
+    measured, not copying states around.
+    """
+    results = []
+    batchSize = params.trainer.batchSize
+    for capacity in capacities:
+        memory = _make_memory(params, capacity)
+        experiences = _make_experiences(params)
+        for i in range(capacity):
+            memory.add(experiences[i % len(experiences)])
+        settings = {"capacity": capacity}
+
+        def add() -> None:
+            memory.add(experiences[memory.nAdded % len(experiences)])
+
+        results.append(measure("memory.add", settings, add, nCalls))
+        settings = {"capacity": capacity, "batchSize": batchSize}
+        results.append(
+            measure(
+                "memory.sample",
+                settings,
+                lambda: memory.sample(batchSize),
+                nCalls // 10,
+            )
+        )
+        memory.close()
+    return results
+
+
+# ============================================
+#                bench_learn
+# ============================================
+def bench_learn(
+    params: DictConfig, batchSizes: List[int], nCalls: int
+) -> List[Dict]:
+    trainer = _make_trainer(params)
+    memory = _make_memory(params, 1000)
+    experiences = _make_experiences(params)
+    for i in range(memory.capacity):
+        memory.add(experiences[i % len(experiences)])
+    results = []
+    for batchSize in batchSizes:
+        batch = memory.sample(batchSize)
+        results.append(
+            measure(
+                "learn",
+                {"batchSize": batchSize},
+                lambda: trainer.learn(batch),
+                nCalls,
+            )
+        )
+    memory.close()
+    return results
+
+
+# ============================================
+#                bench_agent
+# ============================================
+def bench_agent(params: DictConfig, nCalls: int) -> List[Dict]:
+    """
+    Times `QAgent.step` both exploring (no network) and exploiting (a
+    forward pass per step).
+    """
+    trainer = _make_trainer(params)
+    pipeline = registry[params.pipeline.name](params.pipeline)
+    agent = registry[params.agent.name](
+        SyntheticAtariEnv(), pipeline, params.agent
+    )
+    agent.reset()
+    results = []
+    for mode in ("explore", "exploit"):
+        results.append(
+            measure(
+                "agent.step",
+                {"mode": mode},
+                lambda: agent.step(mode, trainer.net),
+                nCalls,
+            )
+        )
+    return results
+
+
+# ============================================
+#              bench_checkpoint
+# ============================================
+def bench_checkpoint(
+    params: DictConfig, memorySizes: List[int], nCalls: int
+) -> List[Dict]:
+    """
+    Times writing a full checkpoint (params, metrics, state dicts, and
+    memory) with memories of the given sizes. Unlike the other
+    benchmarks, every experience has its own states, since that's what
+    has to be written.
+    """
+    trainer = _make_trainer(params)
+    results = []
+    for memorySize in memorySizes:
+        memory = _make_memory(params, memorySize)
+        for experience in _make_experiences(params, memorySize):
+            memory.add(experience)
+        with tempfile.TemporaryDirectory() as outputDir:
+            chkptParams = copy.deepcopy(params)
+            chkptParams.io.outputDir = outputDir
+            results.append(
+                measure(
+                    "save_checkpoint",
+                    {"memorySize": memorySize},
+                    lambda: write_checkpoint(
+                        chkptParams, {}, trainer.state_dict(), memory
+                    ),
+                    nCalls,
+                    warmup=0,
+                )
+            )
+        memory.close()
+    return results
+
+
+# ============================================
+#                  measure
+# ============================================
+def measure(
+    name: str, settings: Dict, f: Callable, nCalls: int, warmup: int = None
+) -> Dict:
+    """
+    Calls `f` `nCalls` times (after `warmup` untimed calls, a tenth of
+    `nCalls` by default) and summarizes how long the calls took.
+    """
+    if warmup is None:
+        warmup = max(1, nCalls // 10)
+    for _ in range(warmup):
+        f()
+    timer = PhaseTimer(nCalls)
+    start = time.perf_counter()
+    for _ in range(nCalls):
+        callStart = time.perf_counter()
+        f()
+        timer.add(time.perf_counter() - callStart)
+    summary = timer.summary(time.perf_counter() - start)
+    # Everything is spent in the one phase
+    del summary["share"]
+    return {"name": name, "settings": settings, **summary}
+
+
+# ============================================
+#              _make_trainer
+# ============================================
+def _make_trainer(params: DictConfig) -> "bt.BaseTrainer":
+    # Building the optimizers and losses changes their params
+    params = copy.deepcopy(params)
+    nActions = SyntheticAtariEnv().action_space.n
+    nets = get_nets(params.nets, params.pipeline.traceLen, nActions)
+    optimizers = get_optimizers(params.optimizers, nets)
+    lossFunctions = get_loss_functions(params.losses)
+    return registry[params.trainer.name](
+        None, lossFunctions, None, nets, optimizers, params.trainer
+    )
+
+
+# ============================================
+#               _make_memory
+# ============================================
+def _make_memory(params: DictConfig, capacity: int) -> "bm.BaseMemory":
+    """
+    Builds the memory from the memory params with only the capacity
+    changed, so that e.g. a TieredMemory keeps its spill directory and
+    segment sizes.
+    """
+    memoryParams = copy.deepcopy(params.memory)
+    memoryParams.capacity = capacity
+    return registry[memoryParams.name](memoryParams)
+
+
+# ============================================
+#             _make_experiences
+# ============================================
+def _make_experiences(params: DictConfig, n: int = 64) -> List[Experience]:
+    """
+    Plays `n` steps of the synthetic env at random.
+    """
+    pipeline = registry[params.pipeline.name](params.pipeline)
+    env = SyntheticAtariEnv()
+    state = pipeline.process(env.reset(), True)
+    experiences = []
+    for _ in range(n):
+        action = env.action_space.sample()
+        frame, reward, done, _ = env.step(action)
+        nextState = pipeline.process(frame, False)
+        experiences.append(Experience(state, action, reward, nextState, done))
+        state = nextState
+        if done:
+            state = pipeline.process(env.reset(), True)
+    return experiences
@@ -0,0 +1,183 @@
+import os
+from typing import Callable
+
+from omegaconf.dictconfig import DictConfig
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+
+from raijin.trainers import base_trainer as bt
+
+
+# ============================================
+#               is_distributed
+# ============================================
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+
+# ============================================
+#              is_main_process
+# ============================================
+def is_main_process() -> bool:
+    """
+    Only the main process (rank 0) should write anything to disk.
+    When not running in parallel the lone process is the main one.
+    """
+    return not is_distributed() or dist.get_rank() == 0
+
+
+# ============================================
+#                  all_done
+# ============================================
+def all_done(done: bool) -> bool:
+    """
+    Returns True only once every process is done.
+
+    Each process is playing its own game, so episodes end at different
+    times. Every process has to keep calling `learn` until they're all
+    done, otherwise the gradient all-reduce would wait forever on the
+    processes that stopped.
+    """
+    if not is_distributed():
+        return done
+    flag = torch.tensor([float(done)])
+    dist.all_reduce(flag, op=dist.ReduceOp.MIN)
+    return bool(flag.item())
+
+
+# ============================================
+#               init_process
+# ============================================
+def init_process(rank: int, worldSize: int, port: int) -> None:
+    """
+    Joins the process group. The cores are split evenly between the
+    processes so their torch thread pools don't fight each other. If
+    there's a resources section in the parameter file, the trainer's
+    core scheduler takes over from here once training starts.
+    """
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    dist.init_process_group("gloo", rank=rank, world_size=worldSize)
+    nCores = len(os.sched_getaffinity(0))
+    torch.set_num_threads(max(1, nCores // worldSize))
+
+
+# ============================================
+#               wrap_trainer
+# ============================================
+def wrap_trainer(trainer: "bt.BaseTrainer") -> None:
+    """
+    Sets the network the trainer learns with to a data-parallel
+    wrapper around its network so that the gradients get averaged
+    across processes. The wrapper broadcasts rank 0's weights on
+    creation, so every process starts from the same network.
+
+    Everything else (acting, the targets) keeps using the bare network
+    since only the gradients need to be synchronized.
+
+    Trainers that learn on a background thread (e.g., AsyncQTrainer)
+    can't be wrapped: each process's learner takes however many steps
+    it has time for, so the processes would disagree on the number of
+    all-reduces and hang waiting on each other.
+    """
+    if not hasattr(trainer, "learnNet"):
+        raise ValueError(
+            f"{trainer.__name__} doesn't support data-parallel training."
+        )
+    if hasattr(trainer, "learnerThread"):
+        raise ValueError(
+            f"{trainer.__name__} learns on a background thread and doesn't "
+            "support data-parallel training. Use QTrainer instead."
+        )
+    trainer.learnNet = DistributedDataParallel(trainer.net)
+
+
+# ============================================
+#                   launch
+# ============================================
+def launch(
+    params: DictConfig,
+    nProcs: int,
+    port: int,
+    on_episode: Callable[[int, float], None],
+    resume: str = None,
+) -> None:
+    """
+    Runs the training loop in `nProcs` processes. Rank 0 reports each
+    episode's number and reward back to this process, where
+    `on_episode` is called with them (e.g., to update a progress bar).
+
+    If `resume` is given, every process picks training back up from
+    that checkpoint directory.
+    """
+    queue = mp.get_context("spawn").SimpleQueue()
+    context = mp.spawn(
+        train_worker,
+        args=(nProcs, params, port, queue, resume),
+        nprocs=nProcs,
+        join=False,
+    )
+    done = False
+    while not done:
+        done = context.join(timeout=0.1)
+        while not queue.empty():
+            on_episode(*queue.get())
+
+
+# ============================================
+#                train_worker
+# ============================================
+def train_worker(
+    rank: int,
+    worldSize: int,
+    params: DictConfig,
+    port: int,
+    queue,
+    resume: str = None,
+) -> None:
+    """
+    The training loop run by each process. Each one has its own
+    environment, agent, and memory buffer. Only rank 0 saves
+    checkpoints and the final model.
+
+    When resuming, every process loads the same checkpoint, so each
+    starts with its own copy of the saved memory buffer.
+    """
+    # Imported here to avoid a circular import, since io.write and the
+    # managers both depend on the trainers
+    from raijin.io.read import load_checkpoint
+    from raijin.io.write import save_checkpoint
+    from raijin.io.write import save_final_model
+    from raijin.io.write import save_params
+    from raijin.utilities.managers import get_scheduler
+    from raijin.utilities.managers import get_trainer
+
+    init_process(rank, worldSize, port)
+    try:
+        trainer = get_trainer(params)
+        trainer.scheduler = get_scheduler(params, rank, worldSize)
+        if resume:
+            load_checkpoint(trainer, resume, params.io.checkpointBase)
+        wrap_trainer(trainer)
+        trainer.pre_train()
+        for trainer.episode in range(trainer.startEpisode, trainer.nEpisodes):
+            trainer.train_step_start()
+            trainer.train()
+            if is_main_process():
+                queue.put((trainer.episode, trainer.episodeReward))
+            trainer.train_step_end()
+            if (
+                is_main_process()
+                and trainer.episode % params.io.checkpointFreq == 0
+            ):
+                save_checkpoint(trainer, params)
+        trainer.post_train()
+        if is_main_process():
+            save_params(params.io.outputDir, params)
+            save_final_model(
+                trainer, params.io.checkpointBase, params.io.outputDir
+            )
+    finally:
+        dist.destroy_process_group()
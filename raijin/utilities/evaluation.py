@@ -0,0 +1,313 @@
+import io
+import os
+import queue
+from typing import Callable
+from typing import Dict
+from typing import List
+
+import numpy as np
+from omegaconf.dictconfig import DictConfig
+import torch
+import torch.multiprocessing as mp
+
+from raijin.networks.quantization import quantize_network
+
+
+# ============================================
+#             BackgroundEvaluator
+# ============================================
+class BackgroundEvaluator:
+    """
+    Evaluates the agent while it trains.
+
+    Every `freq` episodes the trainer's current weights are handed to
+    a separate process that plays `nEpisodes` greedy episodes with
+    them, just as `raijin test` would. Handing off the weights never
+    blocks training: the evaluator holds at most one pending snapshot,
+    and if it's still busy with the previous one when the next is due,
+    the new one is skipped (and counted in `nSkipped`).
+
+    The evaluation process takes on the evaluation role of the core
+    scheduler when the parameter file has a resources section.
+    Otherwise it's limited to `threads` torch threads. Either way it
+    runs at a lower priority (`nice`) so it can't starve the learner.
+
+    Results are collected with `poll`, which appends them to the
+    trainer's metrics.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, params: DictConfig) -> None:
+        self.freq = params.evaluation.get("freq", 10)
+        self.nEpisodes = params.evaluation.get("nEpisodes", 5)
+        self.nice = params.evaluation.get("nice", 10)
+        self.threads = params.evaluation.get("threads", 1)
+        # Greedy play in a deterministic env gives the same result
+        # every time
+        if "Deterministic" in params.env.name:
+            self.nEpisodes = 1
+        self.params = params
+        self.nSkipped = 0
+        context = mp.get_context("spawn")
+        self.requests = context.Queue(maxsize=1)
+        self.results = context.Queue()
+        self.process = context.Process(
+            target=background_evaluation_worker,
+            args=(
+                params,
+                self.nEpisodes,
+                self.nice,
+                self.threads,
+                self.requests,
+                self.results,
+            ),
+            name="raijin-evaluator",
+            daemon=True,
+        )
+
+    # -----
+    # start
+    # -----
+    def start(self) -> None:
+        self.process.start()
+
+    # -----
+    # due
+    # -----
+    def due(self, episode: int) -> bool:
+        """
+        Returns True if `episode` is due for an evaluation.
+        """
+        return episode % self.freq == 0
+
+    # -----
+    # submit
+    # -----
+    def submit(self, episode: int, weights: Dict) -> bool:
+        """
+        Queues the weights for evaluation if `episode` is due for one.
+
+        Returns True if the weights were queued.
+        """
+        if not self.due(episode):
+            return False
+        self._check_process()
+        try:
+            self.requests.put_nowait((episode, weights))
+        except queue.Full:
+            self.nSkipped += 1
+            return False
+        return True
+
+    # -----
+    # poll
+    # -----
+    def poll(self, metrics: Dict) -> List:
+        """
+        Adds any finished evaluations to `metrics` without waiting and
+        returns them as (episode, episode rewards) pairs.
+        """
+        self._check_process()
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        for episode, rewards in finished:
+            metrics["evalEpisodes"].append(episode)
+            metrics["evalMeanRewards"].append(float(np.mean(rewards)))
+            metrics["evalMaxRewards"].append(float(np.max(rewards)))
+        return finished
+
+    # -----
+    # close
+    # -----
+    def close(self, metrics: Dict) -> List:
+        """
+        Waits for any pending evaluation to finish, stops the process,
+        and adds the last results to `metrics`.
+        """
+        if self.process.is_alive():
+            self.requests.put(None)
+            self.process.join()
+        return self.poll(metrics)
+
+    # -----
+    # initialize_metrics
+    # -----
+    def initialize_metrics(self, metrics: Dict) -> None:
+        # Metrics from before a resumed checkpoint are kept
+        metrics.setdefault("evalEpisodes", [])
+        metrics.setdefault("evalMeanRewards", [])
+        metrics.setdefault("evalMaxRewards", [])
+
+    # -----
+    # _check_process
+    # -----
+    def _check_process(self) -> None:
+        if self.process.exitcode not in (None, 0):
+            raise RuntimeError(
+                f"The evaluation process failed (exit code "
+                f"{self.process.exitcode})."
+            )
+
+
+# ============================================
+#        background_evaluation_worker
+# ============================================
+def background_evaluation_worker(
+    params: DictConfig,
+    nEpisodes: int,
+    nice: int,
+    threads: int,
+    requests,
+    results,
+) -> None:
+    """
+    Evaluates each set of weights it's sent until it's sent None.
+    """
+    # Imported here since the managers import nearly everything
+    from raijin.utilities.managers import get_proctor
+    from raijin.utilities.managers import get_scheduler
+
+    os.nice(nice)
+    proctor = None
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        episode, weights = request
+        if proctor is None:
+            proctor = get_proctor(params, weights)
+            proctor.scheduler = get_scheduler(params)
+            if proctor.scheduler is None:
+                torch.set_num_threads(threads)
+            proctor.nEpisodes = nEpisodes
+        else:
+            proctor.net.load_state_dict(weights)
+            # Q-values cached for the old weights no longer apply
+            if getattr(proctor.agent, "qCache", None) is not None:
+                proctor.agent.qCache.clear()
+        proctor.pre_test()
+        for proctor.episode in range(proctor.nEpisodes):
+            proctor.test_step_start()
+            proctor.test()
+            proctor.test_step_end()
+        proctor.post_test()
+        results.put((episode, proctor.metrics["episodeRewards"]))
+
+
+# ============================================
+#               split_episodes
+# ============================================
+def split_episodes(nEpisodes: int, nWorkers: int) -> List[int]:
+    """
+    Divides the episodes as evenly as possible between the workers.
+    """
+    base, extra = divmod(nEpisodes, nWorkers)
+    return [base + (1 if i < extra else 0) for i in range(nWorkers)]
+
+
+# ============================================
+#            evaluate_in_parallel
+# ============================================
+def evaluate_in_parallel(
+    params: DictConfig,
+    net: torch.nn.Module,
+    nEpisodes: int,
+    nWorkers: int,
+    on_episode: Callable[[float], None],
+    quantization: str = None,
+    calibrationStates: torch.Tensor = None,
+) -> List[float]:
+    """
+    Plays `nEpisodes` greedy episodes spread across `nWorkers`
+    processes, each with its own environment and agent, and returns
+    the reward of each episode.
+
+    The network's weights are moved into shared memory so that every
+    worker reads the same copy rather than loading its own. Torchscript
+    networks can't be shared that way, so they're serialized once in
+    memory and each worker loads them from there. Quantized networks
+    can't be shared either, so instead the float32 network is shared
+    and each worker makes its own int8 copy (which is cheap) using
+    `quantization` and `calibrationStates`.
+
+    `on_episode` is called with each episode's reward as it comes in.
+    """
+    if isinstance(net, torch.jit.ScriptModule):
+        buffer = io.BytesIO()
+        torch.jit.save(net, buffer)
+        net = buffer.getvalue()
+    else:
+        net.share_memory()
+    queue = mp.get_context("spawn").SimpleQueue()
+    episodes = split_episodes(nEpisodes, nWorkers)
+    context = mp.spawn(
+        evaluation_worker,
+        args=(
+            nWorkers,
+            params,
+            net,
+            episodes,
+            queue,
+            quantization,
+            calibrationStates,
+        ),
+        nprocs=nWorkers,
+        join=False,
+    )
+    rewards = []
+    done = False
+    while not done:
+        done = context.join(timeout=0.1)
+        while not queue.empty():
+            rewards.append(queue.get())
+            on_episode(rewards[-1])
+    return rewards
+
+
+# ============================================
+#             evaluation_worker
+# ============================================
+def evaluation_worker(
+    rank: int,
+    nWorkers: int,
+    params: DictConfig,
+    net,
+    episodes: List[int],
+    queue,
+    quantization: str,
+    calibrationStates: torch.Tensor,
+) -> None:
+    """
+    Runs this worker's share of the test episodes with a proctor of
+    its own.
+    """
+    # Imported here since the managers import nearly everything
+    from raijin.utilities.managers import get_proctor
+    from raijin.utilities.managers import get_scheduler
+
+    if isinstance(net, bytes):
+        net = torch.jit.load(io.BytesIO(net))
+    if quantization is not None:
+        net = quantize_network(net, quantization, calibrationStates)
+    proctor = get_proctor(params, None, nets=[net])
+    # The workers split every available core between them, rather than
+    # sharing the evaluation cores
+    proctor.scheduler = get_scheduler(params, rank, nWorkers)
+    proctor.role = "testing"
+    if proctor.scheduler is None:
+        nCores = len(os.sched_getaffinity(0))
+        torch.set_num_threads(max(1, nCores // nWorkers))
+    proctor.nEpisodes = episodes[rank]
+    proctor.pre_test()
+    for proctor.episode in range(proctor.nEpisodes):
+        proctor.test_step_start()
+        proctor.test()
+        queue.put(proctor.episodeReward)
+        proctor.test_step_end()
+    proctor.post_test()
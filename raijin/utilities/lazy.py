@@ -0,0 +1,40 @@
+import importlib
+from typing import Callable
+from typing import Sequence
+from typing import Tuple
+
+
+# ============================================
+#              lazy_submodules
+# ============================================
+def lazy_submodules(
+    packageName: str, submodules: Sequence[str]
+) -> Tuple[Callable, Callable]:
+    """
+    Returns a module `__getattr__` and `__dir__` (PEP 562) for a package
+    that imports each of the given submodules the first time it's
+    accessed as an attribute, rather than when the package is imported.
+
+    That way `import raijin` (and, e.g., `raijin --help`) doesn't pay
+    for torch, h5py, gym, etc. unless they're actually used. Once
+    imported, a submodule is an ordinary attribute of the package, so
+    later lookups don't go through `__getattr__`.
+
+    Usage, in the package's __init__.py:
+
+        __getattr__, __dir__ = lazy_submodules(__name__, ("a", "b"))
+    """
+    submodules = tuple(submodules)
+
+    def __getattr__(name: str):
+        if name in submodules:
+            return importlib.import_module(f"{packageName}.{name}")
+        raise AttributeError(
+            f"module {packageName!r} has no attribute {name!r}"
+        )
+
+    def __dir__():
+        package = importlib.import_module(packageName)
+        return sorted(set(vars(package)) | set(submodules))
+
+    return __getattr__, __dir__
@@ -1,17 +1,31 @@
+import os
 from typing import List
+from typing import TYPE_CHECKING
 
-import gym
 from omegaconf.dictconfig import DictConfig
 
 from raijin.proctors import base_proctor as bpr
 from raijin.trainers import base_trainer as bt
 from raijin.utilities.register import registry
 
+# The helpers below import what they build when they're called, so a
+# process (e.g., a spawned worker) only loads what it actually uses
+if TYPE_CHECKING:
+    import gym
+
+    from raijin.io.checkpoint_store import CheckpointStore
+    from raijin.io.metrics_log import MetricsLog
+    from raijin.io.trajectories import TrajectoryRecorder
+    from raijin.utilities.evaluation import BackgroundEvaluator
+    from raijin.utilities.resources import CoreScheduler
+
 
 # ============================================
 #                 get_trainer
 # ============================================
 def get_trainer(params: DictConfig) -> "bt.BaseTrainer":
+    if getattr(registry[params.trainer.name], "offline", False):
+        return get_offline_trainer(params)
     env = get_env(params.env.name)
     pipeline = registry[params.pipeline.name](params.pipeline)
     agent = registry[params.agent.name](env, pipeline, params.agent)
@@ -25,22 +39,186 @@ def get_trainer(params: DictConfig) -> "bt.BaseTrainer":
     return trainer
 
 
+# ============================================
+#             get_offline_trainer
+# ============================================
+def get_offline_trainer(params: DictConfig) -> "bt.BaseTrainer":
+    """
+    Builds a trainer that learns from the trajectories recorded in
+    `params.dataset.dataDir`. No environment is made (gym isn't even
+    imported): the number of actions comes from the recorded files.
+    """
+    from raijin.io.trajectory_dataset import TrajectoryDataset
+    from raijin.io.trajectory_dataset import TrajectoryLoader
+
+    dataParams = params.dataset
+    dataset = TrajectoryDataset(
+        dataParams.dataDir, shardSize=dataParams.get("shardSize", 512)
+    )
+    loader = TrajectoryLoader(
+        dataset,
+        params.pipeline,
+        params.trainer.batchSize,
+        nWorkers=dataParams.get("nWorkers", 2),
+        bufferSize=dataParams.get("bufferSize", 4096),
+        prefetch=dataParams.get("prefetch", 8),
+        seed=dataParams.get("seed", 0),
+    )
+    nets = get_nets(params.nets, params.pipeline.traceLen, dataset.nActions)
+    optimizers = get_optimizers(params.optimizers, nets)
+    lossFunctions = get_loss_functions(params.losses)
+    trainer = registry[params.trainer.name](
+        loader, lossFunctions, nets, optimizers, params.trainer
+    )
+    return trainer
+
+
 # ============================================
 #                get_proctor
 # ============================================
-def get_proctor(params: DictConfig, modelStateDict: dict) -> "bpr.BaseProctor":
+def get_proctor(
+    params: DictConfig, modelStateDict: dict, nets: List = None
+) -> "bpr.BaseProctor":
+    """
+    If `nets` is given (e.g., torchscript networks that were loaded
+    directly), they're used as-is instead of being built from the
+    parameter file.
+    """
     env = get_env(params.env.name)
     pipeline = registry[params.pipeline.name](params.pipeline)
     agent = registry[params.agent.name](env, pipeline, params.agent)
-    nets = get_nets(params.nets, pipeline.traceLen, env.action_space.n)
+    if nets is None:
+        nets = get_nets(params.nets, pipeline.traceLen, env.action_space.n)
     proctor = registry[params.proctor.name](agent, nets, modelStateDict, params.proctor)
     return proctor
 
 
+# ============================================
+#                get_scheduler
+# ============================================
+def get_scheduler(
+    params: DictConfig, rank: int = 0, nParts: int = 1
+) -> "CoreScheduler":
+    """
+    Returns None if the parameter file doesn't have a resources
+    section, in which case torch's defaults are left alone.
+    """
+    if "resources" not in params:
+        return None
+    from raijin.utilities.resources import CoreScheduler
+
+    return CoreScheduler(params.resources, rank, nParts)
+
+
+# ============================================
+#                get_evaluator
+# ============================================
+def get_evaluator(params: DictConfig) -> "BackgroundEvaluator":
+    """
+    Returns None if the parameter file doesn't have an evaluation
+    section or its frequency is zero, in which case the agent is only
+    evaluated by `raijin test`.
+    """
+    if "evaluation" not in params or not params.evaluation.get("freq"):
+        return None
+    # Evaluating plays episodes, which needs an env
+    if getattr(registry[params.trainer.name], "offline", False):
+        raise ValueError(
+            "Offline trainers have no env to evaluate in. Set "
+            "evaluation.freq to 0."
+        )
+    from raijin.utilities.evaluation import BackgroundEvaluator
+
+    return BackgroundEvaluator(params)
+
+
+# ============================================
+#            get_checkpoint_store
+# ============================================
+def get_checkpoint_store(params: DictConfig) -> "CheckpointStore":
+    """
+    Returns None unless the io section turns on the checkpoint store,
+    in which case checkpoints go into a store in the output directory
+    instead of numbered checkpoint directories.
+    """
+    storeParams = params.io.get("checkpointStore")
+    if storeParams is None or not storeParams.get("enabled", False):
+        return None
+    from raijin.io.checkpoint_store import CheckpointStore
+
+    return CheckpointStore(
+        os.path.join(params.io.outputDir, "store"),
+        keepLast=storeParams.get("keepLast"),
+        keepEvery=storeParams.get("keepEvery"),
+        segmentSize=storeParams.get("segmentSize", 4096),
+        compression=bool(params.io.get("memoryCompression")),
+    )
+
+
+# ============================================
+#               get_metrics_log
+# ============================================
+def get_metrics_log(
+    params: DictConfig, startEpisode: int = 0
+) -> "MetricsLog":
+    """
+    Returns None unless the io section turns on the metrics log.
+    Without it, only the metrics dict is kept.
+    """
+    logParams = params.io.get("metricsLog")
+    if logParams is None or not logParams.get("enabled", False):
+        return None
+    from raijin.io.metrics_log import MetricsLog
+
+    return MetricsLog(
+        params.io.outputDir,
+        freq=logParams.get("freq", 100),
+        flushSize=logParams.get("flushSize", 256),
+        startEpisode=startEpisode,
+    )
+
+
+# ============================================
+#          get_trajectory_recorder
+# ============================================
+def get_trajectory_recorder(
+    params: DictConfig, outputDir: str = None, nActions: int = None
+) -> "TrajectoryRecorder":
+    """
+    Returns None unless the io section turns on recording or an
+    output directory is given (e.g., by `raijin test --record`). The
+    recording goes into the output directory's trajectories directory
+    by default.
+    """
+    recordParams = params.io.get("trajectories") or {}
+    if outputDir is None:
+        if not recordParams.get("enabled", False):
+            return None
+        outputDir = os.path.join(params.io.outputDir, "trajectories")
+    from raijin.io.trajectories import TrajectoryRecorder
+
+    return TrajectoryRecorder(
+        outputDir,
+        maxFileBytes=int(recordParams.get("maxFileMB", 1024) * 2**20),
+        blockSize=recordParams.get("blockSize", 256),
+        maxPending=recordParams.get("maxPending", 4),
+        compression=recordParams.get("compression"),
+        nActions=nActions,
+    )
+
+
 # ============================================
 #                   get_env
 # ============================================
-def get_env(envName: str) -> gym.Env:
+def get_env(envName: str) -> "gym.Env":
+    from raijin.utilities.synthetic_env import SyntheticAtariEnv
+
+    # The synthetic env doesn't need gym or an Atari rom
+    if envName == SyntheticAtariEnv.envName:
+        return SyntheticAtariEnv()
+    # Imported here so that offline training doesn't need gym
+    import gym
+
     env = gym.make(envName)
     return env
 
@@ -0,0 +1,312 @@
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import threading
+import time
+from typing import List
+from typing import Tuple
+
+from raijin.trainers import base_trainer as bt
+
+
+# ============================================
+#               MetricsServer
+# ============================================
+class MetricsServer:
+    """
+    Serves live training metrics over http in the Prometheus text
+    format (GET /metrics), from a background thread.
+
+    Scraping never holds up training, since the server never waits on
+    (or locks anything used by) the training loop. It reads two kinds
+    of values:
+
+        * the trainer's running totals of env steps and updates, which
+            are plain ints that the server only reads
+        * a snapshot dict with everything else (the latest episode's
+            reward, how full the memory is, the checkpoint timings)
+            that the training loop replaces with a new one by calling
+            `publish` at the end of each episode and after each
+            checkpoint. Swapping the reference is atomic, so the
+            server always sees a whole snapshot
+
+    The env step and update rates are worked out by the server from
+    the totals, over the time since the previous scrape (or since
+    training started, for the first one).
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        trainer: "bt.BaseTrainer",
+        host: str = "127.0.0.1",
+        port: int = 9100,
+    ) -> None:
+        self.trainer = trainer
+        self.startTime = time.perf_counter()
+        self.lastScrape = self._read_totals()
+        # Only touched by the server's threads
+        self.scrapeLock = threading.Lock()
+        # Only touched by the training loop
+        self.nCheckpoints = 0
+        self.checkpointTime = 0.0
+        self.lastCheckpointTime = 0.0
+        self.snapshot = {}
+        self.publish()
+        handler = type(
+            "BoundMetricsRequestHandler",
+            (MetricsRequestHandler,),
+            {"metricsServer": self},
+        )
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            name="raijin-metrics-server",
+            daemon=True,
+        )
+
+    # -----
+    # address
+    # -----
+    @property
+    def address(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    # -----
+    # start
+    # -----
+    def start(self) -> None:
+        self.thread.start()
+
+    # -----
+    # close
+    # -----
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    # -----
+    # publish
+    # -----
+    def publish(self) -> None:
+        """
+        Called by the training loop to hand the server a new snapshot.
+        """
+        trainer = self.trainer
+        snapshot = {
+            "episode": trainer.episode,
+            "episodeReward": None,
+            "memorySize": None,
+            "memoryCapacity": None,
+            "memoryBytes": None,
+            "nCheckpoints": self.nCheckpoints,
+            "checkpointTime": self.checkpointTime,
+            "lastCheckpointTime": self.lastCheckpointTime,
+        }
+        rewards = trainer.metrics.get("episodeRewards")
+        if rewards:
+            snapshot["episodeReward"] = rewards[-1]
+        memory = trainer.memory
+        if memory is not None:
+            snapshot["memorySize"] = len(memory)
+            snapshot["memoryCapacity"] = getattr(memory, "capacity", None)
+            if hasattr(memory, "nbytes"):
+                snapshot["memoryBytes"] = memory.nbytes()
+        self.snapshot = snapshot
+
+    # -----
+    # checkpoint_saved
+    # -----
+    def checkpoint_saved(self, seconds: float) -> None:
+        """
+        Called by the training loop with how long it spent saving a
+        checkpoint.
+        """
+        self.nCheckpoints += 1
+        self.checkpointTime += seconds
+        self.lastCheckpointTime = seconds
+        self.publish()
+
+    # -----
+    # render
+    # -----
+    def render(self) -> str:
+        """
+        Returns the metrics in the Prometheus text format.
+        """
+        now, nEnvSteps, nUpdates = self._read_totals()
+        with self.scrapeLock:
+            then, lastEnvSteps, lastUpdates = self.lastScrape
+            self.lastScrape = (now, nEnvSteps, nUpdates)
+        elapsed = max(now - then, 1e-9)
+        snapshot = self.snapshot
+        metrics = [
+            (
+                "raijin_uptime_seconds",
+                "gauge",
+                "Time since training started.",
+                now - self.startTime,
+            ),
+            (
+                "raijin_env_steps_total",
+                "counter",
+                "Env steps taken, including filling the memory.",
+                nEnvSteps,
+            ),
+            (
+                "raijin_updates_total",
+                "counter",
+                "Learning steps taken.",
+                nUpdates,
+            ),
+            (
+                "raijin_env_steps_per_second",
+                "gauge",
+                "Env steps per second since the previous scrape.",
+                (nEnvSteps - lastEnvSteps) / elapsed,
+            ),
+            (
+                "raijin_updates_per_second",
+                "gauge",
+                "Learning steps per second since the previous scrape.",
+                (nUpdates - lastUpdates) / elapsed,
+            ),
+            (
+                "raijin_episode",
+                "gauge",
+                "Current episode.",
+                snapshot["episode"],
+            ),
+            (
+                "raijin_episode_reward",
+                "gauge",
+                "Reward of the latest finished episode.",
+                snapshot["episodeReward"],
+            ),
+            (
+                "raijin_memory_experiences",
+                "gauge",
+                "Experiences in the memory buffer.",
+                snapshot["memorySize"],
+            ),
+            (
+                "raijin_memory_capacity",
+                "gauge",
+                "Experiences the memory buffer can hold.",
+                snapshot["memoryCapacity"],
+            ),
+            (
+                "raijin_memory_fill_ratio",
+                "gauge",
+                "Fraction of the memory buffer that's full.",
+                _ratio(snapshot["memorySize"], snapshot["memoryCapacity"]),
+            ),
+            (
+                "raijin_memory_bytes",
+                "gauge",
+                "Estimated size of the experiences in the memory buffer.",
+                snapshot["memoryBytes"],
+            ),
+            (
+                "raijin_checkpoints_total",
+                "counter",
+                "Checkpoints saved.",
+                snapshot["nCheckpoints"],
+            ),
+            (
+                "raijin_checkpoint_seconds_total",
+                "counter",
+                "Time the training loop spent saving checkpoints.",
+                snapshot["checkpointTime"],
+            ),
+            (
+                "raijin_checkpoint_last_seconds",
+                "gauge",
+                "Time the training loop spent saving the latest checkpoint.",
+                snapshot["lastCheckpointTime"],
+            ),
+        ]
+        return format_metrics(metrics)
+
+    # -----
+    # _read_totals
+    # -----
+    def _read_totals(self) -> Tuple:
+        return (
+            time.perf_counter(),
+            self.trainer.nEnvSteps,
+            self.trainer.nUpdates,
+        )
+
+
+# ============================================
+#           MetricsRequestHandler
+# ============================================
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Endpoints:
+
+        * GET /metrics: the training metrics (see `MetricsServer`)
+    """
+
+    # Set by MetricsServer
+    metricsServer = None
+
+    # -----
+    # do_GET
+    # -----
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self._send(404, f"Unknown endpoint: {self.path}\n")
+            return
+        self._send(200, self.metricsServer.render())
+
+    # -----
+    # log_message
+    # -----
+    def log_message(self, format: str, *args) -> None:
+        # Keeps scrapes from writing over the progress bar
+        pass
+
+    # -----
+    # _send
+    # -----
+    def _send(self, code: int, text: str) -> None:
+        body = text.encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# ============================================
+#               format_metrics
+# ============================================
+def format_metrics(metrics: List[Tuple]) -> str:
+    """
+    Formats (name, type, help, value) tuples in the Prometheus text
+    format. Metrics whose value is None (e.g., the memory when training
+    offline) are left out.
+    """
+    lines = []
+    for name, kind, helpText, value in metrics:
+        if value is None:
+            continue
+        lines.append(f"# HELP {name} {helpText}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {float(value)!r}")
+    return "\n".join(lines) + "\n"
+
+
+# ============================================
+#                   _ratio
+# ============================================
+def _ratio(numerator: float, denominator: float) -> float:
+    if numerator is None or not denominator:
+        return None
+    return numerator / denominator
@@ -0,0 +1,68 @@
+import contextlib
+from typing import Callable
+from typing import ContextManager
+
+import torch
+
+
+_bf16Supported = None
+
+
+# ============================================
+#            channels_last_available
+# ============================================
+def channels_last_available() -> bool:
+    return hasattr(torch, "channels_last")
+
+
+# ============================================
+#            bf16_autocast_available
+# ============================================
+def bf16_autocast_available() -> bool:
+    """
+    Checks whether or not bfloat16 autocasting can be used on the cpu.
+
+    CPU autocasting was only added in torch 1.10, and even then not
+    every cpu supports the required kernels, so we try it out on a
+    tiny network before committing to it. The result is cached.
+    """
+    global _bf16Supported
+    if _bf16Supported is not None:
+        return _bf16Supported
+    _bf16Supported = False
+    if _get_autocast_factory() is None:
+        return _bf16Supported
+    try:
+        conv = torch.nn.Conv2d(1, 1, 3)
+        x = torch.rand(1, 1, 8, 8)
+        with _get_autocast_factory()():
+            y = conv(x)
+        _bf16Supported = y.dtype == torch.bfloat16
+    except (RuntimeError, TypeError):
+        _bf16Supported = False
+    return _bf16Supported
+
+
+# ============================================
+#                 get_autocast
+# ============================================
+def get_autocast(enabled: bool) -> Callable[[], ContextManager]:
+    """
+    Returns a function that creates a bfloat16 autocast context on the
+    cpu. If autocasting isn't wanted or isn't supported, the context
+    does nothing, so callers never have to check.
+    """
+    if enabled and bf16_autocast_available():
+        return _get_autocast_factory()
+    return contextlib.nullcontext
+
+
+# ============================================
+#            _get_autocast_factory
+# ============================================
+def _get_autocast_factory() -> Callable[[], ContextManager]:
+    if hasattr(torch, "autocast"):
+        return lambda: torch.autocast("cpu", dtype=torch.bfloat16)
+    if hasattr(torch, "cpu") and hasattr(torch.cpu, "amp"):
+        return lambda: torch.cpu.amp.autocast(dtype=torch.bfloat16)
+    return None
@@ -0,0 +1,116 @@
+import os
+
+import torch
+
+from raijin.utilities.io_utilities import sanitize_path
+
+
+# ============================================
+#                StepProfiler
+# ============================================
+class StepProfiler:
+    """
+    Runs torch's (autograd) profiler over a window of training steps:
+    the `nSteps` steps after the first `warmup`, so that one-time costs
+    like allocating buffers and warming caches are left out.
+
+    The profiler records the cpu time, input shapes, and memory
+    allocated by every operator on every thread, so the learner thread
+    of the `AsyncQTrainer` is included. Steps outside the window run
+    without it.
+
+    At the end of the window the following are written to
+    `outputDir`/profile:
+
+        * trace.json: a Chrome trace (chrome://tracing or Perfetto)
+        * ops.txt: the `topN` operators by self cpu time and by self
+            memory allocated
+
+    The trainer calls `step` at the end of each training step.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        outputDir: str,
+        warmup: int = 100,
+        nSteps: int = 20,
+        topN: int = 30,
+    ) -> None:
+        self.profileDir = os.path.join(sanitize_path(outputDir), "profile")
+        self.warmup = warmup
+        self.nSteps = nSteps
+        self.topN = topN
+        self.nStepsDone = 0
+        self.nProfiled = 0
+        self.profile = None
+        self.finished = False
+
+    # -----
+    # start
+    # -----
+    def start(self) -> None:
+        """
+        Called before the first training step, in case there's no
+        warmup.
+        """
+        if self.warmup == 0:
+            self._start_profile()
+
+    # -----
+    # step
+    # -----
+    def step(self) -> None:
+        if self.finished:
+            return
+        self.nStepsDone += 1
+        if self.profile is not None:
+            self.nProfiled += 1
+            if self.nProfiled == self.nSteps:
+                self._stop_profile()
+        elif self.nStepsDone == self.warmup:
+            self._start_profile()
+
+    # -----
+    # close
+    # -----
+    def close(self) -> None:
+        """
+        Writes out what was profiled if training ended partway through
+        the window.
+        """
+        if self.profile is not None:
+            self._stop_profile()
+
+    # -----
+    # _start_profile
+    # -----
+    def _start_profile(self) -> None:
+        self.profile = torch.autograd.profiler.profile(
+            record_shapes=True, profile_memory=True
+        )
+        self.profile.__enter__()
+
+    # -----
+    # _stop_profile
+    # -----
+    def _stop_profile(self) -> None:
+        self.profile.__exit__(None, None, None)
+        os.makedirs(self.profileDir, exist_ok=True)
+        self.profile.export_chrome_trace(
+            os.path.join(self.profileDir, "trace.json")
+        )
+        averages = self.profile.key_averages()
+        with open(os.path.join(self.profileDir, "ops.txt"), "w") as fd:
+            fd.write(
+                f"{self.nProfiled} training steps after {self.warmup} of "
+                "warmup\n\n"
+            )
+            for sortBy in ("self_cpu_time_total", "self_cpu_memory_usage"):
+                fd.write(f"Top {self.topN} operators by {sortBy}:\n")
+                fd.write(averages.table(sort_by=sortBy, row_limit=self.topN))
+                fd.write("\n\n")
+        self.profile = None
+        self.finished = True
@@ -1,48 +1,87 @@
-import torch
-
-
-registry = {}
-
-
-lossRegister = {
-    "BCELoss": torch.nn.BCELoss,
-    "BCEWithLogitsLoss": torch.nn.BCEWithLogitsLoss,
-    "CosineEmbeddingLoss": torch.nn.CosineEmbeddingLoss,
-    "CrossEntropyLoss": torch.nn.CrossEntropyLoss,
-    "CTCLoss": torch.nn.CTCLoss,
-    "HingeEmbeddingLoss": torch.nn.HingeEmbeddingLoss,
-    "KLDivLoss": torch.nn.KLDivLoss,
-    "L1Loss": torch.nn.L1Loss,
-    "MarginRankingLoss": torch.nn.MarginRankingLoss,
-    "MSELoss": torch.nn.MSELoss,
-    "MultiLabelMarginLoss": torch.nn.MultiLabelMarginLoss,
-    "MultiLabelSoftMarginLoss": torch.nn.MultiLabelSoftMarginLoss,
-    "MultiMarginLoss": torch.nn.MultiMarginLoss,
-    "NLLLoss": torch.nn.NLLLoss,
-    "NLLLoss2d": torch.nn.NLLLoss2d,
-    "PoissonNLLLoss": torch.nn.PoissonNLLLoss,
-    "SmoothL1Loss": torch.nn.SmoothL1Loss,
-    "SoftMarginLoss": torch.nn.SoftMarginLoss,
-    "TripletMarginLoss": torch.nn.TripletMarginLoss,
-    "TripletMarginWithDistanceLoss": torch.nn.TripletMarginWithDistanceLoss,
-}
-registry.update(lossRegister)
-
-
-optimizerRegister = {
-    "Adadelta": torch.optim.Adadelta,
-    "Adagrad": torch.optim.Adagrad,
-    "Adam": torch.optim.Adam,
-    "Adamax": torch.optim.Adamax,
-    "AdamW": torch.optim.AdamW,
-    "ASGD": torch.optim.ASGD,
-    "LBFGS": torch.optim.LBFGS,
-    "RMSprop": torch.optim.RMSprop,
-    "Rprop": torch.optim.Rprop,
-    "SGD": torch.optim.SGD,
-    "SparseAdam": torch.optim.SparseAdam,
+import importlib
+
+
+# Where each name that can be used in a parameter file is defined. The
+# module is only imported when the name is first looked up, so that,
+# e.g., the optimizers don't make importing the registry import torch.
+# raijin's own classes register themselves when their module is
+# imported (see the base classes' `__init_subclass__`)
+registryLocations = {
+    # Agents
+    "QAgent": "raijin.agents.qagent",
+    # Memory
+    "QMemory": "raijin.memory.qmemory",
+    "TieredMemory": "raijin.memory.tiered_memory",
+    # Networks
+    "QNetwork": "raijin.networks.qnetwork",
+    # Pipelines
+    "QPipeline": "raijin.pipelines.qpipeline",
+    # Proctors
+    "QProctor": "raijin.proctors.qproctor",
+    # Trainers
+    "AsyncQTrainer": "raijin.trainers.async_qtrainer",
+    "OfflineQTrainer": "raijin.trainers.offline_qtrainer",
+    "QTrainer": "raijin.trainers.qtrainer",
+    # Losses
+    "BCELoss": "torch.nn",
+    "BCEWithLogitsLoss": "torch.nn",
+    "CosineEmbeddingLoss": "torch.nn",
+    "CrossEntropyLoss": "torch.nn",
+    "CTCLoss": "torch.nn",
+    "HingeEmbeddingLoss": "torch.nn",
+    "KLDivLoss": "torch.nn",
+    "L1Loss": "torch.nn",
+    "MarginRankingLoss": "torch.nn",
+    "MSELoss": "torch.nn",
+    "MultiLabelMarginLoss": "torch.nn",
+    "MultiLabelSoftMarginLoss": "torch.nn",
+    "MultiMarginLoss": "torch.nn",
+    "NLLLoss": "torch.nn",
+    "NLLLoss2d": "torch.nn",
+    "PoissonNLLLoss": "torch.nn",
+    "SmoothL1Loss": "torch.nn",
+    "SoftMarginLoss": "torch.nn",
+    "TripletMarginLoss": "torch.nn",
+    "TripletMarginWithDistanceLoss": "torch.nn",
+    # Optimizers
+    "Adadelta": "torch.optim",
+    "Adagrad": "torch.optim",
+    "Adam": "torch.optim",
+    "Adamax": "torch.optim",
+    "AdamW": "torch.optim",
+    "ASGD": "torch.optim",
+    "LBFGS": "torch.optim",
+    "RMSprop": "torch.optim",
+    "Rprop": "torch.optim",
+    "SGD": "torch.optim",
+    "SparseAdam": "torch.optim",
 }
-registry.update(optimizerRegister)
+
+
+# ============================================
+#                  Registry
+# ============================================
+class Registry(dict):
+    """
+    A dict of the classes that can be named in a parameter file that
+    fills itself in: looking up a name that isn't there yet imports
+    the module it's defined in (see `registryLocations`).
+    """
+
+    # -----
+    # __missing__
+    # -----
+    def __missing__(self, name: str):
+        if name not in registryLocations:
+            raise KeyError(name)
+        module = importlib.import_module(registryLocations[name])
+        # torch's classes don't register themselves
+        if name not in self:
+            self[name] = getattr(module, name)
+        return self[name]
+
+
+registry = Registry()
 
 
 # ============================================
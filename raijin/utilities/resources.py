@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from typing import Dict
+from typing import List
+
+from omegaconf.dictconfig import DictConfig
+import torch
+
+
+# ============================================
+#                CoreScheduler
+# ============================================
+class CoreScheduler:
+    """
+    Splits the cores available to raijin between the different jobs
+    (roles) that can run at the same time:
+
+        * learner: the optimizer steps in `learn`
+        * actors: stepping through the environment and choosing actions
+        * evaluation: testing the agent alongside training
+
+    The actors and evaluation get the number of cores asked for and
+    the learner gets whatever is left over (unless it, too, asks for a
+    specific number). Testing on its own (`raijin test`) doesn't share
+    the machine with anything, so it has a role of its own, testing,
+    that gets every available core. A thread that takes on a role has its torch
+    thread count set to the number of cores in that role and, if
+    `pinAffinity` is set, is pinned to those cores. This keeps the
+    torch thread pools of the different roles from oversubscribing the
+    machine.
+
+    If more cores are asked for than are available, the roles wrap
+    around and share cores. This is flagged in the report.
+    """
+
+    # The roles that split the cores between them while training
+    roles = ("actors", "evaluation", "learner")
+    allRoles = roles + ("testing",)
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self, params: DictConfig, rank: int = 0, nParts: int = 1
+    ) -> None:
+        available = sorted(os.sched_getaffinity(0))
+        if params.get("cores") is not None:
+            available = available[: params.cores]
+        self.available = available
+        self.interOpThreads = params.get("interOpThreads", 1)
+        self.pinAffinity = params.get("pinAffinity", True)
+        self.rank = rank
+        self.nParts = nParts
+        self.oversubscribed = False
+        self.assignment = self._assign(params)
+        self.clocks = {role: [] for role in self.allRoles}
+        self.startWall = time.monotonic()
+        self.startCpu = self._process_cpu_time()
+
+    # -----
+    # cores
+    # -----
+    def cores(self, *roles: str) -> List[int]:
+        """
+        Returns the cores belonging to the given roles. When the roles
+        are shared by `nParts` processes (e.g., data-parallel
+        training), their cores are split evenly and the slice for this
+        process's rank is returned.
+        """
+        cores = []
+        for role in roles:
+            roleCores = self.assignment[role]
+            size = max(1, len(roleCores) // self.nParts)
+            start = (self.rank * size) % len(roleCores)
+            cores.extend(roleCores[start : start + size])
+        return sorted(set(cores))
+
+    # -----
+    # apply
+    # -----
+    def apply(self, *roles: str) -> List[int]:
+        """
+        Gives the calling thread the cores of the given roles.
+
+        On linux, setting the affinity of pid 0 only affects the
+        calling thread, so e.g. the learner and actor threads of one
+        process can be pinned to different cores.
+        """
+        cores = self.cores(*roles)
+        if self.pinAffinity and hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        torch.set_num_threads(len(cores))
+        # The inter-op pool can only be sized once, before it's used
+        try:
+            torch.set_num_interop_threads(self.interOpThreads)
+        except RuntimeError:
+            pass
+        if hasattr(time, "pthread_getcpuclockid"):
+            # Keep the thread's cpu time at this point so that only the
+            # time spent in the role is counted
+            clock = time.pthread_getcpuclockid(threading.get_ident())
+            start = time.clock_gettime(clock)
+            for role in roles:
+                self.clocks[role].append((clock, start))
+        return cores
+
+    # -----
+    # report
+    # -----
+    def report(self) -> Dict:
+        """
+        Summarizes the assignment and how busy the cores were.
+
+        Utilization is cpu time divided by wall time times the number
+        of cores, both for the process as a whole and for each role
+        whose threads are still alive. The testing role is only listed
+        if it was used.
+        """
+        wall = time.monotonic() - self.startWall
+        cpu = self._process_cpu_time() - self.startCpu
+        roles = [
+            role
+            for role in self.allRoles
+            if role in self.roles or self.clocks[role]
+        ]
+        assigned = sorted(set(c for r in roles for c in self.assignment[r]))
+        report = {
+            "cores": assigned,
+            "oversubscribed": self.oversubscribed,
+            "utilization": cpu / max(wall * len(assigned), 1e-9),
+            "roles": {},
+        }
+        for role in roles:
+            roleCpu = 0.0
+            for clock, start in self.clocks[role]:
+                try:
+                    roleCpu += time.clock_gettime(clock) - start
+                except OSError:
+                    # The thread has already finished
+                    pass
+            nCores = len(self.assignment[role])
+            report["roles"][role] = {
+                "cores": self.assignment[role],
+                "threads": len(self.clocks[role]),
+                "utilization": roleCpu / max(wall * nCores, 1e-9),
+            }
+        return report
+
+    # -----
+    # _assign
+    # -----
+    def _assign(self, params: DictConfig) -> Dict[str, List[int]]:
+        nAvailable = len(self.available)
+        requested = {
+            "actors": params.get("actors", 1),
+            "evaluation": params.get("evaluation", 1),
+        }
+        leftOver = nAvailable - sum(requested.values())
+        learner = params.get("learner")
+        requested["learner"] = learner if learner is not None else leftOver
+        # Every role needs at least one core
+        requested = {k: max(1, v) for k, v in requested.items()}
+        self.oversubscribed = sum(requested.values()) > nAvailable
+        assignment = {}
+        i = 0
+        for role in self.roles:
+            assignment[role] = sorted(
+                set(
+                    self.available[(i + j) % nAvailable]
+                    for j in range(requested[role])
+                )
+            )
+            i += requested[role]
+        assignment["testing"] = list(self.available)
+        return assignment
+
+    # -----
+    # _process_cpu_time
+    # -----
+    def _process_cpu_time(self) -> float:
+        t = os.times()
+        return t.user + t.system
@@ -0,0 +1,386 @@
+from collections import deque
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import threading
+import time
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+import numpy as np
+import torch
+
+from raijin.utilities import resources as rs
+
+
+# ============================================
+#               InferenceRequest
+# ============================================
+class InferenceRequest:
+    """
+    One or more states waiting to be run through the network. The
+    thread that submitted the request waits on `done` until the
+    batcher has filled in `qVals` (or `error`).
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, states: torch.Tensor) -> None:
+        self.states = states
+        self.qVals = None
+        self.error = None
+        self.start = time.perf_counter()
+        self.done = threading.Event()
+
+
+# ============================================
+#               BatchingPolicy
+# ============================================
+class BatchingPolicy:
+    """
+    Runs a network on states sent from many threads at once.
+
+    Requests are put on a queue that a single batcher thread drains.
+    Once the batcher has the first request of a batch, it keeps
+    collecting requests until either it has `maxBatch` states or
+    `maxWait` seconds have gone by, then runs them all through the
+    network with one forward pass. Batching trades a little latency
+    for much better throughput when many clients are asking at once,
+    and `maxWait` bounds how much latency a lone request can pick up.
+
+    Latencies (from submission to result) of the most recent
+    `historySize` requests are kept for the percentiles in `stats`.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        net: torch.nn.Module,
+        stateShape: Tuple,
+        maxBatch: int = 32,
+        maxWait: float = 0.005,
+        scheduler: "rs.CoreScheduler" = None,
+        historySize: int = 10000,
+    ) -> None:
+        self.net = net
+        self.stateShape = tuple(stateShape)
+        self.maxBatch = maxBatch
+        self.maxWait = maxWait
+        self.scheduler = scheduler
+        self.requests = queue.Queue()
+        self.latencies = deque(maxlen=historySize)
+        self.batchSizes = deque(maxlen=historySize)
+        self.nRequests = 0
+        self.nStates = 0
+        self.nBatches = 0
+        self.startTime = time.monotonic()
+        self.statsLock = threading.Lock()
+        self.stopEvent = threading.Event()
+        self.thread = None
+
+    # -----
+    # start
+    # -----
+    def start(self) -> None:
+        self.stopEvent.clear()
+        self.startTime = time.monotonic()
+        self.thread = threading.Thread(
+            target=self._batch_loop, name="raijin-batcher", daemon=True
+        )
+        self.thread.start()
+
+    # -----
+    # stop
+    # -----
+    def stop(self) -> None:
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # -----
+    # q_values
+    # -----
+    def q_values(self, states: torch.Tensor) -> torch.Tensor:
+        """
+        Returns the Q-values for a batch of states with shape
+        (N, C, H, W). Blocks until the batcher has gotten to them.
+        """
+        if tuple(states.shape[1:]) != self.stateShape:
+            raise ValueError(
+                f"Expected states with shape (N, {self.stateShape}), got "
+                f"{tuple(states.shape)}."
+            )
+        request = InferenceRequest(states)
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise RuntimeError("Inference failed.") from request.error
+        return request.qVals
+
+    # -----
+    # stats
+    # -----
+    def stats(self) -> Dict:
+        with self.statsLock:
+            latencies = np.array(self.latencies)
+            batchSizes = np.array(self.batchSizes)
+            elapsed = time.monotonic() - self.startTime
+            stats = {
+                "requests": self.nRequests,
+                "states": self.nStates,
+                "batches": self.nBatches,
+                "uptime": elapsed,
+                "requestsPerSec": self.nRequests / max(elapsed, 1e-9),
+                "statesPerSec": self.nStates / max(elapsed, 1e-9),
+            }
+        if len(batchSizes):
+            stats["meanBatchSize"] = float(np.mean(batchSizes))
+        if len(latencies):
+            for p in (50, 90, 99):
+                value = 1000.0 * float(np.percentile(latencies, p))
+                stats[f"p{p}LatencyMs"] = value
+            stats["maxLatencyMs"] = 1000.0 * float(np.max(latencies))
+        return stats
+
+    # -----
+    # _batch_loop
+    # -----
+    def _batch_loop(self) -> None:
+        if self.scheduler is not None:
+            self.scheduler.apply("evaluation")
+        while not self.stopEvent.is_set():
+            batch = self._collect()
+            if batch:
+                self._run(batch)
+
+    # -----
+    # _collect
+    # -----
+    def _collect(self) -> List[InferenceRequest]:
+        """
+        Gathers requests until the batch is full or the oldest request
+        has waited `maxWait`.
+        """
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        nStates = len(batch[0].states)
+        deadline = batch[0].start + self.maxWait
+        while nStates < self.maxBatch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(request)
+            nStates += len(request.states)
+        return batch
+
+    # -----
+    # _run
+    # -----
+    def _run(self, batch: List[InferenceRequest]) -> None:
+        try:
+            states = torch.cat([r.states for r in batch])
+            with torch.no_grad():
+                qVals = self.net(states)
+            qVals = torch.split(qVals, [len(r.states) for r in batch])
+            for request, requestQVals in zip(batch, qVals):
+                request.qVals = requestQVals
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        end = time.perf_counter()
+        nStates = sum(len(r.states) for r in batch)
+        with self.statsLock:
+            self.nBatches += 1
+            self.nRequests += len(batch)
+            self.nStates += nStates
+            self.batchSizes.append(nStates)
+            for request in batch:
+                self.latencies.append(end - request.start)
+        for request in batch:
+            request.done.set()
+
+
+# ============================================
+#             PolicyRequestHandler
+# ============================================
+class PolicyRequestHandler(BaseHTTPRequestHandler):
+    """
+    Endpoints:
+
+        * GET /info: the expected state shape and number of actions
+        * GET /stats: the batcher's latency and throughput counters
+        * POST /act: the greedy action for each state
+        * POST /q: the Q-values (and greedy action) for each state
+
+    States are sent either as json ({"states": [...]} with shape
+    (N, C, H, W), or {"state": [...]} for a single state) or as the
+    raw bytes of a float32 array with content type
+    application/octet-stream. The states are expected to have already
+    been through the pipeline.
+    """
+
+    # Set by make_server
+    policy = None
+    nActions = None
+
+    # -----
+    # do_GET
+    # -----
+    def do_GET(self) -> None:
+        if self.path == "/stats":
+            self._send(200, self.policy.stats())
+        elif self.path == "/info":
+            info = {
+                "stateShape": list(self.policy.stateShape),
+                "nActions": self.nActions,
+                "maxBatch": self.policy.maxBatch,
+                "maxWaitMs": 1000.0 * self.policy.maxWait,
+            }
+            self._send(200, info)
+        else:
+            self._send(404, {"error": f"Unknown endpoint: {self.path}"})
+
+    # -----
+    # do_POST
+    # -----
+    def do_POST(self) -> None:
+        if self.path not in ("/act", "/q"):
+            self._send(404, {"error": f"Unknown endpoint: {self.path}"})
+            return
+        try:
+            states = self._read_states()
+            qVals = self.policy.q_values(states)
+        except (TypeError, ValueError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        except RuntimeError as e:
+            self._send(500, {"error": str(e.__cause__ or e)})
+            return
+        response = {"actions": torch.argmax(qVals, 1).tolist()}
+        if self.path == "/q":
+            response["qValues"] = qVals.float().tolist()
+        self._send(200, response)
+
+    # -----
+    # log_message
+    # -----
+    def log_message(self, format: str, *args) -> None:
+        # Logging every request would cost more than serving it
+        pass
+
+    # -----
+    # _read_states
+    # -----
+    def _read_states(self) -> torch.Tensor:
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        contentType = self.headers.get("Content-Type", "application/json")
+        if contentType.startswith("application/octet-stream"):
+            states = np.frombuffer(body, dtype=np.float32)
+            stateSize = int(np.prod(self.policy.stateShape))
+            if states.size == 0 or states.size % stateSize != 0:
+                raise ValueError("Body isn't a whole number of states.")
+            states = states.reshape((-1,) + self.policy.stateShape)
+            # frombuffer gives a read-only array
+            return torch.from_numpy(states.copy())
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid json: {e}")
+        if "states" in payload:
+            states = payload["states"]
+        elif "state" in payload:
+            states = [payload["state"]]
+        else:
+            raise ValueError("Expected a `states` or `state` field.")
+        return torch.tensor(states, dtype=torch.float32)
+
+    # -----
+    # _send
+    # -----
+    def _send(self, code: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# ============================================
+#           UnixThreadingHTTPServer
+# ============================================
+class UnixThreadingHTTPServer(ThreadingHTTPServer):
+    """
+    An http server that listens on a unix socket instead of a port.
+    """
+
+    address_family = socket.AF_UNIX
+
+    # -----
+    # server_bind
+    # -----
+    def server_bind(self) -> None:
+        # HTTPServer.server_bind expects a (host, port) address
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+    # -----
+    # get_request
+    # -----
+    def get_request(self) -> Tuple:
+        # Unix sockets have no client address, but the handler expects
+        # a (host, port) one
+        request, _ = self.socket.accept()
+        return request, ("local", 0)
+
+
+# ============================================
+#                make_server
+# ============================================
+def make_server(
+    policy: BatchingPolicy,
+    nActions: int,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    socketPath: str = None,
+) -> ThreadingHTTPServer:
+    """
+    Each connection is handled in its own thread, and those threads
+    all feed the policy's batcher. If `socketPath` is given, the server
+    listens there instead of on `host`:`port`.
+    """
+    handler = type(
+        "BoundPolicyRequestHandler",
+        (PolicyRequestHandler,),
+        {"policy": policy, "nActions": nActions},
+    )
+    if socketPath is not None:
+        # Clear out a socket left behind by a previous server, but
+        # never anything else
+        if os.path.exists(socketPath):
+            if not stat.S_ISSOCK(os.stat(socketPath).st_mode):
+                raise ValueError(f"`{socketPath}` exists and isn't a socket.")
+            os.remove(socketPath)
+        server = UnixThreadingHTTPServer(socketPath, handler)
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
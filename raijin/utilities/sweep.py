@@ -0,0 +1,436 @@
+import copy
+import itertools
+import math
+import os
+import queue
+import random
+from typing import Callable
+from typing import Dict
+from typing import List
+
+import numpy as np
+from omegaconf import OmegaConf as config
+from omegaconf.dictconfig import DictConfig
+import torch
+import torch.multiprocessing as mp
+
+from raijin.utilities.io_utilities import sanitize_path
+from raijin.utilities.register import registry
+
+
+# ============================================
+#                   Sweep
+# ============================================
+class Sweep:
+    """
+    Trains a number of variants (trials) of a parameter file at the same
+    time.
+
+    The variants are described by a sweep file (see sweep.yaml). Its
+    `parameters` section maps dotted keys of the parameter file (e.g.,
+    `optimizers.optimizer1.lr`) to the values to try:
+
+        * grid: every combination of the listed values
+        * random: `nTrials` draws, each value picked from its list or
+            from a `low`/`high` range (optionally `log` scaled and/or
+            `integer`), seeded with `seed`
+
+    Each trial runs in its own process, pinned to `coresPerTrial`
+    cores, and writes to its own directory under the parameter file's
+    output directory. At most `maxConcurrent` trials run at once (by
+    default as many as there are cores for). When there are more
+    trials than that, the rest wait and take over the cores of the
+    trials that finish or are stopped.
+
+    If the sweep file has a `halving` section, poor trials are stopped
+    early with successive halving (see `SuccessiveHalving`).
+
+    A trial's score is its mean episode reward over the last `window`
+    episodes it played.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        params: DictConfig,
+        sweepParams: DictConfig,
+        progress: Callable = None,
+    ) -> None:
+        if getattr(registry[params.trainer.name], "offline", False):
+            raise ValueError("Offline trainers can't be swept.")
+        self.params = params
+        self.progress = progress
+        self.outputDir = sanitize_path(params.io.outputDir)
+        self.window = sweepParams.get("window", 10)
+        self.trials = [
+            {
+                "id": i,
+                "settings": settings,
+                "status": "pending",
+                "episodes": 0,
+                "score": None,
+                "cores": [],
+                "outputDir": os.path.join(self.outputDir, f"trial-{i:03d}"),
+            }
+            for i, settings in enumerate(expand_trials(sweepParams))
+        ]
+        # Checked up front so that a typo doesn't surface as a failed
+        # trial partway through the sweep
+        for trial in self.trials:
+            apply_settings(params, trial["settings"], trial["outputDir"])
+        self.slots = self._get_slots(
+            sweepParams.get("coresPerTrial", 1),
+            sweepParams.get("maxConcurrent"),
+        )
+        self.halving = None
+        if sweepParams.get("halving") is not None:
+            self.halving = SuccessiveHalving(
+                params.trainer.nEpisodes,
+                sweepParams.halving.get("minEpisodes", 10),
+                sweepParams.halving.get("eta", 3),
+            )
+        self.running = {}
+
+    # -----
+    # run
+    # -----
+    def run(self) -> List[Dict]:
+        """
+        Runs every trial and returns them from best to worst.
+        """
+        context = mp.get_context("spawn")
+        self.messages = context.Queue()
+        pending = list(self.trials)
+        freeSlots = list(range(len(self.slots)))
+        try:
+            while pending or self.running:
+                while pending and freeSlots:
+                    self._start(pending.pop(0), freeSlots.pop(0), context)
+                try:
+                    message = self.messages.get(timeout=0.1)
+                except queue.Empty:
+                    freeSlots.extend(self._check_processes())
+                    continue
+                slot = self._handle(message)
+                if slot is not None:
+                    freeSlots.append(slot)
+        finally:
+            for process, _, _ in self.running.values():
+                process.terminate()
+        return self.summary()
+
+    # -----
+    # summary
+    # -----
+    def summary(self) -> List[Dict]:
+        """
+        The trials from best to worst. Scores from different numbers of
+        episodes can't be compared, so the trials that got further
+        (survived more rungs) come first, and are then ordered by score.
+        Trials without a score (they failed before finishing an
+        episode) go last.
+        """
+        return sorted(
+            self.trials,
+            key=lambda t: (
+                t["episodes"],
+                -math.inf if t["score"] is None else t["score"],
+            ),
+            reverse=True,
+        )
+
+    # -----
+    # save
+    # -----
+    def save(self) -> str:
+        """
+        Writes the summary to sweep.yaml in the output directory and
+        returns its path.
+        """
+        fileName = os.path.join(self.outputDir, "sweep.yaml")
+        os.makedirs(self.outputDir, exist_ok=True)
+        config.save(config.create({"trials": self.summary()}), fileName)
+        return fileName
+
+    # -----
+    # _get_slots
+    # -----
+    def _get_slots(self, coresPerTrial: int, maxConcurrent: int) -> List:
+        """
+        Splits the available cores into groups of `coresPerTrial`, one
+        per concurrent trial. If more concurrent trials are asked for
+        than there are cores for, the groups wrap around and share
+        cores.
+        """
+        available = sorted(os.sched_getaffinity(0))
+        if maxConcurrent is None:
+            maxConcurrent = max(1, len(available) // coresPerTrial)
+        return [
+            sorted(
+                set(
+                    available[(i * coresPerTrial + j) % len(available)]
+                    for j in range(coresPerTrial)
+                )
+            )
+            for i in range(maxConcurrent)
+        ]
+
+    # -----
+    # _start
+    # -----
+    def _start(self, trial: Dict, slot: int, context) -> None:
+        params = apply_settings(
+            self.params, trial["settings"], trial["outputDir"]
+        )
+        rungs = self.halving.rungs if self.halving is not None else []
+        verdicts = context.SimpleQueue()
+        process = context.Process(
+            target=sweep_trial_worker,
+            args=(
+                trial["id"],
+                params,
+                self.slots[slot],
+                rungs,
+                self.window,
+                self.messages,
+                verdicts,
+            ),
+            name=f"raijin-trial-{trial['id']}",
+            daemon=True,
+        )
+        process.start()
+        self.running[trial["id"]] = (process, verdicts, slot)
+        trial["status"] = "running"
+        trial["cores"] = self.slots[slot]
+        self._report(trial, "started")
+
+    # -----
+    # _handle
+    # -----
+    def _handle(self, message: tuple) -> int:
+        """
+        Updates the trial a worker's message is about. Returns the slot
+        the trial was running in if it's over.
+        """
+        kind, trialId, *data = message
+        trial = self.trials[trialId]
+        if kind == "episode":
+            trial["episodes"] = data[0]
+            return None
+        if kind == "rung":
+            nEpisodes, score = data
+            trial["score"] = score
+            keep = self.halving.keep(nEpisodes, score)
+            self.running[trialId][1].put(keep)
+            if not keep:
+                trial["status"] = "stopped"
+                self._report(trial, "stopped")
+            return None
+        process, _, slot = self.running.pop(trialId)
+        process.join()
+        if kind == "error":
+            trial["status"] = "failed"
+            trial["error"] = data[0]
+            self._report(trial, "failed")
+            return slot
+        trial["score"] = data[0]
+        if trial["status"] == "running":
+            trial["status"] = "completed"
+            self._report(trial, "completed")
+        return slot
+
+    # -----
+    # _check_processes
+    # -----
+    def _check_processes(self) -> List[int]:
+        """
+        Catches trials whose process died without saying so (e.g.,
+        killed for running out of memory) and returns their slots.
+        """
+        slots = []
+        for trialId, (process, _, slot) in list(self.running.items()):
+            if process.exitcode is not None and process.exitcode != 0:
+                del self.running[trialId]
+                trial = self.trials[trialId]
+                trial["status"] = "failed"
+                trial["error"] = f"Exited with code {process.exitcode}"
+                self._report(trial, "failed")
+                slots.append(slot)
+        return slots
+
+    # -----
+    # _report
+    # -----
+    def _report(self, trial: Dict, event: str) -> None:
+        if self.progress is not None:
+            self.progress(trial, event)
+
+
+# ============================================
+#             SuccessiveHalving
+# ============================================
+class SuccessiveHalving:
+    """
+    Decides which trials to stop early (asynchronous successive
+    halving).
+
+    Trials are compared at rungs: after `minEpisodes` episodes, then
+    `eta` times as many, and so on up to the number of episodes they
+    train for. A trial that reaches a rung carries on only if its
+    score is in the top 1/`eta` of the scores recorded at that rung so
+    far. Since the trials run at the same time, nobody waits for the
+    rest of the rung to catch up: the first trials to get there are
+    compared against fewer scores, which keeps every core busy at the
+    cost of stopping slightly fewer trials.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, nEpisodes: int, minEpisodes: int, eta: int) -> None:
+        if minEpisodes < 1 or eta < 2:
+            raise ValueError("Halving needs minEpisodes >= 1 and eta >= 2.")
+        self.eta = eta
+        self.rungs = []
+        rung = minEpisodes
+        while rung < nEpisodes:
+            self.rungs.append(rung)
+            rung *= eta
+        self.scores = {rung: [] for rung in self.rungs}
+
+    # -----
+    # keep
+    # -----
+    def keep(self, rung: int, score: float) -> bool:
+        """
+        Records the score of a trial that has reached the rung and
+        returns whether it should carry on.
+        """
+        scores = self.scores[rung]
+        scores.append(score)
+        cutoff = np.percentile(scores, 100 * (1 - 1 / self.eta))
+        return score >= cutoff
+
+
+# ============================================
+#               expand_trials
+# ============================================
+def expand_trials(sweepParams: DictConfig) -> List[Dict]:
+    """
+    Returns the settings (dotted key -> value) of each trial described
+    by the sweep file.
+    """
+    space = config.to_container(sweepParams.parameters, resolve=True)
+    method = sweepParams.get("method", "grid")
+    if method == "grid":
+        for key, values in space.items():
+            if not isinstance(values, list):
+                raise ValueError(f"Grid values for `{key}` must be a list.")
+        return [
+            dict(zip(space.keys(), values))
+            for values in itertools.product(*space.values())
+        ]
+    if method == "random":
+        rng = random.Random(sweepParams.get("seed", 0))
+        return [
+            {key: sample_value(values, rng) for key, values in space.items()}
+            for _ in range(sweepParams.nTrials)
+        ]
+    raise ValueError(f"Unknown sweep method `{method}`.")
+
+
+# ============================================
+#               sample_value
+# ============================================
+def sample_value(values, rng: random.Random):
+    if isinstance(values, list):
+        return rng.choice(values)
+    low, high = values["low"], values["high"]
+    if values.get("log", False):
+        value = math.exp(rng.uniform(math.log(low), math.log(high)))
+    else:
+        value = rng.uniform(low, high)
+    if values.get("integer", False):
+        value = int(round(value))
+    return value
+
+
+# ============================================
+#               apply_settings
+# ============================================
+def apply_settings(
+    params: DictConfig, settings: Dict, outputDir: str
+) -> DictConfig:
+    """
+    Returns a copy of the parameters with the trial's settings merged
+    in and its own output directory.
+    """
+    params = copy.deepcopy(params)
+    for key, value in settings.items():
+        parent = key.rpartition(".")[0]
+        if parent and config.select(params, parent) is None:
+            raise ValueError(f"`{parent}` isn't in the parameter file.")
+        nested = value
+        for part in reversed(key.split(".")):
+            nested = {part: nested}
+        params = config.merge(params, nested)
+    params.io.outputDir = outputDir
+    return params
+
+
+# ============================================
+#            sweep_trial_worker
+# ============================================
+def sweep_trial_worker(
+    trialId: int,
+    params: DictConfig,
+    cores: List[int],
+    rungs: List[int],
+    window: int,
+    messages,
+    verdicts,
+) -> None:
+    """
+    Trains one trial. Reports each episode and, at each rung, the
+    trial's score, then waits to hear whether to carry on. Whether it
+    finishes or is stopped, the trial's parameters and final model are
+    saved.
+    """
+    # Imported here to avoid a circular import, since io.write and the
+    # managers both depend on the trainers
+    from raijin.io.write import save_checkpoint
+    from raijin.io.write import save_final_model
+    from raijin.io.write import save_params
+    from raijin.utilities.managers import get_scheduler
+    from raijin.utilities.managers import get_trainer
+
+    # Everything this process starts, including the core scheduler's
+    # roles, stays within the trial's cores
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+    try:
+        trainer = get_trainer(params)
+        trainer.scheduler = get_scheduler(params)
+        trainer.pre_train()
+        rewards = trainer.metrics["episodeRewards"]
+        for trainer.episode in range(trainer.nEpisodes):
+            trainer.train_step_start()
+            trainer.train()
+            trainer.train_step_end()
+            messages.put(("episode", trialId, trainer.episode + 1))
+            if trainer.episode % params.io.checkpointFreq == 0:
+                save_checkpoint(trainer, params)
+            if trainer.episode + 1 in rungs:
+                score = float(np.mean(rewards[-window:]))
+                messages.put(("rung", trialId, trainer.episode + 1, score))
+                if not verdicts.get():
+                    break
+        trainer.post_train()
+        save_params(params.io.outputDir, params)
+        save_final_model(trainer, params.io.checkpointBase, params.io.outputDir)
+        messages.put(("done", trialId, float(np.mean(rewards[-window:]))))
+    except Exception as e:
+        messages.put(("error", trialId, f"{type(e).__name__}: {e}"))
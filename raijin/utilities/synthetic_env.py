@@ -0,0 +1,96 @@
+import numpy as np
+
+
+# ============================================
+#               DiscreteSpace
+# ============================================
+class DiscreteSpace:
+    """
+    The parts of gym's `Discrete` space that the agent uses.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, n: int, rng: np.random.Generator) -> None:
+        self.n = n
+        self.rng = rng
+
+    # -----
+    # sample
+    # -----
+    def sample(self) -> int:
+        return int(self.rng.integers(self.n))
+
+
+# ============================================
+#             SyntheticAtariEnv
+# ============================================
+class SyntheticAtariEnv:
+    """
+    A stand-in for an Atari env (old gym api) that emits 210x160x3
+    uint8 frames, for benchmarking and for trying things out without
+    a ROM. Use it by setting the env's name to `envName`.
+
+    Stepping costs next to nothing: the frames are drawn from a small
+    pool of random frames made up front, and the rewards are random.
+    An episode ends after `episodeLength` steps. The frames are shared
+    between steps, so they mustn't be changed in place (nothing in
+    raijin does).
+    """
+
+    envName = "RaijinSynthetic-v0"
+
+    # -----
+    # constructor
+    # -----
+    def __init__(
+        self,
+        episodeLength: int = 1000,
+        nActions: int = 6,
+        poolSize: int = 16,
+        seed: int = 0,
+    ) -> None:
+        self.episodeLength = episodeLength
+        self.rng = np.random.default_rng(seed)
+        self.action_space = DiscreteSpace(nActions, self.rng)
+        self.frames = self.rng.integers(
+            0, 256, (poolSize, 210, 160, 3), dtype=np.uint8
+        )
+        self.rewards = self.rng.random(episodeLength).astype(np.float32)
+        self.t = 0
+
+    # -----
+    # reset
+    # -----
+    def reset(self) -> np.ndarray:
+        self.t = 0
+        return self.frames[0]
+
+    # -----
+    # step
+    # -----
+    def step(self, action: int) -> tuple:
+        self.t += 1
+        frame = self.frames[self.t % len(self.frames)]
+        reward = float(self.rewards[self.t % self.episodeLength])
+        return frame, reward, self.t >= self.episodeLength, {}
+
+    # -----
+    # seed
+    # -----
+    def seed(self, seed: int = None) -> None:
+        self.rng = np.random.default_rng(seed)
+        self.action_space.rng = self.rng
+
+    # -----
+    # clone_full_state
+    # -----
+    def clone_full_state(self) -> np.ndarray:
+        return np.array([self.t])
+
+    # -----
+    # restore_full_state
+    # -----
+    def restore_full_state(self, state: np.ndarray) -> None:
+        self.t = int(state[0])
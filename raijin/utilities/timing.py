@@ -0,0 +1,172 @@
+import contextlib
+import threading
+import time
+from typing import Dict
+
+import numpy as np
+
+
+# ============================================
+#                 PhaseTimer
+# ============================================
+class PhaseTimer:
+    """
+    Accumulates the durations of one phase (e.g., `env.step`).
+
+    The count and total cover every call. For the percentiles, the
+    last `maxSamples` durations are kept in a ring buffer, so memory
+    stays bounded on long runs and the percentiles describe the most
+    recent stretch of training.
+    """
+
+    __slots__ = ("count", "total", "samples", "maxSamples")
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, maxSamples: int) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.maxSamples = maxSamples
+        self.samples = np.empty(maxSamples, dtype=np.float64)
+
+    # -----
+    # add
+    # -----
+    def add(self, seconds: float) -> None:
+        self.samples[self.count % self.maxSamples] = seconds
+        self.count += 1
+        self.total += seconds
+
+    # -----
+    # summary
+    # -----
+    def summary(self, elapsed: float) -> Dict:
+        samples = self.samples[: min(self.count, self.maxSamples)]
+        p50, p90, p99 = np.percentile(samples, (50, 90, 99)) * 1000.0
+        return {
+            "count": self.count,
+            "totalSec": self.total,
+            "meanMs": 1000.0 * self.total / self.count,
+            "p50Ms": float(p50),
+            "p90Ms": float(p90),
+            "p99Ms": float(p99),
+            "perSec": self.count / elapsed,
+            "share": self.total / elapsed,
+        }
+
+
+# ============================================
+#                  _Timing
+# ============================================
+class _Timing:
+    __slots__ = ("phase", "start")
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, phase: PhaseTimer) -> None:
+        self.phase = phase
+
+    # -----
+    # __enter__
+    # -----
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    # -----
+    # __exit__
+    # -----
+    def __exit__(self, *exc) -> None:
+        self.phase.add(time.perf_counter() - self.start)
+
+
+# ============================================
+#                   Timers
+# ============================================
+class Timers:
+    """
+    Times the phases of the hot path. Code to be timed is wrapped in
+
+        with timers.time("env.step"):
+            ...
+
+    where `timers` is the module-level instance. Until `enable` is
+    called, `time` hands back a shared do-nothing context manager, so
+    the cost of leaving the instrumentation in is one method call and
+    an attribute check.
+
+    Phases can be timed from more than one thread (e.g., the actor and
+    learner threads of the `AsyncQTrainer`), but each phase should
+    only be timed from one of them.
+    """
+
+    # -----
+    # constructor
+    # -----
+    def __init__(self, maxSamples: int = 100000) -> None:
+        self.maxSamples = maxSamples
+        self.enabled = False
+        self.phases = {}
+        self.startTime = None
+        self.lock = threading.Lock()
+        self._null = contextlib.nullcontext()
+
+    # -----
+    # enable
+    # -----
+    def enable(self) -> None:
+        """
+        Starts timing from scratch.
+        """
+        self.phases = {}
+        self.startTime = time.perf_counter()
+        self.enabled = True
+
+    # -----
+    # disable
+    # -----
+    def disable(self) -> None:
+        self.enabled = False
+
+    # -----
+    # time
+    # -----
+    def time(self, name: str):
+        if not self.enabled:
+            return self._null
+        phase = self.phases.get(name)
+        if phase is None:
+            with self.lock:
+                phase = self.phases.setdefault(
+                    name, PhaseTimer(self.maxSamples)
+                )
+        return _Timing(phase)
+
+    # -----
+    # report
+    # -----
+    def report(self) -> Dict:
+        """
+        Returns the wall time since timing was enabled, the env steps
+        and updates per second, and a summary of each phase (see
+        `PhaseTimer.summary`), slowest first. `share` is the fraction
+        of the wall time spent in the phase. Phases timed on different
+        threads overlap, so the shares can add up to more than one.
+        """
+        elapsed = max(time.perf_counter() - self.startTime, 1e-9)
+        phases = {
+            name: phase.summary(elapsed)
+            for name, phase in sorted(
+                self.phases.items(), key=lambda item: -item[1].total
+            )
+        }
+        return {
+            "elapsedSec": elapsed,
+            "envStepsPerSec": phases.get("env.step", {}).get("perSec", 0.0),
+            "updatesPerSec": phases.get("learn", {}).get("perSec", 0.0),
+            "phases": phases,
+        }
+
+
+timers = Timers()
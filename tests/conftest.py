@@ -0,0 +1,32 @@
+from typing import Callable
+
+import pytest
+import torch
+
+from raijin.memory.experience import Experience
+
+
+# ============================================
+#              make_experiences
+# ============================================
+@pytest.fixture
+def make_experiences() -> Callable:
+    """
+    Returns a function that makes `n` experiences with random states
+    of the given shape. Each experience's action is its index, so the
+    order they were stored in can be checked.
+    """
+
+    def make(n: int, shape: tuple = (4, 8, 8)) -> list:
+        return [
+            Experience(
+                torch.rand(shape),
+                i,
+                float(i % 3),
+                torch.rand(shape),
+                i % 5 == 0,
+            )
+            for i in range(n)
+        ]
+
+    return make
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+from omegaconf import OmegaConf as config
+
+from raijin.io.checkpoint_store import CheckpointStore
+from raijin.memory.qmemory import QMemory
+
+
+# ============================================
+#                 add_checkpoint
+# ============================================
+def add_checkpoint(store: CheckpointStore, episode: int, memory) -> int:
+    return store.add(
+        config.create({"trainer": {"name": "QTrainer"}}),
+        {"episodeRewards": [1.0, 2.0]},
+        {"QTrainer": {"episodeNum": episode}},
+        memory,
+    )
+
+
+# ============================================
+#                  blob_names
+# ============================================
+def blob_names(store: CheckpointStore) -> set:
+    names = set()
+    for prefix in os.listdir(store.blobDir):
+        names.update(os.listdir(os.path.join(store.blobDir, prefix)))
+    return names
+
+
+# ============================================
+#              test_dedupes_blobs
+# ============================================
+def test_dedupes_blobs(tmp_path, make_experiences) -> None:
+    store = CheckpointStore(str(tmp_path), segmentSize=4)
+    memory = QMemory(config.create({"capacity": 100}))
+    experiences = make_experiences(14)
+    for experience in experiences[:10]:
+        memory.add(experience)
+    add_checkpoint(store, 0, memory)
+    for experience in experiences[10:]:
+        memory.add(experience)
+    add_checkpoint(store, 1, memory)
+    first, second = store.manifest["checkpoints"]
+    # Unchanged pieces are stored once
+    assert first["params"] == second["params"]
+    assert first["metrics"] == second["metrics"]
+    assert first["stateDicts"] != second["stateDicts"]
+    # The two full segments are reused, the partial one is rewritten
+    # and a new full one is added
+    segments = [s["blob"] for s in first["memory"]["segments"]]
+    newSegments = [s["blob"] for s in second["memory"]["segments"]]
+    assert newSegments[:2] == segments[:2]
+    assert newSegments[2] != segments[2]
+    assert len(newSegments) == 4
+    # params, metrics, two state dicts, and five memory segments
+    assert len(blob_names(store)) == 9
+
+
+# ============================================
+#              test_retention
+# ============================================
+def test_retention(tmp_path, make_experiences) -> None:
+    store = CheckpointStore(str(tmp_path), keepLast=2, keepEvery=3)
+    memory = QMemory(config.create({"capacity": 100}))
+    for episode, experience in enumerate(make_experiences(7)):
+        memory.add(experience)
+        add_checkpoint(store, episode, memory)
+    assert store.ids() == [0, 3, 5, 6]
+    # Only the blobs of the kept checkpoints are left
+    assert blob_names(store) == store._referenced_blobs()
+    # The manifest is read back the same
+    assert CheckpointStore(str(tmp_path)).ids() == [0, 3, 5, 6]
+
+
+# ============================================
+#            test_restores_memory
+# ============================================
+def test_restores_memory(tmp_path, make_experiences) -> None:
+    store = CheckpointStore(str(tmp_path), segmentSize=4)
+    memory = QMemory(config.create({"capacity": 6}))
+    for experience in make_experiences(11):
+        memory.add(experience)
+        add_checkpoint(store, 0, memory)
+    restored = QMemory(config.create({"capacity": 6}))
+    store.load_memory(store.latest(), restored)
+    assert restored.nAdded == memory.nAdded
+    assert len(restored) == len(memory)
+    expected = memory.get_arrays(0, len(memory))
+    actual = restored.get_arrays(0, len(restored))
+    for name, array in expected.items():
+        np.testing.assert_array_equal(actual[name], array)
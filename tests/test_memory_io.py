@@ -0,0 +1,55 @@
+import numpy as np
+from omegaconf import OmegaConf as config
+import pytest
+
+from raijin.io.read import load_memory
+from raijin.io.read import map_memory
+from raijin.io.write import save_memory
+from raijin.memory.qmemory import QMemory
+
+
+# ============================================
+#                make_memory
+# ============================================
+def make_memory(experiences: list, capacity: int = 16) -> QMemory:
+    memory = QMemory(config.create({"capacity": capacity}))
+    for experience in experiences:
+        memory.add(experience)
+    return memory
+
+
+# ============================================
+#              assert_same_buffer
+# ============================================
+def assert_same_buffer(memory: QMemory, loaded: QMemory) -> None:
+    assert len(loaded) == len(memory)
+    expected = memory.get_arrays(0, len(memory))
+    actual = loaded.get_arrays(0, len(loaded))
+    for name, array in expected.items():
+        np.testing.assert_array_equal(actual[name], array)
+
+
+# ============================================
+#              test_round_trip
+# ============================================
+@pytest.mark.parametrize("loader", [load_memory, map_memory])
+@pytest.mark.parametrize("compression", [None, "lzf"])
+def test_round_trip(tmp_path, make_experiences, loader, compression) -> None:
+    # More experiences than fit, so the buffer has wrapped around
+    memory = make_memory(make_experiences(20))
+    # A small block size makes the buffer get written in several parts
+    save_memory(memory, str(tmp_path), compression, blockBytes=2000)
+    loaded = loader(QMemory(config.create({"capacity": 16})), str(tmp_path))
+    assert_same_buffer(memory, loaded)
+    # The oldest experiences were pushed out
+    assert loaded.get_arrays(0, 1)["actions"][0] == 4
+
+
+# ============================================
+#            test_empty_round_trip
+# ============================================
+@pytest.mark.parametrize("loader", [load_memory, map_memory])
+def test_empty_round_trip(tmp_path, loader) -> None:
+    save_memory(make_memory([]), str(tmp_path))
+    loaded = loader(QMemory(config.create({"capacity": 16})), str(tmp_path))
+    assert len(loaded) == 0
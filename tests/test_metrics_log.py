@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from raijin.io.metrics_log import MetricsStream
+from raijin.io.metrics_log import read_metrics_stream
+
+
+fields = (("episode", "<i8"), ("value", "<f4"))
+
+
+# ============================================
+#                write_stream
+# ============================================
+def write_stream(path: str) -> None:
+    """
+    Writes two records for each of episodes 0 through 4.
+    """
+    stream = MetricsStream(path, fields)
+    stream.write(
+        [(episode, episode + 0.5 * i) for episode in range(5) for i in range(2)]
+    )
+    stream.close()
+
+
+# ============================================
+#          test_truncates_on_resume
+# ============================================
+def test_truncates_on_resume(tmp_path) -> None:
+    path = str(tmp_path / "steps.bin")
+    write_stream(path)
+    stream = MetricsStream(path, fields, startEpisode=3)
+    assert stream.nWritten == 0
+    assert tuple(stream.lastRecord) == (2, 2.5)
+    # Training picks back up from episode 3
+    stream.write([(3, 30.0)])
+    stream.close()
+    records = read_metrics_stream(path)
+    np.testing.assert_array_equal(records["episode"], [0, 0, 1, 1, 2, 2, 3])
+    assert records["value"][-1] == 30.0
+
+
+# ============================================
+#        test_resume_before_any_records
+# ============================================
+def test_resume_before_any_records(tmp_path) -> None:
+    path = str(tmp_path / "steps.bin")
+    write_stream(path)
+    # Resuming at an episode past the ones written keeps them all
+    stream = MetricsStream(path, fields, startEpisode=10)
+    stream.close()
+    assert len(read_metrics_stream(path)["episode"]) == 10
+    assert tuple(stream.lastRecord) == (4, 4.5)
+
+
+# ============================================
+#          test_overwrites_new_run
+# ============================================
+def test_overwrites_new_run(tmp_path) -> None:
+    path = str(tmp_path / "steps.bin")
+    write_stream(path)
+    MetricsStream(path, fields).close()
+    assert len(read_metrics_stream(path, mmap=True)["episode"]) == 0
+
+
+# ============================================
+#           test_rejects_new_layout
+# ============================================
+def test_rejects_new_layout(tmp_path) -> None:
+    path = str(tmp_path / "steps.bin")
+    write_stream(path)
+    with pytest.raises(ValueError):
+        MetricsStream(path, (("episode", "<i8"),), startEpisode=3)
@@ -0,0 +1,79 @@
+import torch
+
+from raijin.agents.qvalue_cache import QValueCache
+
+
+# ============================================
+#                  make_net
+# ============================================
+def make_net() -> torch.nn.Module:
+    return torch.nn.Sequential(torch.nn.Flatten(), torch.nn.Linear(8, 3))
+
+
+# ============================================
+#                 make_cache
+# ============================================
+def make_cache(nEntries: int) -> QValueCache:
+    """
+    Returns a cache with room for exactly `nEntries` of `make_net`'s
+    outputs.
+    """
+    entryBytes = 16 + 3 * 4 + QValueCache._entryOverhead
+    return QValueCache(nEntries * entryBytes)
+
+
+# ============================================
+#           test_evicts_least_recent
+# ============================================
+def test_evicts_least_recent() -> None:
+    net = make_net()
+    cache = make_cache(2)
+    a, b, c = torch.rand(3, 2, 2, 2)
+    cache.q_values(net, a)
+    cache.q_values(net, b)
+    # Using a makes b the least recently used
+    cache.q_values(net, a)
+    cache.q_values(net, c)
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert (cache.hits, cache.misses) == (1, 3)
+    cache.q_values(net, a)
+    assert cache.hits == 2
+    cache.q_values(net, b)
+    assert cache.misses == 4
+    assert cache.nBytes <= cache.maxBytes
+
+
+# ============================================
+#             test_cached_values
+# ============================================
+def test_cached_values() -> None:
+    net = make_net()
+    cache = make_cache(4)
+    state = torch.rand(2, 2, 2)
+    first = cache.q_values(net, state)
+    assert first.shape == (1, 3)
+    assert torch.equal(cache.q_values(net, state.clone()), first)
+    assert cache.hits == 1
+
+
+# ============================================
+#           test_new_network_clears
+# ============================================
+def test_new_network_clears() -> None:
+    cache = make_cache(4)
+    state = torch.rand(2, 2, 2)
+    cache.q_values(make_net(), state)
+    cache.q_values(make_net(), state)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert len(cache) == 1
+
+
+# ============================================
+#           test_oversized_entry
+# ============================================
+def test_oversized_entry() -> None:
+    cache = QValueCache(16)
+    cache.q_values(make_net(), torch.rand(2, 2, 2))
+    assert len(cache) == 0
+    assert cache.nBytes == 0
@@ -0,0 +1,61 @@
+import subprocess
+import sys
+
+
+# Modules that must not be imported just to start the command line
+heavyModules = ("torch", "h5py", "gym", "numpy", "omegaconf", "pretty_errors")
+
+
+# ============================================
+#               loaded_modules
+# ============================================
+def loaded_modules(snippet: str) -> list:
+    """
+    Runs the snippet in a fresh interpreter and returns the heavy
+    modules it loaded.
+    """
+    code = (
+        "import sys\n"
+        f"{snippet}\n"
+        f"print(' '.join(m for m in {heavyModules!r} if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return out.stdout.split()
+
+
+# ============================================
+#             test_import_is_light
+# ============================================
+def test_import_is_light() -> None:
+    assert loaded_modules("import raijin") == []
+
+
+# ============================================
+#              test_app_is_light
+# ============================================
+def test_app_is_light() -> None:
+    snippet = (
+        "from raijin.console.app import RaijinApplication\n"
+        "RaijinApplication()"
+    )
+    assert loaded_modules(snippet) == []
+
+
+# ============================================
+#              test_run_is_light
+# ============================================
+def test_run_is_light() -> None:
+    assert loaded_modules("import raijin.console.run") == []
+
+
+# ============================================
+#            test_managers_is_light
+# ============================================
+def test_managers_is_light() -> None:
+    # The io and multiprocessing helpers are imported when they're used
+    assert "h5py" not in loaded_modules("import raijin.utilities.managers")
@@ -0,0 +1,55 @@
+import pytest
+
+from raijin.utilities.sweep import SuccessiveHalving
+
+
+# ============================================
+#                test_rungs
+# ============================================
+def test_rungs() -> None:
+    halving = SuccessiveHalving(100, 4, 3)
+    assert halving.rungs == [4, 12, 36]
+    # A trial that's only as long as the first rung has nothing to compare
+    assert SuccessiveHalving(4, 4, 3).rungs == []
+
+
+# ============================================
+#            test_invalid_settings
+# ============================================
+@pytest.mark.parametrize("minEpisodes, eta", [(0, 3), (4, 1)])
+def test_invalid_settings(minEpisodes: int, eta: int) -> None:
+    with pytest.raises(ValueError):
+        SuccessiveHalving(100, minEpisodes, eta)
+
+
+# ============================================
+#              test_first_is_kept
+# ============================================
+def test_first_is_kept() -> None:
+    halving = SuccessiveHalving(100, 4, 3)
+    assert halving.keep(4, -1000.0)
+
+
+# ============================================
+#               test_promotion
+# ============================================
+def test_promotion() -> None:
+    halving = SuccessiveHalving(100, 4, 3)
+    for score in range(9):
+        halving.keep(4, float(score))
+    # Only the top third of the rung's scores carry on
+    assert halving.keep(4, 8.0)
+    assert not halving.keep(4, 5.0)
+    # Each trial that improves on everything so far is promoted
+    assert all(halving.keep(12, float(score)) for score in range(5))
+
+
+# ============================================
+#          test_later_trials_stopped
+# ============================================
+def test_later_trials_stopped() -> None:
+    halving = SuccessiveHalving(100, 4, 2)
+    assert halving.keep(4, 10.0)
+    assert not halving.keep(4, 1.0)
+    # The rungs keep their own scores
+    assert halving.keep(8, 1.0)
@@ -0,0 +1,125 @@
+import os
+import time
+
+import numpy as np
+from omegaconf import OmegaConf as config
+import pytest
+
+from raijin.memory.tiered_memory import TieredMemory
+
+
+# ============================================
+#                   memory
+# ============================================
+@pytest.fixture
+def memory(tmp_path) -> TieredMemory:
+    """
+    A memory with two hot segments of 8 and ten cold ones.
+    """
+    params = {
+        "capacity": 100,
+        "segmentSize": 8,
+        "hotCapacity": 16,
+        "cacheSegments": 2,
+        "readAhead": 1,
+        "spillDir": str(tmp_path),
+    }
+    memory = TieredMemory(config.create(params))
+    yield memory
+    memory.close()
+
+
+# ============================================
+#               wait_for_cache
+# ============================================
+def wait_for_cache(memory: TieredMemory, timeout: float = 10.0) -> None:
+    # The pager fills the cache in the background
+    deadline = time.monotonic() + timeout
+    while not memory.cache and time.monotonic() < deadline:
+        memory.pagerWakeup.set()
+        time.sleep(0.01)
+    assert memory.cache
+
+
+# ============================================
+#             test_capacity_clamp
+# ============================================
+@pytest.mark.parametrize("extra", [{}, {"segmentSize": 64, "hotCapacity": 512}])
+def test_capacity_clamp(tmp_path, make_experiences, extra) -> None:
+    params = config.create(
+        {"capacity": 100, "spillDir": str(tmp_path), **extra}
+    )
+    memory = TieredMemory(params)
+    try:
+        for experience in make_experiences(250):
+            memory.add(experience)
+        assert memory.capacity <= 100
+        assert len(memory) <= 100
+    finally:
+        memory.close()
+
+
+# ============================================
+#               test_get_arrays
+# ============================================
+def test_get_arrays(memory, make_experiences) -> None:
+    experiences = make_experiences(200)
+    for experience in experiences:
+        memory.add(experience)
+    # Rounded down to a whole number of segments
+    assert memory.capacity == 96
+    assert len(memory) == 96
+    # The oldest experiences come from the cold tier's files
+    assert memory.coldFirst < memory.hotFirst
+    arrays = memory.get_arrays(0, len(memory))
+    np.testing.assert_array_equal(arrays["actions"], np.arange(104, 200))
+    np.testing.assert_array_equal(
+        arrays["states"][0], experiences[104].state.numpy()
+    )
+    np.testing.assert_array_equal(
+        arrays["nextStates"][-1], experiences[199].nextState.numpy()
+    )
+    # A block that spans the cold and hot tiers
+    hotStart = (memory.hotFirst - memory.coldFirst) * memory.segmentSize
+    arrays = memory.get_arrays(hotStart - 3, hotStart + 3)
+    np.testing.assert_array_equal(
+        arrays["actions"], np.arange(104 + hotStart - 3, 104 + hotStart + 3)
+    )
+
+
+# ============================================
+#                 test_sample
+# ============================================
+def test_sample(memory, make_experiences) -> None:
+    for experience in make_experiences(200):
+        memory.add(experience)
+    wait_for_cache(memory)
+    states, actions, rewards, nextStates, dones = memory.sample(8)
+    assert states.shape == nextStates.shape == (8, 4, 8, 8)
+    assert actions.shape == rewards.shape == dones.shape == (8, 1)
+    actions = actions.numpy().ravel()
+    assert len(set(actions)) == 8
+    assert np.all((actions >= 104) & (actions < 200))
+    # Half of the batch comes from the cached cold segments
+    hotStart = 104 + (memory.hotFirst - memory.coldFirst) * memory.segmentSize
+    assert np.sum(actions < hotStart) == 4
+    # Each sampled experience is the one stored with that action
+    np.testing.assert_array_equal(
+        rewards.numpy().ravel(), (actions % 3).astype(np.float32)
+    )
+
+
+# ============================================
+#             test_evicted_files
+# ============================================
+def test_evicted_files(memory, make_experiences) -> None:
+    for experience in make_experiences(400):
+        memory.add(experience)
+    # Let the spill thread finish before counting the files
+    deadline = time.monotonic() + 10.0
+    while memory.spillBuffers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Full segments are spilled as soon as they fill up, and the
+    # dropped ones are deleted
+    assert min(memory.coldFiles) == memory.coldFirst
+    assert len(os.listdir(memory.spillDir)) == len(memory.coldFiles)
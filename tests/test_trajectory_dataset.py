@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from raijin.io.trajectories import TrajectoryWriter
+from raijin.io.trajectories import get_trajectory_files
+from raijin.io.trajectory_dataset import ShardReader
+
+
+# Three episodes: the first two finish (rows 3 and 6) and the last is
+# cut off by the episode length
+episodes = np.array([0, 0, 0, 0, 1, 1, 1, 2, 2, 2], dtype=np.int64)
+dones = np.array([0, 0, 0, 1, 0, 0, 1, 0, 0, 0], dtype=np.uint8)
+
+
+# ============================================
+#              FramePipeline
+# ============================================
+class FramePipeline:
+    """
+    Leaves the frames as they are, so each frame's value is its row.
+    """
+
+    traceLen = 3
+
+    # -----
+    # process_frames
+    # -----
+    def process_frames(self, frames: np.ndarray) -> np.ndarray:
+        return frames
+
+
+# ============================================
+#            write_trajectories
+# ============================================
+def write_trajectories(outputDir: str, compression: str) -> str:
+    n = len(episodes)
+    block = {
+        "frames": np.arange(n, dtype=np.uint8)[:, None, None].repeat(2, 1),
+        "actions": np.arange(n, dtype=np.int32),
+        "rewards": np.ones(n, dtype=np.float32),
+        "dones": dones,
+        "episodes": episodes,
+    }
+    writer = TrajectoryWriter(outputDir, 2**20, compression)
+    writer.write(block, n)
+    writer.close()
+    return get_trajectory_files(outputDir)[0]
+
+
+# ============================================
+#                frame_rows
+# ============================================
+def frame_rows(shard: dict, key: str) -> list:
+    """
+    Returns the rows of the frames making up each state.
+    """
+    return shard["frames"][shard[key]][..., 0, 0].tolist()
+
+
+# ============================================
+#            test_rebuilds_stacks
+# ============================================
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_rebuilds_stacks(tmp_path, compression) -> None:
+    path = write_trajectories(str(tmp_path), compression)
+    shard = ShardReader(FramePipeline()).read(path, 0, 10)
+    # The last row has no next frame and is skipped
+    assert shard["actions"].tolist() == list(range(9))
+    # Frames from before the episode start repeat its first frame
+    assert frame_rows(shard, "stateIndices") == [
+        [0, 0, 0],
+        [0, 0, 1],
+        [0, 1, 2],
+        [1, 2, 3],
+        [4, 4, 4],
+        [4, 4, 5],
+        [4, 5, 6],
+        [7, 7, 7],
+        [7, 7, 8],
+    ]
+    # A finished episode's last next state is its state
+    assert frame_rows(shard, "nextStateIndices") == [
+        [0, 0, 1],
+        [0, 1, 2],
+        [1, 2, 3],
+        [1, 2, 3],
+        [4, 4, 5],
+        [4, 5, 6],
+        [4, 5, 6],
+        [7, 7, 8],
+        [7, 8, 9],
+    ]
+
+
+# ============================================
+#            test_reads_partial_shard
+# ============================================
+def test_reads_partial_shard(tmp_path) -> None:
+    path = write_trajectories(str(tmp_path), None)
+    shard = ShardReader(FramePipeline()).read(path, 2, 6)
+    assert shard["actions"].tolist() == [2, 3, 4, 5]
+    # The frames before the shard are read for its first states
+    assert frame_rows(shard, "stateIndices") == [
+        [0, 1, 2],
+        [1, 2, 3],
+        [4, 4, 4],
+        [4, 4, 5],
+    ]
+    assert frame_rows(shard, "nextStateIndices")[-1] == [4, 5, 6]